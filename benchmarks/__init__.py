@@ -0,0 +1,8 @@
+"""
+
+    benchmarks
+    ~~~~~~~~~~~~
+
+    Performance benchmarks.
+
+"""
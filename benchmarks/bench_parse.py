@@ -0,0 +1,201 @@
+"""
+
+    benchmarks.bench_parse
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Micro-benchmark of 'pca.scraper.PageParser.parse_contents' against the former if/elif cascade implementation.
+
+    Pages are measured twice: as recorded in the test fixtures (lab details only) and padded with site chrome
+    (navigation menus, scripts, footer links) to the size of a full page served by the PCA website.
+
+    Run with: python -m benchmarks.bench_parse
+
+"""
+
+import contextlib
+import io
+import re
+import timeit
+
+from pca.scraper import PageParser
+from tests.server import lab_fixture
+
+from .corpus import pad
+
+PAGES = [(n, lab_fixture(n)) for n in [1, 333, 456, 1327, 555, 2]]
+
+
+class LegacyPageParser(PageParser):
+
+    """Page parser with the line classifier used before the table-driven one (kept for comparison)."""
+
+    PHONE_REGEX = PageParser.PHONE_REGEX.pattern
+    EMAIL_REGEX = PageParser.EMAIL_REGEX.pattern
+    WWW_REGEX = PageParser.WWW_REGEX.pattern
+
+    def is_empty(self, line, pattern):
+        """Check if currently processed page isn't empty."""
+        if line.split(pattern)[1] == "</strong> </p>":
+            return True
+        return False
+
+    def lose_cruft(self, line, pattern):
+        """Strip line of unwanted characters."""
+        line = line.split(pattern)[1]
+        line = line.replace("</strong>", "").replace("</p>", "")
+        return line.strip()
+
+    def parse_contact_details(self, line, regex):
+        """Parse contact details (landline phone, cellphone, email and www)."""
+        match = re.search(regex, line)
+        if match is None:
+            return ""
+        return match.group()
+
+    def parse_contents(self):
+        """Parse contents of processed page."""
+        # sentinels
+        certdate = None
+        org_name, org_address, lab_name, lab_address = None, None, None, None
+        phone, cellphone, email, www = None, None, None, None
+
+        research_fields, research_objects = "", ""  # default values in case these sections are missing on the parsed page
+
+        # flags to control parsing on the line after the one that triggers parsing
+        org_name_on, org_address_on = False, False
+        lab_name_on, lab_address_on = False, False
+        phone_on, email_on, www_on = False, False, False
+        research_fields_on, research_objects_on = False, False
+
+        for line in self.contents.split("\n"):
+            line = line.strip()
+
+            if "Akredytacja:" in line:
+                if self.is_empty(line, "Akredytacja:"):
+                    return None
+            elif "Data ważności certyfikatu:" in line:
+                expiredate_str = self.parse_expiredate(line, "Data ważności certyfikatu:")
+                try:
+                    if not self.validate_lab(expiredate_str):
+                        return None
+                except ValueError as ve:
+                    print(f"Cannot validate expire date (ValueError: {ve}). Skipping...")
+                    return None
+            elif "Akredytacja od:" in line:
+                certdate = self.parse_certdate(line, "Akredytacja od:")
+
+            elif "Dane organizacji:" in line:
+                org_name_on = True
+                continue
+            elif org_name_on:
+                org_name = self.parse_name_address(line)
+                org_name_on = False
+                org_address_on = True
+                continue
+            elif org_address_on:
+                org_address = self.parse_name_address(line)
+                org_address_on = False
+
+            elif "Dane laboratorium:" in line:
+                lab_name_on = True
+                continue
+            elif lab_name_on:
+                lab_name = self.parse_name_address(line)
+                lab_name_on = False
+                lab_address_on = True
+                continue
+            elif lab_address_on:
+                lab_address = self.parse_name_address(line)
+                lab_address_on = False
+
+            elif "Telefon:" in line:
+                phone_on = True
+                continue
+            elif phone_on:
+                phone = self.parse_contact_details(line, self.PHONE_REGEX)
+                phone_on = False
+
+            elif "Komórka:" in line:
+                cellphone = self.parse_contact_details(line, self.PHONE_REGEX)
+
+            elif "Email:" in line:
+                email_on = True
+                continue
+            elif email_on:
+                email = self.parse_contact_details(line, self.EMAIL_REGEX)
+                email_on = False
+
+            elif "www:" in line:
+                www_on = True
+                continue
+            elif www_on:
+                www = self.parse_contact_details(line, self.WWW_REGEX)
+                www_on = False
+
+            elif "Dziedziny badań:" in line:
+                research_fields_on = True
+                research_fields = []
+                continue
+            elif research_fields_on and "<li>" in line:
+                research_fields.append(self.parse_research_field_object(line))
+
+            elif "Obiekty:" in line:
+                research_fields_on = False
+                research_objects_on = True
+                research_objects = []
+                continue
+            elif research_objects_on and "<li>" in line:
+                research_objects.append(self.parse_research_field_object(line))
+            elif research_objects_on and "</ul>" in line:
+                research_objects_on = False
+                break
+
+        if any([True for var in [certdate, org_name, org_address, lab_name, lab_address, phone,
+                                 cellphone, email, www]
+                if var is None]):
+            raise ValueError("The processed page is not parsable.")
+
+        return {
+            "number": self.number,
+            "certdate": certdate,
+            "org_name": org_name,
+            "org_address": org_address,
+            "lab_name": lab_name,
+            "lab_address": lab_address,
+            "phone": phone,
+            "cellphone": cellphone,
+            "email": email,
+            "www": www,
+            "research_fields": research_fields,
+            "research_objects": research_objects
+        }
+
+
+def parse_all(parsers):
+    """Parse pages of all parsers."""
+    for parser in parsers:
+        parser.parse_contents()
+
+
+def measure(pages, repeat, number):
+    """Check that both parsers agree on given pages and return per-page parse time of each (in microseconds)."""
+    with contextlib.redirect_stdout(io.StringIO()):  # silence parsers' debug output
+        legacy = [LegacyPageParser(n, contents) for n, contents in pages]
+        current = [PageParser(n, contents) for n, contents in pages]
+    for old, new in zip(legacy, current):
+        assert old.parse_contents() == new.parse_contents(), f"Parsers disagree on {new.number}"
+
+    return [min(timeit.repeat(lambda: parse_all(parsers), repeat=repeat, number=number)) / (number * len(pages)) * 1e6
+            for parsers in [legacy, current]]
+
+
+def main(repeat=5, number=1000):
+    """Print per-page parse time of both parsers."""
+    for name, pages in [("fixture", PAGES), ("full page", [(n, pad(contents)) for n, contents in PAGES])]:
+        legacy, current = measure(pages, repeat, number)
+        print(f"{name:>10}: legacy {legacy:8.2f} us/page, table-driven {current:8.2f} us/page, "
+              f"speedup {legacy / current:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+
+    benchmarks.corpus
+    ~~~~~~~~~~~~~~~~~~~
+
+    Corpus of lab pages for offline benchmarks: the pages recorded in the test fixtures plus synthetic pages rendered
+    in the same layout from labs of the scraped dataset, at any scale.
+
+"""
+
+import json
+import os
+import random
+
+from tests.server import FIXTURES_DIR, lab_fixture
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "scraped_data.json")
+SCALES = [1000, 10000, 100000]
+
+NAV = "\n".join('<li class="menu-item"><a href="https://www.pca.gov.pl/o-nas/sekcja-{0}/" title="Sekcja {0}">'
+                'Aktualności i komunikaty {0}</a></li>'.format(i) for i in range(300))
+SCRIPT = "\n".join('  var el{0} = document.getElementById("el{0}"); if (el{0}) {{ el{0}.style.display = "none"; }}'
+                   .format(i) for i in range(100))
+
+SECTIONS = [("research_fields", "Dziedziny badań:"), ("research_objects", "Obiekty:")]
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="pl">
+<head>
+<meta charset="utf-8">
+<title>{number} - Polskie Centrum Akredytacji</title>
+</head>
+<body>
+<div id="content">
+<div class="podmiot">
+<h1>{number}</h1>
+<p><strong>Akredytacja:</strong> aktywna</p>
+<p><strong>Data ważności certyfikatu:</strong> {expiredate}</p>
+<p><strong>Akredytacja od:</strong> {certdate}</p>
+<div class="dane">
+<h3>Dane organizacji:</h3>
+<p> {org_name} </p>
+<p> {org_address} </p>
+<h3>Dane laboratorium:</h3>
+<p> {lab_name} </p>
+<p> {lab_address} </p>
+</div>
+<p><strong>Telefon:</strong>
+{phone}                    wew.: brak              </p>
+<p><strong>Komórka:</strong>{cellphone}</p>
+<p><strong>Email:</strong>
+{email}               </p>
+<p><strong>www:</strong>
+{www}               </p>
+{sections}</div>
+</div>
+<footer>
+<p>Polskie Centrum Akredytacji, ul. Szczotkarska 42; 01-382 Warszawa</p>
+</footer>
+</body>
+</html>
+"""
+
+
+def pad(contents):
+    """Return page contents surrounded by site chrome (navigation menus, scripts, footer links)."""
+    head, body = contents.split("<body>", 1)
+    chrome = "<ul class=\"menu\">\n" + NAV + "\n</ul>\n<script>\n" + SCRIPT + "\n</script>"
+    body = body.replace("<footer>", "<footer>\n<ul>\n" + NAV[:len(NAV) // 3] + "\n</ul>")
+    return head + "<body>\n" + chrome + body
+
+
+def recorded_pages():
+    """Return (number, contents) pairs of the recorded lab pages."""
+    numbers = sorted(int(name[2:-5]) for name in os.listdir(FIXTURES_DIR) if name.startswith("ab"))
+    return [(n, lab_fixture(n)) for n in numbers]
+
+
+def load_dataset(path=DATASET_PATH):
+    """Return labs of the scraped dataset."""
+    with open(path, encoding="utf-8") as json_file:
+        return json.load(json_file)["labs"]
+
+
+def render_page(lab, number):
+    """Render page of given lab under given number in the layout of the PCA website (padded with site chrome)."""
+    year, month, day = lab["certdate"].split("-")
+    fields = dict(lab, number="AB " + str(number).zfill(3), certdate="-".join([day, month, year]),
+                  expiredate="31-12-2099", email=lab["email"] or "brak")
+    fields["sections"] = "".join("<h3>{}</h3>\n<ul>\n{}\n</ul>\n".format(
+        title, "\n".join("<li>{}</li>".format(item) for item in lab[key]))
+        for key, title in SECTIONS if lab[key])  # labs missing a section have "" in place of its list
+    return pad(PAGE_TEMPLATE.format(**fields))
+
+
+def synthetic_labs(size, seed=0, dataset=None):
+    """Yield 'size' (number, lab) pairs of labs drawn from the dataset (the same ones for the same seed)."""
+    labs = load_dataset() if dataset is None else dataset
+    rng = random.Random(seed)
+    for number in range(1, size + 1):
+        yield number, dict(rng.choice(labs), number="AB " + str(number).zfill(3))
+
+
+def synthetic_pages(size, seed=0, dataset=None):
+    """Yield 'size' (number, contents) pairs of full-size pages of synthetic labs (see 'synthetic_labs')."""
+    for number, lab in synthetic_labs(size, seed, dataset):
+        yield number, render_page(lab, number)
+
+
+def pages(size, seed=0, dataset=None):
+    """Yield 'size' (number, contents) pairs of full-size pages: the recorded ones first, then synthetic ones."""
+    recorded = [(n, pad(contents)) for n, contents in recorded_pages()][:size]
+    yield from recorded
+    yield from synthetic_pages(size - len(recorded), seed, dataset)
@@ -0,0 +1,288 @@
+"""
+
+    benchmarks.run
+    ~~~~~~~~~~~~~~~~
+
+    Offline benchmark suite: parsing (pages/sec), exporters of 'pca.data' (records/sec), peak RSS and end-to-end
+    scrape time against a local HTTP server with configurable latency, all run on the corpus of 'benchmarks.corpus'.
+    Each stage runs in a process of its own, so that its peak RSS isn't that of the stages before it.
+
+    Results are stored as JSON in 'benchmarks/results' (one file per commit and scale), so that runs of two commits
+    can be compared.
+
+    Run with: python -m benchmarks.run --scale 10000
+    Compare:  python -m benchmarks.run --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pca.data
+from pca.contacts import ContactIndex, normalize_contacts
+from pca.fetcher import Fetcher
+from pca.geo import LabMap
+from pca.scraper import URLBuilder, parse_page, scrape
+from pca.search import SearchIndex
+from tests.server import PATH_REGEX, PCAServer
+
+from .corpus import SCALES, load_dataset, pages, render_page, synthetic_labs
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+XLS_MAX_ROWS = 65535  # .xls sheets have 65536 rows, one of them taken by the headers
+E2E_SIZE = 500
+LATENCY = 0.05
+
+
+def peak_rss():
+    """Return peak resident set size of this process so far (in kilobytes)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss  # macOS reports bytes, Linux kilobytes
+
+
+def git_commit():
+    """Return hash of the checked out commit (or 'None' outside of a git repository)."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(__file__)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_parse(size, seed, dataset):
+    """Parse 'size' pages of the corpus and return timing (page rendering is not timed)."""
+    elapsed, labs = 0.0, 0
+    for number, contents in pages(size, seed, dataset):
+        start = time.perf_counter()
+        lab = parse_page(number, contents)
+        elapsed += time.perf_counter() - start
+        labs += lab is not None
+    return {"pages": size, "labs": labs, "seconds": elapsed, "pages_per_sec": size / elapsed}
+
+
+def bench_export(exporter, size, seed, dataset, directory):
+    """Export 'size' synthetic labs with given 'pca.data' exporter into directory and return timing."""
+    labs = (lab for _, lab in synthetic_labs(size, seed, dataset))
+    template, pca.data.FILEPATH_TEMPLATE = pca.data.FILEPATH_TEMPLATE, os.path.join(directory, "bench.{}")
+    try:
+        start = time.perf_counter()
+        exporter(labs)
+        elapsed = time.perf_counter() - start
+    finally:
+        pca.data.FILEPATH_TEMPLATE = template
+    return {"records": size, "seconds": elapsed, "records_per_sec": size / elapsed}
+
+
+def bench_export_all(size, seed, dataset, directory):
+    """Export 'size' synthetic labs to JSON, CSV, XLS and XLSX files in one pass and return timing."""
+    labs = [lab for _, lab in synthetic_labs(size, seed, dataset)]
+    sinks = [writer(os.path.join(directory, "bench_all." + writer.EXTENSION))
+             for writer in [pca.data.JSONArrayWriter, pca.data.CSVWriter, pca.data.XLSWriter, pca.data.XLSXWriter]]
+    start = time.perf_counter()
+    pca.data.export(labs, sinks)
+    elapsed = time.perf_counter() - start
+    return {"records": size, "seconds": elapsed, "records_per_sec": size / elapsed}
+
+
+def bench_contacts(size, seed, dataset):
+    """Normalize contacts of 'size' synthetic labs and index shared ones, returning timing (generation is not timed)."""
+    labs = [lab for _, lab in synthetic_labs(size, seed, dataset)]
+    index = ContactIndex()
+    start = time.perf_counter()
+    for _ in normalize_contacts(labs, index):
+        pass
+    elapsed = time.perf_counter() - start
+    return {"records": size, "seconds": elapsed, "records_per_sec": size / elapsed}
+
+
+def bench_geo(size, seed, dataset, queries=1000):
+    """Geocode 'size' synthetic labs into a spatial index and time it, then 'queries' radius and nearest-k queries."""
+    labs = [lab for _, lab in synthetic_labs(size, seed, dataset)]
+    start = time.perf_counter()
+    lab_map = LabMap(labs)
+    elapsed = time.perf_counter() - start
+    points = [lab_map.locations[number][:2] for number in list(lab_map.locations)[:queries]]
+    timings = {}
+    for name, query in [("near_us", lambda point: lab_map.near(point, 10)),
+                        ("nearest_us", lambda point: lab_map.nearest(point, 5))]:
+        query_start = time.perf_counter()
+        for point in points:
+            query(point)
+        timings[name] = (time.perf_counter() - query_start) / max(len(points), 1) * 1e6
+    return dict({"records": size, "seconds": elapsed, "records_per_sec": size / elapsed,
+                 "unresolved": len(lab_map.unresolved)}, **timings)
+
+
+def bench_search(size, seed, dataset, queries=100):
+    """Index 'size' synthetic labs for search and time it, then the mean of 'queries' runs of each of a few queries."""
+    labs = [lab for _, lab in synthetic_labs(size, seed, dataset)]
+    start = time.perf_counter()
+    index = SearchIndex(labs)
+    elapsed = time.perf_counter() - start
+    timings = {}
+    for name, query in [("facet_us", lambda: index.search(fields=["C", "P"], limit=20)),
+                        ("keyword_us", lambda: index.search("woda gleba", limit=20)),
+                        ("prefix_us", lambda: index.search("wyrob* budowl*", fields=["N"], limit=20))]:
+        query()  # bitmaps of its tokens are built on first use
+        query_start = time.perf_counter()
+        for _ in range(queries):
+            query()
+        timings[name] = (time.perf_counter() - query_start) / queries * 1e6
+    return dict({"records": size, "seconds": elapsed, "records_per_sec": size / elapsed}, **timings)
+
+
+class CorpusHandler(BaseHTTPRequestHandler):
+
+    """Serve synthetic pages of the labs in 'server.labs' after waiting 'server.latency' seconds (or 404)."""
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        match = PATH_REGEX.search(self.path)
+        lab = self.server.labs.get(int(match.group(1))) if match else None
+        if lab is None:
+            self.send_error(404)
+            return
+        body = render_page(lab, int(match.group(1))).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_end_to_end(size, seed, dataset, latency, concurrency):
+    """Scrape 'size' synthetic labs from a local server answering after 'latency' seconds and return timing."""
+    with PCAServer(CorpusHandler) as server:
+        server.httpd.labs = dict(synthetic_labs(size, seed, dataset))
+        server.httpd.latency = latency
+        fetcher = Fetcher(concurrency=concurrency, rate=None)
+        start = time.perf_counter()
+        labs = scrape(range(1, size + 1), fetcher=fetcher, builder=URLBuilder(prefix=server.prefix))
+        elapsed = time.perf_counter() - start
+        fetcher.client.close()
+    return {"pages": size, "labs": len(labs), "latency": latency, "concurrency": concurrency,
+            "seconds": elapsed, "pages_per_sec": size / elapsed}
+
+
+STAGES = ("parse", "to_json", "to_csv", "to_xls", "to_xlsx", "export_all", "contacts", "geo", "search",
+          "end_to_end")
+
+
+def run_stage(name, size, seed=0, latency=LATENCY, concurrency=8, e2e_size=E2E_SIZE):
+    """Run benchmark stage 'name' (one of 'STAGES') in this process and return its result, with peak RSS of the process."""
+    dataset = load_dataset()
+    with contextlib.redirect_stdout(io.StringIO()), tempfile.TemporaryDirectory() as directory:  # silence debug output
+        stages = {
+            "parse": lambda: bench_parse(size, seed, dataset),
+            "to_json": lambda: bench_export(pca.data.to_json, size, seed, dataset, directory),
+            "to_csv": lambda: bench_export(pca.data.to_csv, size, seed, dataset, directory),
+            "to_xls": lambda: bench_export(pca.data.to_xls, min(size, XLS_MAX_ROWS), seed, dataset, directory),
+            "to_xlsx": lambda: bench_export(pca.data.to_xlsx, size, seed, dataset, directory),
+            "export_all": lambda: bench_export_all(min(size, XLS_MAX_ROWS), seed, dataset, directory),
+            "contacts": lambda: bench_contacts(size, seed, dataset),
+            "geo": lambda: bench_geo(size, seed, dataset),
+            "search": lambda: bench_search(size, seed, dataset),
+            "end_to_end": lambda: bench_end_to_end(min(size, e2e_size), seed, dataset, latency, concurrency)
+        }
+        result = stages[name]()
+    result["peak_rss_kb"] = peak_rss()
+    return result
+
+
+def run(size, seed=0, latency=LATENCY, concurrency=8, e2e_size=E2E_SIZE):
+    """Run all benchmarks at given scale, each stage in a subprocess of its own, and return results."""
+    results = {}
+    for name in STAGES:
+        argv = [sys.executable, "-m", "benchmarks.run", "--stage", name, "--scale", str(size), "--seed", str(seed),
+                "--latency", str(latency), "--concurrency", str(concurrency), "--e2e-size", str(e2e_size)]
+        output = subprocess.check_output(argv, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        results[name] = json.loads(output)
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": size,
+        "seed": seed,
+        "peak_rss_kb": max(result["peak_rss_kb"] for result in results.values()),
+        "results": results
+    }
+
+
+def save(report, directory=RESULTS_DIR):
+    """Write benchmark report to JSON file named after its commit and scale and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "{}-{}.json".format(report["commit"] or "unknown", report["scale"]))
+    with open(path, "w") as outfile:
+        json.dump(report, outfile, indent=2)
+    return path
+
+
+def summary(report):
+    """Return lines summarizing benchmark report."""
+    lines = [f"commit {report['commit']}, Python {report['python']}, scale {report['scale']}"]
+    for name, result in report["results"].items():
+        rate = result.get("pages_per_sec", result.get("records_per_sec"))
+        unit = "pages/s" if "pages_per_sec" in result else "records/s"
+        lines.append(f"{name:>12}: {rate:12.1f} {unit:<9} {result['seconds']:8.2f} s, "
+                     f"peak RSS {result['peak_rss_kb'] / 1024:7.1f} MB")
+    return lines
+
+
+def compare(old, new):
+    """Return lines comparing throughput of two benchmark reports (ratio > 1 means 'new' is faster)."""
+    lines = [f"{old['commit']} -> {new['commit']} (scale {old['scale']} -> {new['scale']})"]
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        key = "pages_per_sec" if "pages_per_sec" in result else "records_per_sec"
+        ratio = result[key] / old["results"][name][key]
+        rss = result["peak_rss_kb"] / old["results"][name]["peak_rss_kb"]
+        lines.append(f"{name:>12}: throughput {ratio:5.2f}x, peak RSS {rss:5.2f}x")
+    return lines
+
+
+def main(argv=None):
+    """Run benchmarks (or compare two stored reports) as told by command line arguments."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.split("\n\n")[2].strip())
+    parser.add_argument("--scale", type=int, default=SCALES[0], help=f"number of pages (e.g. {SCALES})")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpus")
+    parser.add_argument("--latency", type=float, default=LATENCY, help="latency of the local server (seconds)")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of fetcher threads")
+    parser.add_argument("--e2e-size", type=int, default=E2E_SIZE, help="max. number of pages scraped end-to-end")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two stored reports")
+    parser.add_argument("--stage", choices=STAGES, help="run a single stage and print its result as JSON")
+    args = parser.parse_args(argv)
+
+    if args.stage:
+        print(json.dumps(run_stage(args.stage, args.scale, args.seed, args.latency, args.concurrency, args.e2e_size)))
+        return
+
+    if args.compare:
+        reports = []
+        for path in args.compare:
+            with open(path) as json_file:
+                reports.append(json.load(json_file))
+        print("\n".join(compare(*reports)))
+        return
+
+    report = run(args.scale, args.seed, args.latency, args.concurrency, args.e2e_size)
+    print("\n".join(summary(report)))
+    print(f"Results written to: '{save(report)}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,14 @@
 
 """
 
-    Starting the script.
+    Starting the script (same as 'python -m pca', see 'pca.cli' for arguments).
 
 """
 
-from pca.scraper import scrape
-from pca.data import to_json
+import sys
 
-
-def main():
-    """Run the script."""
-    to_json(scrape())
+from pca.cli import main
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
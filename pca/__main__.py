@@ -0,0 +1,14 @@
+"""
+
+    pca.__main__
+    ~~~~~~~~~~~~~~
+
+    Run the command-line interface with 'python -m pca'.
+
+"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
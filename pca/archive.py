@@ -0,0 +1,139 @@
+"""
+
+    pca.archive
+    ~~~~~~~~~~~~~
+
+    Append-only archive of scrape runs tracking changes of labs over time.
+
+"""
+
+import datetime
+import hashlib
+import json
+import sqlite3
+
+from .data import FILEPATH_TEMPLATE
+from .lab import as_dict
+from .scraper import lab_number
+
+ARCHIVE_PATH = FILEPATH_TEMPLATE.format("archive.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    hash TEXT PRIMARY KEY,
+    body TEXT
+);
+CREATE TABLE IF NOT EXISTS versions (
+    number TEXT,
+    hash TEXT REFERENCES records (hash),
+    valid_from TEXT,
+    valid_to TEXT,
+    PRIMARY KEY (number, valid_from)
+);
+CREATE INDEX IF NOT EXISTS versions_valid_from ON versions (valid_from, valid_to);
+CREATE INDEX IF NOT EXISTS versions_open ON versions (number) WHERE valid_to IS NULL;
+CREATE TABLE IF NOT EXISTS runs (
+    date TEXT PRIMARY KEY,
+    labs INTEGER,
+    added INTEGER,
+    removed INTEGER,
+    changed INTEGER
+);
+"""
+
+
+def record_hash(body):
+    """Return content hash of canonical JSON body of a lab."""
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+def canonical(lab):
+    """Return canonical JSON body of lab (dict or 'pca.lab.Lab')."""
+    return json.dumps(as_dict(lab), ensure_ascii=False, sort_keys=True)
+
+
+def timestamp(date):
+    """Return ISO form of date (a 'datetime.date', 'datetime.datetime' or ISO string)."""
+    return date if isinstance(date, str) else date.isoformat()
+
+
+class Archive:
+
+    """
+    SQLite archive of scrape runs. Every distinct lab record is stored once, keyed by the hash of its content, and each lab number has a list of versions referring to records, valid from the run where the record first appeared until (excluding) the run where it changed or the lab disappeared. Recording a run where nothing changed adds a single row, so the archive grows with the number of changes, not runs. Runs must be recorded in chronological order.
+    """
+
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def record(self, labs, date=None):
+        """Record run which scraped given labs at given date (now by default). Return (added, removed, changed) numbers."""
+        date = timestamp(date if date is not None else datetime.datetime.now().replace(microsecond=0))
+        last = self.connection.execute("SELECT max(date) FROM runs").fetchone()[0]
+        if last is not None and date <= last:
+            raise ValueError(f"Run at {date} is not later than the last recorded run at {last}.")
+
+        current = dict(self.connection.execute("SELECT number, hash FROM versions WHERE valid_to IS NULL"))
+        added, changed, seen = [], [], set()
+        with self.connection:
+            for lab in labs:
+                body = canonical(lab)
+                number, digest = lab["number"], record_hash(body)
+                seen.add(number)
+                if current.get(number) == digest:
+                    continue
+                self.connection.execute("INSERT OR IGNORE INTO records VALUES (?, ?)", [digest, body])
+                if number in current:
+                    self.close_version(number, date)
+                    changed.append(number)
+                else:
+                    added.append(number)
+                self.connection.execute("INSERT INTO versions VALUES (?, ?, ?, NULL)", [number, digest, date])
+            removed = sorted(set(current) - seen, key=lab_number)
+            for number in removed:
+                self.close_version(number, date)
+            self.connection.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?)",
+                                    [date, len(seen), len(added), len(removed), len(changed)])
+        return added, removed, changed
+
+    def close_version(self, number, date):
+        """End the open version of lab with given number at given date."""
+        self.connection.execute("UPDATE versions SET valid_to = ? WHERE number = ? AND valid_to IS NULL",
+                                [date, number])
+
+    def state(self, date=None):
+        """Return labs of the registry as it was at given date (latest by default), ordered by number."""
+        if date is None:
+            rows = self.connection.execute(
+                "SELECT body FROM versions JOIN records USING (hash) WHERE valid_to IS NULL")
+        else:
+            date = timestamp(date)
+            rows = self.connection.execute(
+                "SELECT body FROM versions JOIN records USING (hash) "
+                "WHERE valid_from <= ? AND (valid_to IS NULL OR valid_to > ?)", [date, date])
+        return sorted((json.loads(body) for body, in rows), key=lambda lab: lab_number(lab["number"]))
+
+    def history(self, number):
+        """Return versions of lab with given number (e.g. 'AB 1327') as dicts with 'valid_from', 'valid_to' and 'lab'."""
+        rows = self.connection.execute(
+            "SELECT valid_from, valid_to, body FROM versions JOIN records USING (hash) "
+            "WHERE number = ? ORDER BY valid_from", [number])
+        return [{"valid_from": valid_from, "valid_to": valid_to, "lab": json.loads(body)}
+                for valid_from, valid_to, body in rows]
+
+    def runs(self):
+        """Return recorded runs (date, number of labs and of added, removed and changed ones), oldest first."""
+        columns = ["date", "labs", "added", "removed", "changed"]
+        return [dict(zip(columns, row)) for row in self.connection.execute("SELECT * FROM runs ORDER BY date")]
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
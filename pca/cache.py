@@ -0,0 +1,81 @@
+"""
+
+    pca.cache
+    ~~~~~~~~~~~
+
+    Persistent on-disk cache of fetched pages with conditional revalidation.
+
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from .data import dump_json_atomically
+
+CACHE_DIR = "data/cache"
+
+
+class ResponseCache:
+
+    """
+    Cache of fetched pages keyed by lab number and URL. Each entry stores the page body (or 'None' if there was no such page) together with its ETag, Last-Modified and fetch time. Entries younger than 'ttl' seconds are served without asking the server, older ones are revalidated with a conditional request. In 'offline' mode only cached entries are served.
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=None, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.offline = offline
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url, number=None):
+        """Return path of the file of the entry for given URL and lab number."""
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        name = digest if number is None else "{}-{}".format(str(number).zfill(4), digest)
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, url, number=None):
+        """Return cached entry for given URL and lab number or 'None' if there is none."""
+        try:
+            with open(self.path(url, number), encoding="utf-8") as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        return entry if entry["url"] == url else None
+
+    def is_fresh(self, entry):
+        """Check if entry is young enough to be served without revalidation."""
+        return self.ttl is not None and time.time() - entry["fetched"] < self.ttl
+
+    def put(self, url, body, number=None, etag=None, last_modified=None):
+        """Store entry for given URL and lab number and return it."""
+        entry = {
+            "url": url,
+            "number": number,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched": time.time(),
+            "body": body
+        }
+        self.write(entry)
+        return entry
+
+    def touch(self, entry):
+        """Mark entry as just revalidated."""
+        entry["fetched"] = time.time()
+        self.write(entry)
+
+    def write(self, entry):
+        """Atomically write entry to its file."""
+        dump_json_atomically(entry, self.path(entry["url"], entry["number"]))
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Return headers of a conditional request revalidating entry."""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
@@ -0,0 +1,74 @@
+"""
+
+    pca.checkpoint
+    ~~~~~~~~~~~~~~~~
+
+    Checkpoint long scrapes so that they can be resumed.
+
+"""
+
+import json
+import os
+
+from .data import FILEPATH_TEMPLATE, dump_json_atomically
+
+CHECKPOINT_PATH = FILEPATH_TEMPLATE.format("checkpoint.json")
+SAVE_EVERY = 50  # number of processed labs between two saves of a checkpoint
+
+
+class Checkpoint:
+
+    """
+    Record of lab numbers processed so far (with their labs, 'None' for pages that are missing or not valid) and of numbers that failed (with their errors). Saved atomically to 'path' every 'save_every' processed numbers (kept in memory only if 'path' is 'None').
+    """
+
+    def __init__(self, path=None, save_every=SAVE_EVERY):
+        self.path = path
+        self.save_every = save_every
+        self.done, self.failed = {}, {}
+        self.unsaved = 0
+
+    @classmethod
+    def load(cls, path=CHECKPOINT_PATH, save_every=SAVE_EVERY):
+        """Load checkpoint saved at given path (or start an empty one if there is none)."""
+        checkpoint = cls(path, save_every)
+        try:
+            with open(checkpoint.path, encoding="utf-8") as json_file:
+                state = json.load(json_file)
+        except OSError:
+            return checkpoint
+        checkpoint.done = {int(number): lab for number, lab in state["done"].items()}
+        checkpoint.failed = {int(number): error for number, error in state["failed"].items()}
+        print(f"Resuming from checkpoint: {len(checkpoint.done)} labs done, {len(checkpoint.failed)} failed")  # debug
+        return checkpoint
+
+    def record(self, number, lab):
+        """Record lab (or 'None') processed under given number."""
+        self.done[number] = lab
+        self.failed.pop(number, None)
+        self.processed()
+
+    def fail(self, number, error):
+        """Record failure of processing given number."""
+        self.failed[number] = f"{type(error).__name__}: {error}"
+        self.processed()
+
+    def processed(self):
+        self.unsaved += 1
+        if self.unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        """Atomically write checkpoint to its file."""
+        if self.path is None:
+            return
+        dump_json_atomically({"done": self.done, "failed": self.failed}, self.path)
+        self.unsaved = 0
+
+    def finish(self):
+        """Remove checkpoint of a scrape that completed without failures, save it otherwise."""
+        if self.failed:
+            self.save()
+            print(f"{len(self.failed)} labs failed: {sorted(self.failed)}")  # debug
+        elif self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
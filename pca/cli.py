@@ -0,0 +1,275 @@
+"""
+
+    pca.cli
+    ~~~~~~~~~
+
+    Command-line interface: scrape the whole registry or chosen lab numbers into any number of outputs in one pass.
+
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from .archive import ARCHIVE_PATH, Archive
+from .cache import CACHE_DIR, ResponseCache
+from .checkpoint import CHECKPOINT_PATH, Checkpoint
+from .contacts import CONTACTS_PATH, STREAM_BATCH_SIZE, ContactIndex, normalize_contacts
+from .data import (FILEPATH_TEMPLATE, CSVWriter, JSONArrayWriter, JSONLinesWriter, XLSWriter, XLSXWriter, export,
+                   from_json, from_manifest, to_diff, to_manifest)
+from .fetcher import CONCURRENCY, RATE, Fetcher
+from .metrics import METRICS_PATH, Metrics
+from .registries import REGISTRIES, SITE_URL, iter_scrape_registries
+from .scraper import URLBuilder, discover_numbers, iter_scrape, iter_sharded, scrape_incremental, work
+from .shards import QUEUE_PATH, SHARD_SIZE, SQLiteQueue
+from .snapshot import SnapshotWriter
+from .store import SQLiteWriter
+
+WRITERS = {
+    "json": JSONArrayWriter,
+    "jsonl": JSONLinesWriter,
+    "csv": CSVWriter,
+    "xls": XLSWriter,
+    "xlsx": XLSXWriter,
+    "sqlite": SQLiteWriter,
+    "snapshot": SnapshotWriter
+}
+STAGES = ["parse", "export"]
+
+
+def numbers_arg(text):
+    """Parse comma-separated lab numbers and ranges (e.g. '1200-1300,1327' or 'AB 1327') into a sorted list."""
+    numbers = set()
+    try:
+        for part in text.replace("AB", "").split(","):
+            first, _, last = part.strip().partition("-")
+            first = int(first)
+            last = int(last) if last else first
+            if not 0 < first <= last:
+                raise ValueError
+            numbers.update(range(first, last + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid lab numbers: '{text}' (expected e.g. '1200-1300,1327')")
+    return sorted(numbers)
+
+
+def output_arg(text):
+    """Parse output given as 'FORMAT' or 'FORMAT=PATH' into (format, path) pair ('None' path: default one)."""
+    fmt, _, path = text.partition("=")
+    if fmt not in WRITERS:
+        raise argparse.ArgumentTypeError(f"unknown output format: '{fmt}' (choose from {', '.join(WRITERS)})")
+    return fmt, path or None
+
+
+def build_parser():
+    """Return parser of command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="python -m pca",
+        description="Scrape data of research laboratories accredited by PCA (Polskie Centrum Akredytacji).")
+    parser.add_argument("-n", "--numbers", type=numbers_arg,
+                        help="lab numbers and ranges to scrape, e.g. '1200-1300,1327' (default: all discovered)")
+    parser.add_argument("--index", action="store_true", help="discover lab numbers from the listing pages")
+    parser.add_argument("-o", "--output", type=output_arg, action="append", metavar="FORMAT[=PATH]",
+                        help=f"output written in the same pass, repeatable; FORMAT is one of: {', '.join(WRITERS)} "
+                             f"(default: json; default PATH: {FILEPATH_TEMPLATE.format('FORMAT')})")
+
+    fetching = parser.add_argument_group("fetching")
+    fetching.add_argument("-r", "--registry", action="append", choices=REGISTRIES,
+                          help="registry to scrape, repeatable; several registries are scraped at the same time "
+                               "(default: AB)")
+    fetching.add_argument("--site", default=SITE_URL, metavar="URL", help="URL of the listings of all registries")
+    fetching.add_argument("--base-url", metavar="PREFIX",
+                          help="URL prefix of AB lab pages, followed by the lab number (e.g. of a mirror)")
+    fetching.add_argument("-c", "--concurrency", type=int, default=CONCURRENCY, help="number of fetcher threads")
+    fetching.add_argument("--rate", type=float, default=RATE, help="max. requests per second per host (0: no limit)")
+    fetching.add_argument("--burst", type=float, help="max. burst of requests above the rate")
+    fetching.add_argument("--adaptive", action="store_true",
+                          help="find the concurrency each host copes with (up to --concurrency) from its response "
+                               "times and errors, pausing when throttled")
+
+    caching = parser.add_argument_group("cache")
+    caching.add_argument("--cache-dir", default=CACHE_DIR, help="directory of the response cache")
+    caching.add_argument("--no-cache", action="store_true", help="don't cache responses")
+    caching.add_argument("--ttl", type=float, help="serve cached pages younger than TTL seconds without revalidation")
+    caching.add_argument("--offline", action="store_true", help="serve cached pages only, send no requests")
+
+    modes = parser.add_argument_group("modes")
+    modes.add_argument("--incremental", action="store_true",
+                       help="re-parse only changed pages and merge them into the last scraped data of the JSON output "
+                            "(its manifest and summary of changes kept next to it)")
+    modes.add_argument("--resume", action="store_true", help="resume the last interrupted run from its checkpoint")
+    modes.add_argument("--archive", nargs="?", const=ARCHIVE_PATH, metavar="PATH",
+                       help=f"record the scraped registry in the archive of runs (default PATH: {ARCHIVE_PATH})")
+    modes.add_argument("--queue", nargs="?", const=QUEUE_PATH, metavar="PATH",
+                       help=f"split numbers into shards of a work queue shared with other workers, then merge their "
+                            f"labs (default PATH: {QUEUE_PATH})")
+    modes.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="lab numbers in one shard of the queue")
+    modes.add_argument("--workers", type=int, default=0,
+                       help="number of extra local worker processes working on the queue")
+    modes.add_argument("--worker", action="store_true",
+                       help="only work on shards of the queue (e.g. on another node), write no outputs")
+    modes.add_argument("--contacts", nargs="?", const=CONTACTS_PATH, metavar="PATH",
+                       help=f"normalize phones (E.164), emails and websites in outputs and report contacts shared by "
+                            f"several labs and invalid ones (default PATH: {CONTACTS_PATH})")
+    modes.add_argument("--dry-run", action="store_true", help="show what would be scraped and written, then exit")
+    modes.add_argument("--benchmark", action="store_true", help="scrape without writing outputs and report throughput")
+
+    instrumentation = parser.add_argument_group("instrumentation")
+    instrumentation.add_argument("--metrics", default=METRICS_PATH.format("json"), metavar="PATH",
+                                 help="file to write metrics of the run to ('.prom': Prometheus text, JSON otherwise)")
+    instrumentation.add_argument("--profile", action="append", choices=STAGES, default=[],
+                                 help="profile stage with cProfile (report in the metrics file), repeatable")
+    instrumentation.add_argument("--trace-memory", action="append", choices=STAGES, default=[],
+                                 help="trace peak memory of stage with tracemalloc, repeatable")
+    return parser
+
+
+def validate(parser, args):
+    """Check that the arguments make sense together."""
+    if args.registry and args.registry != ["AB"]:
+        if args.base_url:
+            parser.error("--base-url applies to AB only, use --site with other registries")
+        if args.incremental or args.resume or args.queue or args.archive:
+            parser.error("registries other than AB can't be combined with --incremental, --resume, --queue or "
+                         "--archive")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be a positive integer")
+    if args.offline and args.no_cache:
+        parser.error("--offline needs the cache")
+    if args.incremental and args.resume:
+        parser.error("--incremental and --resume are exclusive")
+    if args.archive and args.numbers and not args.incremental:
+        parser.error("--archive records the whole registry: scrape all numbers or use --incremental")
+    if (args.worker or args.workers) and not args.queue:
+        parser.error("--worker and --workers need --queue")
+    if args.incremental and (args.benchmark or "json" not in [fmt for fmt, _ in args.output or [("json", None)]]):
+        parser.error("--incremental merges into the JSON output: write it (-o json[=PATH]) and don't use --benchmark")
+    if args.queue and (args.incremental or args.resume):
+        parser.error("--queue resumes interrupted runs by itself and can't be combined with --incremental or --resume")
+    if args.shard_size < 1 or args.workers < 0:
+        parser.error("--shard-size must be a positive and --workers a non-negative integer")
+
+
+def dry_run(args, builder, outputs):
+    """Print what a run with given arguments would scrape and write."""
+    if args.registry:
+        print("Registries: " + ", ".join(f"{code} ({REGISTRIES[code].title})" for code in args.registry))
+    if args.numbers is None:
+        print("Numbers: all, discovered from the " + ("listing pages" if args.index else "range of numbers"))
+    else:
+        codes = args.registry or [builder.code]
+        print(f"Numbers: {len(args.numbers)} labs" + (" per registry" if len(codes) > 1 else "") + ", " +
+              ", ".join(f"{code} {args.numbers[0]} to {code} {args.numbers[-1]}" for code in codes))
+        for code in codes:
+            registry_builder = builder if code == builder.code else REGISTRIES[code].builder(args.site)
+            print(f"First URL: {registry_builder.url(args.numbers[0])}")
+    mode = "incremental" if args.incremental else "resumed" if args.resume else "full"
+    if args.queue:
+        mode += f", sharded in {args.queue} by {args.workers + 1} processes"
+    cache = "off" if args.no_cache else f"{args.cache_dir}" + (" (offline)" if args.offline else "")
+    concurrency = f"adaptive up to {args.concurrency}" if args.adaptive else args.concurrency
+    print(f"Mode: {mode}, concurrency: {concurrency}, rate: {args.rate or 'unlimited'}/s, cache: {cache}")
+    for fmt, path in outputs:
+        print(f"Output: {fmt} -> {path or FILEPATH_TEMPLATE.format(WRITERS[fmt].EXTENSION)}")
+
+
+def main(argv=None):
+    """Run the scraper as told by command line arguments. Return exit status."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    validate(parser, args)
+
+    builder = URLBuilder(prefix=args.base_url) if args.base_url else REGISTRIES["AB"].builder(args.site)
+    outputs = [] if args.benchmark or args.worker else args.output or [("json", None)]
+    if args.dry_run:
+        dry_run(args, builder, outputs)
+        return 0
+
+    metrics = Metrics(profile=args.profile, trace_memory=args.trace_memory)
+    cache = None if args.no_cache else ResponseCache(args.cache_dir, ttl=args.ttl, offline=args.offline)
+    fetcher = Fetcher(concurrency=args.concurrency, rate=args.rate or None, burst=args.burst, cache=cache,
+                      metrics=metrics, adaptive=args.adaptive)
+    if args.worker:
+        with SQLiteQueue(args.queue) as queue:
+            print(f"Completed {work(queue, fetcher, builder)} shards")
+        fetcher.client.close()
+        metrics.write(args.metrics)
+        return 0
+    registries = args.registry if args.registry and args.registry != ["AB"] else None  # 'None': AB alone
+    numbers = args.numbers
+    if numbers is None and args.index and registries is None:
+        numbers = discover_numbers(fetcher, builder, index=True)
+
+    start = time.perf_counter()
+    if args.incremental:  # the JSON output is the base of the merge, done in full before any output is created
+        base = next(path for fmt, path in outputs if fmt == "json") or FILEPATH_TEMPLATE.format("json")
+        root = os.path.splitext(base)[0]
+        previous, manifest = from_json(path=base), from_manifest(root + ".manifest.json")
+        labs, manifest, diff = scrape_incremental(previous, manifest, numbers, fetcher, builder)
+    queue = SQLiteQueue(args.queue) if args.queue else None
+    if queue is not None and (numbers is not None or not len(queue)):
+        try:
+            queue.fill(discover_numbers(fetcher, builder) if numbers is None else numbers, args.shard_size)
+        except ValueError as e:  # shards of another run
+            queue.close()
+            parser.error(str(e))
+    sinks = [WRITERS[fmt](path) for fmt, path in outputs]
+    if queue is not None:
+        workers = start_workers(args.workers, sys.argv[1:] if argv is None else argv, args.metrics)
+        labs = iter_sharded(queue, numbers, fetcher, builder)
+    elif registries is not None:
+        labs = iter_scrape_registries(registries, numbers, fetcher, args.site, index=args.index)
+    elif not args.incremental:
+        checkpoint = Checkpoint.load() if args.resume else Checkpoint(CHECKPOINT_PATH)
+        labs = iter_scrape(numbers, fetcher, builder, checkpoint)
+    contacts = ContactIndex() if args.contacts else None
+    if contacts is not None:
+        labs = normalize_contacts(labs, contacts, STREAM_BATCH_SIZE)
+    archived = [] if args.archive else None
+    if archived is not None:
+        labs = collect(labs, archived)
+    count = export(labs, sinks, metrics=metrics)
+    elapsed = time.perf_counter() - start
+    fetcher.client.close()
+    if queue is not None:
+        for process in workers:
+            process.join()
+        queue.close()
+
+    if args.incremental:  # once the merged labs are written, so that the manifest never runs ahead of them
+        to_manifest(manifest, root + ".manifest.json")
+        to_diff(diff, root + ".diff.json")
+    if archived is not None:
+        with Archive(args.archive) as archive:
+            added, removed, changed = archive.record(archived)
+        print(f"Archived: {len(added)} added, {len(removed)} removed, {len(changed)} changed labs")
+    if contacts is not None:
+        contacts.write(args.contacts)
+    if args.benchmark:
+        print(f"Scraped {count} labs in {elapsed:.2f} s ({count / elapsed:.1f} labs/s)")
+    for host, state in fetcher.state().items():
+        print(f"Host {host}: concurrency {state['limit']}, {state['throttled']} throttled and {state['errors']} failed "
+              f"of {state['responses']} responses")  # debug
+    metrics.write(args.metrics)
+    return 0
+
+
+def collect(labs, collected):
+    """Yield labs, appending each of them to 'collected'."""
+    for lab in labs:
+        collected.append(lab)
+        yield lab
+
+
+def start_workers(count, argv, metrics_path):
+    """Start 'count' local processes running the command line in worker mode, each writing metrics of its own."""
+    root, extension = os.path.splitext(metrics_path)
+    workers = []
+    for i in range(1, count + 1):
+        worker_argv = argv + ["--worker", "--workers", "0", "--metrics", f"{root}.worker{i}{extension}"]
+        process = multiprocessing.Process(target=main, args=(worker_argv,), daemon=True)
+        process.start()
+        workers.append(process)
+    return workers
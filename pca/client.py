@@ -0,0 +1,112 @@
+"""
+
+    pca.client
+    ~~~~~~~~~~~~
+
+    Shared HTTP client for fetching pages: pooled keep-alive connections, compressed transfer, timeouts and retries.
+
+"""
+
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING  # 'gzip,deflate', plus 'br' if a brotli decoder is installed
+from urllib3.util.retry import Retry
+
+POOL_SIZE = 8  # number of keep-alive connections kept open per host
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+RETRIES = 3
+BACKOFF = 0.5  # retries wait BACKOFF * 2 ** (retry - 1) seconds...
+JITTER = 0.5  # ...plus a random number of seconds up to JITTER
+RETRY_STATUSES = (500, 502, 503, 504)
+USER_AGENT = "pca-scrape"
+
+
+class InstrumentedAdapter(HTTPAdapter):
+
+    """
+    Transport adapter recording time spent opening each new pooled connection (DNS lookup, TCP and TLS handshakes) in 'metrics'.
+    """
+
+    def __init__(self, metrics, **kwargs):
+        self.metrics = metrics  # set first: the base class creates the pool manager
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: timed_pool_class(pool_class, self.metrics)
+            for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items()}
+
+
+def timed_pool_class(pool_class, metrics):
+    """Return subclass of urllib3 connection pool class whose connections record their connect time in metrics."""
+    class TimedConnection(pool_class.ConnectionCls):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                metrics.observe("connect_seconds", time.perf_counter() - start)
+
+    return type(pool_class.__name__, (pool_class,), {"ConnectionCls": TimedConnection})
+
+
+class HTTPClient:
+
+    """
+    HTTP client sharing one pool of keep-alive connections between threads. Negotiates compressed transfer, applies connect/read timeouts and retries GET requests with exponential backoff and jitter on connection errors and 5xx statuses ('retry_statuses'). Pass a 'requests' transport adapter as 'transport' to replace the network (e.g. in tests). With 'metrics' (a 'pca.metrics.Metrics'), records connect time, time to first byte, download time, bytes transferred and responses by status.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF, jitter=JITTER, transport=None, metrics=None,
+                 retry_statuses=RETRY_STATUSES):
+        self.timeout = (connect_timeout, read_timeout)
+        self.metrics = metrics
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": ACCEPT_ENCODING, "User-Agent": USER_AGENT})
+        if transport is None:
+            params = dict(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=self.retry_policy(retries, backoff, jitter, retry_statuses))
+            transport = HTTPAdapter(**params) if metrics is None else InstrumentedAdapter(metrics, **params)
+        self.session.mount("http://", transport)
+        self.session.mount("https://", transport)
+
+    @staticmethod
+    def retry_policy(retries, backoff, jitter, statuses=RETRY_STATUSES):
+        """Return retry policy for idempotent requests (retried on connection errors and 'statuses')."""
+        # with 'Retry-After' respected, urllib3 retries 413, 429 and 503 responses even if they aren't in 'statuses'
+        params = dict(total=retries, backoff_factor=backoff, status_forcelist=statuses,
+                      allowed_methods=frozenset(["GET", "HEAD"]), raise_on_status=False,
+                      respect_retry_after_header=503 in statuses)
+        try:
+            return Retry(backoff_jitter=jitter, **params)
+        except TypeError:  # urllib3 < 2.0 has no jitter
+            return Retry(**params)
+
+    def get(self, url, headers=None):
+        """Send GET request and return the response (with its body already read)."""
+        if self.metrics is None:
+            return self.session.get(url, headers=headers, timeout=self.timeout)
+        start = time.perf_counter()
+        response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+        headers_read = time.perf_counter()
+        body = response.content
+        self.metrics.observe("ttfb_seconds", headers_read - start)  # includes connect time of a new connection
+        self.metrics.observe("download_seconds", time.perf_counter() - headers_read)
+        self.metrics.incr("http_responses_total", status=response.status_code)
+        self.metrics.incr("bytes_received_total", response.raw.tell() if response.raw is not None else len(body))
+        self.metrics.incr("bytes_decoded_total", len(body))
+        return response
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
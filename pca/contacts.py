@@ -0,0 +1,156 @@
+"""
+
+    pca.contacts
+    ~~~~~~~~~~~~~~
+
+    Normalize and validate contact details of batches of scraped labs and find contacts shared by several labs.
+
+"""
+
+import re
+
+from .data import FILEPATH_TEMPLATE, dump_json_atomically
+from .lab import as_dict
+
+CONTACTS_PATH = FILEPATH_TEMPLATE.format("contacts.json")
+BATCH_SIZE = 10000  # labs normalized at once by 'normalize_contacts'
+STREAM_BATCH_SIZE = 500  # labs normalized at once on their way to the writers, so that they aren't held back long
+COUNTRY_CODE = "48"
+NATIONAL_LENGTH = 9  # digits of a Polish phone number without the country code
+
+# batches of values are joined into one text of lines and normalized by single regex passes over the whole text;
+# each pattern matches every line, the group holds the normalized value of a valid one
+NON_DIGITS_REGEX = re.compile(r"[^\d\n]+")
+PHONE_REGEX = re.compile(r"^(?:00" + COUNTRY_CODE + "|" + COUNTRY_CODE + r"|0)?([1-9]\d{" + str(NATIONAL_LENGTH - 1) + r"})$|^.*$",
+                         re.MULTILINE)  # country code or the former trunk prefix, then a national number
+DOMAIN_PATTERN = r"(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z]{2,}"
+EMAIL_REGEX = re.compile(r"^[^\S\n]*([a-z0-9._%+-]+@" + DOMAIN_PATTERN + r")[^\S\n]*$|^.*$", re.MULTILINE)
+WWW_REGEX = re.compile(r"^[^\S\n]*(?:[a-z]+://)?(" + DOMAIN_PATTERN + r")\.?(?:/[^\n]*)?[^\S\n]*$|^.*$", re.MULTILINE)
+
+
+def normalize_all(values, regex, prepare=None, prefix=""):
+    """
+    Return list of values normalized by one pass of 'regex' over all of them joined into lines ("" for invalid ones). Values are lowercased and passed through 'prepare' (applied to the joined text) first.
+    """
+    values = [value or "" for value in values]
+    if not values:
+        return []
+    if any("\n" in value for value in values):  # can't be joined into lines, normalize one by one
+        return [normalize_all([value.replace("\n", " ")], regex, prepare, prefix)[0] for value in values]
+    text = "\n".join(values).lower()
+    if prepare is not None:
+        text = prepare(text)
+    return [prefix + value if value else "" for value in regex.findall(text)]
+
+
+def normalize_phones(phones):
+    """Return phone numbers in E.164 format (e.g. '+48616280300' for '61 628-03-00' or '(+48) 61 628 03 00'), "" for ones that aren't valid Polish numbers."""
+    return normalize_all(phones, PHONE_REGEX, lambda text: NON_DIGITS_REGEX.sub("", text), "+" + COUNTRY_CODE)
+
+
+def normalize_emails(emails):
+    """Return stripped, lowercased emails, "" for ones that aren't valid."""
+    return normalize_all(emails, EMAIL_REGEX)
+
+
+def normalize_wwws(wwws):
+    """Return lowercased domains of website addresses (without scheme, path and trailing dot), "" for ones that aren't valid."""
+    return normalize_all(wwws, WWW_REGEX)
+
+
+def normalize_phone(phone):
+    """Return phone number in E.164 format, "" if it's not a valid Polish number."""
+    return normalize_phones([phone])[0]
+
+
+def normalize_email(email):
+    """Return stripped, lowercased email, "" if it's not valid."""
+    return normalize_emails([email])[0]
+
+
+def normalize_www(www):
+    """Return lowercased domain of website address, "" if it's not valid."""
+    return normalize_wwws([www])[0]
+
+
+NORMALIZERS = {"phone": normalize_phones, "cellphone": normalize_phones, "email": normalize_emails,
+               "www": normalize_wwws}
+KINDS = {"phone": "phone", "cellphone": "phone", "email": "email", "www": "www"}  # phones of both columns are matched
+
+
+class ContactIndex:
+
+    """
+    Normalized contacts of labs added batch by batch. Each contact column of a batch is normalized as a whole: its distinct raw values not seen before are normalized by single regex passes over all of them and the rest are dict lookups. Normalized contacts are indexed by hash, so contacts shared by several labs (phones across both phone columns, emails, website domains) are found without comparing labs pairwise. Raw contacts that fail validation are kept in 'invalid' by lab number.
+    """
+
+    def __init__(self):
+        self.index = {kind: {} for kind in set(KINDS.values())}  # kind: {normalized contact: number of its first lab}
+        self.shared = {kind: {} for kind in self.index}  # kind: {normalized contact: {number of each of its labs: None}}
+        self.invalid = {}  # lab number: {column: raw value}
+        self.count = 0
+        self.cache = {column: {} for column in NORMALIZERS}  # column: {raw value: normalized value}
+
+    def add(self, labs):
+        """Normalize contacts of a batch of labs (dicts or 'pca.lab.Lab's, left as they are) and return copies of them as lab dicts with normalized contacts."""
+        labs = [dict(as_dict(lab)) for lab in labs]
+        numbers = [lab["number"] for lab in labs]
+        for column, normalize in NORMALIZERS.items():
+            raw = [lab[column] for lab in labs]
+            cache = self.cache[column]
+            distinct = set(raw)
+            new = list(distinct.difference(cache))
+            cache.update(zip(new, normalize(new)))
+            normalized = [cache[value] for value in raw]
+            index, shared = self.index[KINDS[column]], self.shared[KINDS[column]]
+            for lab, number, contact in zip(labs, numbers, normalized):
+                lab[column] = contact
+                if contact:
+                    first = index.setdefault(contact, number)
+                    if first != number:
+                        shared.setdefault(contact, {first: None})[number] = None  # ordered set of lab numbers
+            invalid = {value for value in distinct if value and not cache[value]}
+            if invalid:
+                for number, value in zip(numbers, raw):
+                    if value in invalid:
+                        self.invalid.setdefault(number, {})[column] = value
+        self.count += len(labs)
+        return labs
+
+    def duplicates(self, kind=None):
+        """Return {(kind, contact): lab numbers} of contacts shared by more than one lab (only of given kind, if any)."""
+        kinds = [kind] if kind is not None else sorted(self.index)
+        return {(kind, contact): list(numbers) for kind in kinds for contact, numbers in self.shared[kind].items()}
+
+    def summary(self):
+        """Return dict with the numbers of labs, labs with invalid contacts and shared contacts by kind."""
+        summary = {"labs": self.count, "invalid": len(self.invalid)}
+        for kind in sorted(self.index):
+            summary[f"shared_{kind}s"] = len(self.duplicates(kind))
+        return summary
+
+    def write(self, path=CONTACTS_PATH):
+        """Write summary, shared and invalid contacts to JSON file (e.g. for deduplication of a CRM)."""
+        report = {
+            "summary": self.summary(),
+            "shared": [{"kind": kind, "contact": contact, "labs": numbers}
+                       for (kind, contact), numbers in self.duplicates().items()],
+            "invalid": self.invalid
+        }
+        dump_json_atomically(report, path)
+        print(f"Contacts report written to: '{path}'")  # debug
+
+
+def normalize_contacts(labs, index=None, batch_size=BATCH_SIZE):
+    """
+    Yield labs (dicts) with normalized contacts, normalizing them in batches of 'batch_size' labs, so that a stream of labs can go on to the writers (which wait for each batch: stream with a small one, e.g. 'STREAM_BATCH_SIZE'). Contacts are indexed in 'index' (a 'ContactIndex'), if given, to find duplicates once the stream is done.
+    """
+    index = ContactIndex() if index is None else index
+    batch = []
+    for lab in labs:
+        batch.append(lab)
+        if len(batch) >= batch_size:
+            yield from index.add(batch)
+            batch = []
+    if batch:
+        yield from index.add(batch)
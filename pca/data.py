@@ -9,64 +9,417 @@
 
 import json
 import csv
+import os
+import re
+import shutil
+import string
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
 import xlwt
 
+from .lab import FIELDS, Lab, as_dict
+from .metrics import Metrics
+
 FILEPATH_TEMPLATE = "data/scraped_data.{}"
-COL_HEADERS = ["number", "certdate", "org_name", "org_address", "lab_name",
-               "lab_address", "phone", "cellphone", "email", "www", "research_fields",
-               "research_objects"]
+PARTIAL_SUFFIX = ".partial"  # of files being written, moved over the output once complete
+COL_HEADERS = list(FIELDS)
+COLUMN_LETTERS = string.ascii_uppercase  # spreadsheet columns of lab fields
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/sharedStrings.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>{}</Types>')
+XLSX_SHEET_OVERRIDE = ('<Override PartName="/xl/worksheets/sheet{}.xml" '
+                       'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>')
+XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>')
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>{}</sheets></workbook>')
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{}'
+    '<Relationship Id="rId{}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" '
+    'Target="sharedStrings.xml"/></Relationships>')
+XLSX_SHEET_REL = ('<Relationship Id="rId{0}" '
+                  'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                  'Target="worksheets/sheet{0}.xml"/>')
+XLSX_SHARED_STRINGS_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                            '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                            'uniqueCount="{}">')
+
+
+class Writer:
+
+    """
+    Base of streaming writers (sinks) of scraped data: each lab record is written as soon as it comes, so memory use stays flat and partial results are on disk if a run dies halfway. Labs are written to 'partial_path' ('path' with 'PARTIAL_SUFFIX'), moved over 'path' only when the writer is closed at the end of a complete stream, so the previous output stays intact until then (writers with 'PARTIAL' unset write to 'path' directly).
+    """
+
+    EXTENSION = None
+    PARTIAL = True
+
+    def __init__(self, path=None):
+        self.path = FILEPATH_TEMPLATE.format(self.EXTENSION) if path is None else path
+        self.partial_path = self.path + PARTIAL_SUFFIX if self.PARTIAL else self.path
+        self.count = 0
+
+    def write(self, lab):
+        """Write one lab record."""
+        raise NotImplementedError
+
+    def close(self, complete=True):
+        """Finish writing. If the stream was 'complete', the partial file replaces the output, otherwise it's left beside the untouched previous output."""
+        if complete and self.partial_path != self.path:
+            os.replace(self.partial_path, self.path)
+        path = self.path if complete else self.partial_path
+        print(f"{self.count} labs written to: '{path}'" + ("" if complete else " (incomplete)"))  # debug
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        self.close(complete=exc_type is None)
+
+
+class JSONLinesWriter(Writer):
+
+    """Write labs to JSON Lines file (one JSON object per line)."""
+
+    EXTENSION = "jsonl"
+
+    def __init__(self, path=None):
+        super().__init__(path)
+        self.file = open(self.partial_path, "w", encoding="utf-8")
+
+    def write(self, lab):
+        self.file.write(to_json_text(lab) + "\n")
+        self.file.flush()
+        self.count += 1
+
+    def close(self, complete=True):
+        self.file.close()
+        super().close(complete)
+
+
+class JSONArrayWriter(Writer):
+
+    """Write labs to JSON file in the '{"labs": [...]}' form read by 'from_json', one array element at a time."""
+
+    EXTENSION = "json"
+
+    def __init__(self, path=None):
+        super().__init__(path)
+        self.file = open(self.partial_path, "w", encoding="utf-8")
+        self.file.write('{"labs": [')
+
+    def write(self, lab):
+        self.file.write((", " if self.count else "") + to_json_text(lab))
+        self.file.flush()
+        self.count += 1
+
+    def close(self, complete=True):
+        self.file.write("]}")
+        self.file.close()
+        super().close(complete)
+
+
+class CSVWriter(Writer):
+
+    """Write labs to '|'-delimited CSV file."""
+
+    EXTENSION = "csv"
+
+    def __init__(self, path=None):
+        super().__init__(path)
+        self.file = open(self.partial_path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file, delimiter="|")
+        self.writer.writerow(COL_HEADERS)
+
+    def write(self, lab):
+        self.writer.writerow(to_list(lab))
+        self.file.flush()
+        self.count += 1
+
+    def close(self, complete=True):
+        self.file.close()
+        super().close(complete)
+
+
+class XLSWriter(Writer):
+
+    """
+    Write labs to Excel spreadsheet. Rows already written are flushed to compact storage every 'FLUSH_EVERY' labs, but the workbook itself is saved only when the writer is closed.
+    """
+
+    EXTENSION = "xls"
+    FLUSH_EVERY = 100
+
+    def __init__(self, path=None):
+        super().__init__(path)
+        self.book = xlwt.Workbook()
+        self.sheet = self.book.add_sheet("labs")
+        self.write_row(0, COL_HEADERS)
+
+    def write_row(self, i, data_row):
+        """Write one row of the sheet."""
+        sheet_row = self.sheet.row(i)
+        for j, item in enumerate(data_row):
+            sheet_row.write(j, item)
+
+    def write(self, lab):
+        self.count += 1
+        self.write_row(self.count, to_list(lab))
+        if self.count % self.FLUSH_EVERY == 0:
+            self.sheet.flush_row_data()
+
+    def close(self, complete=True):
+        self.book.save(self.partial_path)
+        super().close(complete)
+
+
+class XLSXWriter(Writer):
+
+    """
+    Write labs to Office Open XML (.xlsx) workbook, streaming rows to temporary sheet files in batches of 'FLUSH_EVERY', so memory use stays flat however many labs are written. Research field and object values go to the shared string table (stored once however many labs repeat them), other values are inlined. With 'sections', each lab's research fields and objects are also written one per row to separate 'research_fields' and 'research_objects' sheets. A sheet reaching 'MAX_ROWS' rows is continued on a new one ('labs (2)', ...), so there is no limit on the number of labs.
+    """
+
+    EXTENSION = "xlsx"
+    FLUSH_EVERY = 1000
+    MAX_ROWS = 1048576  # rows of one worksheet
+    SHARED_COLUMNS = {"research_fields", "research_objects"}
+    INVALID_XML_REGEX = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+    def __init__(self, path=None, sections=False):
+        super().__init__(path)
+        self.directory = tempfile.mkdtemp()
+        self.shared_strings = {}
+        self.sheets = []  # finished and open sheets: [name, path, file, number of rows, pending rows]
+        self.current = {}  # open sheet of each kind
+        self.headers = {"labs": COL_HEADERS}
+        if sections:
+            self.headers.update({"research_fields": ["number", "research_field"],
+                                 "research_objects": ["number", "research_object"]})
+        for kind in self.headers:
+            self.open_sheet(kind)
+
+    def open_sheet(self, kind):
+        """Start new sheet of given kind with a row of headers."""
+        n = sum(1 for sheet in self.sheets if sheet[0].split(" (")[0] == kind)
+        path = os.path.join(self.directory, f"sheet{len(self.sheets) + 1}.xml")
+        sheet = [kind if n == 0 else f"{kind} ({n + 1})", path, open(path, "w", encoding="utf-8"), 0, []]
+        sheet[2].write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                       '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+        self.sheets.append(sheet)
+        self.current[kind] = sheet
+        self.append_row(kind, [(header, False) for header in self.headers[kind]])
+
+    def append_row(self, kind, cells):
+        """Append row of (value, shared) cells to the open sheet of given kind."""
+        sheet = self.current[kind]
+        if sheet[3] == self.MAX_ROWS:
+            self.close_sheet(sheet)
+            self.open_sheet(kind)
+            sheet = self.current[kind]
+        sheet[3] += 1
+        row = sheet[3]
+        xml = [f'<row r="{row}">']
+        for column, (value, shared) in zip(COLUMN_LETTERS, cells):
+            if value == "":
+                continue
+            if shared:
+                index = self.shared_strings.setdefault(value, len(self.shared_strings))
+                xml.append(f'<c r="{column}{row}" t="s"><v>{index}</v></c>')
+            else:
+                xml.append(f'<c r="{column}{row}" t="inlineStr"><is><t xml:space="preserve">'
+                           f'{self.escape(value)}</t></is></c>')
+        xml.append("</row>")
+        sheet[4].append("".join(xml))
+        if len(sheet[4]) >= self.FLUSH_EVERY:
+            self.flush_sheet(sheet)
+
+    @classmethod
+    def escape(cls, value):
+        """Return value escaped for XML text."""
+        return escape(cls.INVALID_XML_REGEX.sub("", str(value)))
+
+    @staticmethod
+    def flush_sheet(sheet):
+        """Write pending rows of sheet to its file."""
+        sheet[2].write("".join(sheet[4]))
+        sheet[4] = []
+
+    def close_sheet(self, sheet):
+        """Finish file of sheet."""
+        self.flush_sheet(sheet)
+        sheet[2].write("</sheetData></worksheet>")
+        sheet[2].close()
+
+    def write(self, lab):
+        data_row = to_list(lab)
+        self.append_row("labs", [(item, header in self.SHARED_COLUMNS) for header, item in zip(COL_HEADERS, data_row)])
+        for kind in self.current:
+            if kind != "labs":
+                for item in lab[kind]:
+                    self.append_row(kind, [(lab["number"], False), (item, True)])
+        self.count += 1
+
+    def close(self, complete=True):
+        try:
+            for sheet in self.current.values():
+                self.close_sheet(sheet)
+            with zipfile.ZipFile(self.partial_path, "w", zipfile.ZIP_DEFLATED) as book:
+                self.write_package(book)
+        finally:
+            shutil.rmtree(self.directory)
+        super().close(complete)
+
+    def write_package(self, book):
+        """Write workbook parts and sheets to zip archive."""
+        n = len(self.sheets)
+        book.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES.format("".join(
+            XLSX_SHEET_OVERRIDE.format(i) for i in range(1, n + 1))))
+        book.writestr("_rels/.rels", XLSX_RELS)
+        book.writestr("xl/workbook.xml", XLSX_WORKBOOK.format("".join(
+            f'<sheet name="{self.escape(sheet[0])}" sheetId="{i}" r:id="rId{i}"/>'
+            for i, sheet in enumerate(self.sheets, 1))))
+        book.writestr("xl/_rels/workbook.xml.rels", XLSX_WORKBOOK_RELS.format("".join(
+            XLSX_SHEET_REL.format(i) for i in range(1, n + 1)), n + 1))
+        with book.open("xl/sharedStrings.xml", "w") as shared_file:
+            shared_file.write(XLSX_SHARED_STRINGS_HEAD.format(len(self.shared_strings)).encode("utf-8"))
+            for value in self.shared_strings:
+                shared_file.write(f'<si><t xml:space="preserve">{self.escape(value)}</t></si>'.encode("utf-8"))
+            shared_file.write(b"</sst>")
+        for i, sheet in enumerate(self.sheets, 1):
+            book.write(sheet[1], f"xl/worksheets/sheet{i}.xml")
+
+
+def export(labs, sinks, metrics=None):
+    """
+    Stream labs (any iterable, e.g. a generator of freshly parsed ones) to all sinks and close them (as incomplete, leaving previous outputs in place, if the stream fails). Return number of labs. Time spent in each sink is recorded in 'metrics' (a 'pca.metrics.Metrics'), if given.
+    """
+    metrics = Metrics() if metrics is None else metrics
+    count, complete = 0, False
+    try:
+        for lab in labs:
+            with metrics.stage("export"):
+                for sink in sinks:
+                    with metrics.timer("export_seconds", sink=type(sink).__name__):
+                        sink.write(lab)
+            count += 1
+        complete = True
+    finally:
+        for sink in sinks:
+            with metrics.timer("export_close_seconds", sink=type(sink).__name__):
+                sink.close(complete)
+    metrics.incr("labs_exported_total", count)
+    return count
 
 
 def to_json(scraped_data):
     """Write scraped data to JSON file."""
-    with open(FILEPATH_TEMPLATE.format("json"), "w") as outfile:
-        json.dump({"labs": scraped_data}, outfile, ensure_ascii=False)
-        print(f"Data written to: '{path}'")  # debug
+    export(scraped_data, [JSONArrayWriter()])
+
+
+def to_jsonl(scraped_data):
+    """Write scraped data to JSON Lines file."""
+    export(scraped_data, [JSONLinesWriter()])
+
+
+def dump_json_atomically(obj, path):
+    """Write object to JSON file through a temporary file, so that the file is never left half-written."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+            json.dump(obj, tmp_file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 
-def from_json():
-    """Load and return scraped JSON data."""
-    path = FILEPATH_TEMPLATE.format("json")
+def from_json(records=False, path=None):
+    """Load and return scraped JSON data (as 'pca.lab.Lab' records instead of dicts if 'records') from the default output or file at 'path'."""
+    path = FILEPATH_TEMPLATE.format("json") if path is None else path
     try:
-        with open(path) as json_file:
+        with open(path, encoding="utf-8") as json_file:
             json_data = json.load(json_file)
-    except OSError as ose:
-        print(f"Cannot load scraped JSON data at {path} (OSError: {ose}")
+    except (OSError, ValueError) as e:  # missing or (e.g. half-written) invalid file
+        print(f"Cannot load scraped JSON data at {path} ({type(e).__name__}: {e})")
+        return []
 
+    if records:
+        return [Lab.from_dict(lab) for lab in json_data["labs"]]
     return json_data["labs"]
 
 
-def to_lists(scraped_data):
+def to_manifest(manifest, path=None):
+    """Write manifest of scraped pages (content hash and expire date per lab number) to JSON file (the default one or file at 'path')."""
+    dump_json_atomically(manifest, FILEPATH_TEMPLATE.format("manifest.json") if path is None else path)
+
+
+def from_manifest(path=None):
+    """Load and return manifest of scraped pages from the default file or file at 'path' (empty if there is none yet)."""
+    path = FILEPATH_TEMPLATE.format("manifest.json") if path is None else path
+    try:
+        with open(path, encoding="utf-8") as json_file:
+            return json.load(json_file)
+    except OSError:
+        return {}
+
+
+def to_diff(diff, path=None):
+    """Write summary of changes between two scrapes (added, removed and changed lab numbers) to JSON file (the default one or file at 'path')."""
+    path = FILEPATH_TEMPLATE.format("diff.json") if path is None else path
+    with open(path, "w", encoding="utf-8") as outfile:
+        json.dump(diff, outfile, ensure_ascii=False, indent=2)
+        print("Added: {}, removed: {}, changed: {} labs. Summary written to: '{}'".format(
+            len(diff["added"]), len(diff["removed"]), len(diff["changed"]), path))  # debug
+
+
+def to_json_text(lab):
+    """Return JSON text of a lab (dict or 'pca.lab.Lab')."""
+    return json.dumps(as_dict(lab), ensure_ascii=False)
+
+
+def to_list(lab):
     """
-    Translate elements of scraped data (a list) from dicts to lists and return it. Convert 'research_fields' and 'research_objects' lists to ' :: '-delimited strings.
+    Translate a lab from dict (or 'pca.lab.Lab') to list. Convert 'research_fields' and 'research_objects' lists to ' :: '-delimited strings.
     """
     delimiter = " :: "
-    return [[lab["number"], lab["certdate"], lab["org_name"], lab["org_address"], lab["lab_name"],
-             lab["lab_address"], lab["phone"], lab["cellphone"], lab["email"], lab["www"],
-             delimiter.join([rf for rf in lab["research_fields"]]),
-             delimiter.join([ro for ro in lab["research_objects"]])] for lab in scraped_data]
+    return [lab["number"], lab["certdate"], lab["org_name"], lab["org_address"], lab["lab_name"],
+            lab["lab_address"], lab["phone"], lab["cellphone"], lab["email"], lab["www"],
+            delimiter.join(lab["research_fields"]),
+            delimiter.join(lab["research_objects"])]
+
+
+def to_lists(scraped_data):
+    """Translate elements of scraped data (a list) from dicts to lists (see 'to_list') and return it."""
+    return [to_list(lab) for lab in scraped_data]
 
 
 def to_csv(scraped_data):
     """Write scraped data to '|'-delimited CSV file"""
-    path = FILEPATH_TEMPLATE.format("csv")
-    with open(path, "w") as csv_file:
-        writer = csv.writer(csv_file, delimiter="|")
-        writer.writerow(COL_HEADERS)
-        print("Writing {} rows of data to {}}...".format(len(scraped_data), path))  # debug
-        writer.writerows(to_lists(scraped_data))
+    export(scraped_data, [CSVWriter()])
 
 
 def to_xls(scraped_data):
     """Write scraped data to Excel spreadsheet"""
-    book = xlwt.Workbook()
-    sheet = book.add_sheet("labs")
-
-    data = [COL_HEADERS] + to_lists(scraped_data)
+    export(scraped_data, [XLSWriter()])
 
-    for i, data_row in enumerate(data):
-        sheet_row = sheet.row(i)
-        for j, item in enumerate(data_row):
-            sheet_row.write(j, item)
 
-    book.save(FILEPATH_TEMPLATE.format("xls"))
+def to_xlsx(scraped_data, sections=False):
+    """Write scraped data to Excel (.xlsx) workbook (with separate sheets of research fields and objects if 'sections')"""
+    export(scraped_data, [XLSXWriter(sections=sections)])
@@ -0,0 +1,179 @@
+"""
+
+    pca.fetcher
+    ~~~~~~~~~~~~~
+
+    Fetch pages concurrently with bounded parallelism and per-host rate limiting.
+
+"""
+
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from .client import RETRY_STATUSES, HTTPClient
+from .metrics import Metrics
+from .scheduler import THROTTLE_STATUSES, AdaptiveScheduler
+
+
+CONCURRENCY = 8  # number of worker threads fetching pages at the same time
+RATE = 30.0  # maximum number of requests per second sent to one host
+THROTTLED_ATTEMPTS = 5  # times a throttled request is sent (after the pause asked for) in adaptive mode
+
+
+class RateLimiter:
+
+    """Thread-safe token bucket refilled at 'rate' tokens per second up to 'burst' tokens."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Fetcher:
+
+    """
+    Fetch pages in a pool of worker threads, limiting the rate of requests sent to each host. Requests are sent by 'client' (a 'pca.client.HTTPClient' with a connection pool as big as 'concurrency' by default). No more than 'concurrency' requests are in flight at once, even when several scrapes (e.g. of different registries) fetch through one fetcher at the same time, so they all share its connection pool. Pages are served from and stored in 'cache' (a 'pca.cache.ResponseCache'), if given. Fetch times, pages by source (cache, network) and HTTP metrics of the default client are recorded in 'metrics' (a 'pca.metrics.Metrics', shared by the rest of the run).
+
+    If 'adaptive', requests to each host are also scheduled by a 'pca.scheduler.AdaptiveScheduler', which finds the concurrency the host copes with (up to 'concurrency') from its response times and errors. Throttled requests (429, 503) are then handled here instead of being retried by the default client: they are sent again, up to 'THROTTLED_ATTEMPTS' times, once the host's pause (as its 'Retry-After' asks) is over. Live state of the schedulers is returned by 'state'.
+    """
+
+    def __init__(self, concurrency=CONCURRENCY, rate=RATE, burst=None, cache=None, client=None, metrics=None,
+                 adaptive=False):
+        if concurrency < 1:
+            raise ValueError("Concurrency must be a positive integer.")
+        self.concurrency = concurrency
+        self.rate = rate  # 'None' or 0 disables rate limiting
+        self.burst = burst
+        self.cache = cache
+        self.metrics = Metrics() if metrics is None else metrics
+        self.adaptive = adaptive
+        if client is None:
+            statuses = [status for status in RETRY_STATUSES if not (adaptive and status in THROTTLE_STATUSES)]
+            client = HTTPClient(pool_size=concurrency, metrics=self.metrics, retry_statuses=statuses)
+        self.client = client
+        self.limiters = {}
+        self.schedulers = {}
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(concurrency)  # requests in flight across concurrent 'fetch_all' calls
+
+    def limiter(self, url):
+        """Return rate limiter of the host of given URL."""
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = RateLimiter(self.rate, self.burst)
+            return self.limiters[host]
+
+    def scheduler(self, url):
+        """Return adaptive scheduler of the host of given URL."""
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.schedulers:
+                self.schedulers[host] = AdaptiveScheduler(self.concurrency, metrics=self.metrics, host=host)
+            return self.schedulers[host]
+
+    def state(self):
+        """Return {host: state} of adaptive schedulers (see 'pca.scheduler.AdaptiveScheduler.state')."""
+        with self.lock:
+            schedulers = dict(self.schedulers)
+        return {host: scheduler.state() for host, scheduler in schedulers.items()}
+
+    def fetch(self, url, number=None, source=False):
+        """Fetch page at given URL (of lab with given number) and return its text or 'None' if there is no such page ((text, source) pair if 'source', see 'fetch_page')."""
+        with self.metrics.timer("fetch_seconds"):
+            body, origin = self.fetch_page(url, number)
+        self.metrics.incr("pages_fetched_total", source=origin)
+        return (body, origin) if source else body
+
+    def fetch_page(self, url, number):
+        """Fetch page at given URL and return (text or 'None', source) pair, where source tells where it came from ('offline': not cached in offline mode, so it's unknown whether it exists)."""
+        entry = self.cache.get(url, number) if self.cache is not None else None
+        if entry is not None and (self.cache.offline or self.cache.is_fresh(entry)):
+            return entry["body"], "cache"
+        if self.cache is not None and self.cache.offline:
+            print(f"Page at '{url}' is not cached (offline mode). Skipping...")  # debug
+            return None, "offline"
+
+        headers = self.cache.conditional_headers(entry) if entry is not None else {}
+        response = self.request(url, headers) if self.adaptive else self.send(url, headers)
+        if response.status_code == 304 and entry is not None:
+            self.cache.touch(entry)
+            return entry["body"], "revalidated"
+        if response.status_code == 404:
+            body = None
+        else:
+            response.raise_for_status()
+            body = response.text
+
+        if self.cache is not None:
+            self.cache.put(url, body, number, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return body, "network"
+
+    def send(self, url, headers, scheduler=None):
+        """Send GET request within the limits of concurrency and rate and return the response, reporting it to 'scheduler', if given."""
+        with self.slots:
+            if self.rate:
+                self.limiter(url).acquire()
+            if scheduler is None:
+                return self.client.get(url, headers=headers)
+            started = time.monotonic()  # time spent waiting for a slot or a token isn't the host's latency
+            try:
+                response = self.client.get(url, headers=headers)
+            except Exception:
+                scheduler.release(started, error=True)
+                raise
+        scheduler.release(started, response.status_code, response.headers.get("Retry-After"))
+        return response
+
+    def request(self, url, headers):
+        """Send GET request as scheduled by the adaptive scheduler of its host, again while it's throttled, and return the response."""
+        scheduler = self.scheduler(url)
+        for _ in range(THROTTLED_ATTEMPTS):
+            scheduler.acquire()
+            response = self.send(url, headers, scheduler)
+            if response.status_code not in THROTTLE_STATUSES:
+                break
+            self.metrics.incr("throttled_total", status=response.status_code)
+        return response
+
+    def fetch_all(self, jobs, return_exceptions=False, sources=False):
+        """
+        Fetch pages of (number, url) jobs concurrently and yield (number, contents) pairs in the order of jobs (contents being (text, source) pairs if 'sources', see 'fetch_page'). No more than a few jobs per worker are queued at any time. If 'return_exceptions', a failed fetch yields its exception in place of contents instead of raising it.
+        """
+        window = collections.deque()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for number, url in jobs:
+                window.append((number, executor.submit(self.fetch, url, number, sources)))
+                if len(window) >= 2 * self.concurrency:
+                    yield self.result(*window.popleft(), return_exceptions)
+            while window:
+                yield self.result(*window.popleft(), return_exceptions)
+
+    @staticmethod
+    def result(number, future, return_exceptions):
+        """Return (number, contents) pair of a finished job."""
+        try:
+            return number, future.result()
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return number, e
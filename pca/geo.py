@@ -0,0 +1,231 @@
+"""
+
+    pca.geo
+    ~~~~~~~~~
+
+    Geocode addresses of labs against a bundled offline gazetteer and query labs by distance in a grid index.
+
+"""
+
+import csv
+import itertools
+import math
+import os
+import re
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "gazetteer.csv")
+EARTH_RADIUS = 6371.0  # km
+CELL_SIZE = 0.1  # degrees of latitude and longitude spanned by a cell of the grid index (about 11 km by 7 km)
+
+POSTAL_REGEX = re.compile(r"(\d{2}-\d{3})\s+([^;,]+?)\s*(?:$|[;,])")  # postal code and the city following it
+ABBREVIATIONS = [  # abbreviated parts of city names, e.g. 'Gorzów Wlkp.'
+    (re.compile(r"\bwlkp\.?(?=\s|$)"), "wielkopolski"),
+    (re.compile(r"\bmaz\.?(?=\s|$)"), "mazowiecki"),
+    (re.compile(r"\bśl\.?(?=\s|$)"), "śląskie"),
+    (re.compile(r"\bgd\.?(?=\s|$)"), "gdański"),
+    (re.compile(r"\bśw\.?(?=\s|$)"), "świętokrzyski"),
+]
+
+
+def parse_address(address):
+    """Return (postal code, city) pair of given address (e.g. ('60-706', 'Poznań')), 'None's if it has none."""
+    matches = POSTAL_REGEX.findall(address or "")
+    return matches[-1] if matches else (None, None)
+
+
+def parse_place(place):
+    """Return (postal code, city) pair of an address, a postal code or a city name ('None' for the part it hasn't)."""
+    postal_code, city = parse_address(place)
+    if postal_code is None:
+        match = re.match(r"\s*(\d{2}-\d{3})\s*$", place)
+        postal_code, city = (match.group(1), None) if match else (None, place)
+    return postal_code, city
+
+
+def city_key(city):
+    """Return key of city name for lookups: case-folded, with single spaces, hyphens and expanded abbreviations."""
+    key = " ".join(city.casefold().replace(" - ", "-").split())
+    for regex, replacement in ABBREVIATIONS:
+        key = regex.sub(replacement, key)
+    return key
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """Return great-circle distance between two points in kilometres (haversine formula)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+class Gazetteer:
+
+    """
+    Offline table of coordinates of cities and of postal code prefixes, loaded from a CSV file with 'postal_code', 'city', 'lat' and 'lon' columns (the bundled one holds city centres and an anchor city of every two-digit postal district; a finer table, down to full postal codes, can be dropped in). Places are resolved by city name first and by the longest matching postal code prefix otherwise; resolved pairs are cached, since labs share few distinct places. A city name found at several points is resolved to the point whose postal codes match best, or to the first one if they're all in one postal district (e.g. parts of one city); towns of the same name in different districts that the postal code doesn't tell apart are ambiguous and resolved by postal code alone.
+    """
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self.cities, self.prefixes = {}, {}  # city key: {point: [postal codes of its rows]}, postal code: point
+        with open(path, encoding="utf-8", newline="") as csv_file:
+            for row in csv.DictReader(csv_file):
+                point = (float(row["lat"]), float(row["lon"]))
+                codes = self.cities.setdefault(city_key(row["city"]), {}).setdefault(point, [])
+                if row["postal_code"]:
+                    codes.append(row["postal_code"])
+                    self.prefixes.setdefault(row["postal_code"], point)
+        self.cache = {}
+
+    def resolve(self, postal_code, city):
+        """Return (lat, lon, precision) of place with given postal code and city ('city' or 'postal' precision), 'None' if it's unknown."""
+        key = (postal_code, city)
+        if key not in self.cache:
+            self.cache[key] = self.find(postal_code, city)
+        return self.cache[key]
+
+    def find(self, postal_code, city):
+        places = self.cities.get(city_key(city)) if city else None
+        point = self.pick(places, postal_code) if places else None
+        if point is not None:
+            return point + ("city",)
+        for length in (6, 5, 4, 2):  # '60-706', '60-70', '60-7', '60'
+            point = self.prefixes.get(postal_code[:length]) if postal_code else None
+            if point is not None:
+                return point + ("postal",)
+        return None
+
+    @staticmethod
+    def pick(places, postal_code):
+        """Return point of a city name out of its places ({point: postal codes}) for given postal code, 'None' if ambiguous."""
+        best, length, tie = None, 0, False
+        for point, codes in places.items():
+            match = max((len(code) for code in codes if postal_code and postal_code.startswith(code)), default=0)
+            if match > length:
+                best, length, tie = point, match, False
+            elif match and match == length:
+                tie = True
+        if best is not None and not tie:
+            return best
+        if len(places) == 1 or len({code[:2] for codes in places.values() for code in codes}) == 1:
+            return next(iter(places))
+        return None
+
+    def ambiguous(self, place):
+        """Return whether an address, a postal code or a city name names towns in several postal districts it doesn't tell apart."""
+        postal_code, city = parse_place(place)
+        places = self.cities.get(city_key(city)) if city else None
+        return bool(places) and self.pick(places, postal_code) is None
+
+    def locate(self, place):
+        """Return (lat, lon, precision) of an address, a postal code or a city name, 'None' if it's unknown."""
+        return self.resolve(*parse_place(place))
+
+
+class GridIndex:
+
+    """
+    Spatial index of points (keyed by anything hashable) in a grid of cells 'cell_size' degrees wide. Keys at the same coordinates (labs geocoded to the same place) are grouped, so distance is computed once per distinct point. Radius queries visit only the cells overlapping the bounding box of the circle, nearest-k queries visit rings of cells around the query point until no unvisited cell can hold a nearer point.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (row, column): {(lat, lon): [key]}
+        self.count = 0
+
+    def cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size))
+
+    def add(self, key, lat, lon):
+        """Add point with given key."""
+        self.cells.setdefault(self.cell(lat, lon), {}).setdefault((lat, lon), []).append(key)
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def within(self, lat, lon, radius):
+        """Return (distance, key) pairs of points within 'radius' kilometres of given point, nearest first."""
+        dlat = math.degrees(radius / EARTH_RADIUS)
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        (row1, column1), (row2, column2) = self.cell(lat - dlat, lon - dlon), self.cell(lat + dlat, lon + dlon)
+        found = []
+        for row in range(row1, row2 + 1):
+            for column in range(column1, column2 + 1):
+                for (point_lat, point_lon), keys in self.cells.get((row, column), {}).items():
+                    d = distance(lat, lon, point_lat, point_lon)
+                    if d <= radius:
+                        found.append((d, keys))
+        found.sort(key=lambda pair: pair[0])
+        return [(d, key) for d, keys in found for key in keys]
+
+    def nearest(self, lat, lon, k=1):
+        """Return (distance, key) pairs of the 'k' points nearest to given point, nearest first."""
+        if k <= 0:
+            return []
+        row, column = self.cell(lat, lon)
+        # a point in a cell outside ring 'r' lies at least 'r' cells (in latitude, the narrower side) away
+        cell_km = math.radians(self.cell_size) * EARTH_RADIUS * min(1.0, math.cos(math.radians(min(abs(lat) + 1, 90))))
+        found, nearest, ring, visited = [], [], 0, 0
+        while visited < self.count:
+            for cell in self.ring(row, column, ring):
+                for (point_lat, point_lon), keys in self.cells.get(cell, {}).items():
+                    visited += len(keys)
+                    found.append((distance(lat, lon, point_lat, point_lon), keys))
+            found.sort(key=lambda pair: pair[0])
+            nearest = list(itertools.islice(((d, key) for d, keys in found for key in keys), k))
+            if len(nearest) >= k and nearest[-1][0] <= ring * cell_km:
+                break
+            ring += 1
+        return nearest
+
+    @staticmethod
+    def ring(row, column, r):
+        """Yield cells at Chebyshev distance 'r' from given cell."""
+        if r == 0:
+            yield row, column
+            return
+        for c in range(column - r, column + r + 1):
+            yield row - r, c
+            yield row + r, c
+        for w in range(row - r + 1, row + r):
+            yield w, column - r
+            yield w, column + r
+
+
+class LabMap:
+
+    """
+    Labs geocoded by the postal code and city of their 'field' address ('lab_address' or 'org_address') and indexed for queries by distance. Labs whose place can't be resolved are kept in 'unresolved', those in towns whose name is ambiguous (see 'Gazetteer') and whose postal code doesn't resolve them either in 'ambiguous'.
+    """
+
+    def __init__(self, labs, gazetteer=None, field="lab_address", cell_size=CELL_SIZE):
+        self.gazetteer = Gazetteer() if gazetteer is None else gazetteer
+        self.index = GridIndex(cell_size)
+        self.locations = {}  # lab number: (lat, lon, precision)
+        self.unresolved, self.ambiguous = [], []
+        for lab in labs:
+            location = self.gazetteer.resolve(*parse_address(lab[field]))
+            if location is None:
+                ambiguous = lab[field] and self.gazetteer.ambiguous(lab[field])
+                (self.ambiguous if ambiguous else self.unresolved).append(lab["number"])
+                continue
+            self.locations[lab["number"]] = location
+            self.index.add(lab["number"], location[0], location[1])
+
+    def point(self, place):
+        """Return (lat, lon) of a place given as a (lat, lon) pair, an address, a postal code or a city name."""
+        if isinstance(place, tuple):
+            return place
+        location = self.gazetteer.locate(place)
+        if location is None:
+            if self.gazetteer.ambiguous(place):
+                raise ValueError(f"Ambiguous place: '{place}', give its postal code.")
+            raise ValueError(f"Unknown place: '{place}'.")
+        return location[:2]
+
+    def near(self, place, radius):
+        """Return (distance, lab number) pairs of labs within 'radius' kilometres of place, nearest first."""
+        return self.index.within(*self.point(place), radius)
+
+    def nearest(self, place, k=1):
+        """Return (distance, lab number) pairs of the 'k' labs nearest to place, nearest first."""
+        return self.index.nearest(*self.point(place), k)
@@ -0,0 +1,73 @@
+"""
+
+    pca.lab
+    ~~~~~~~~~
+
+    Memory-lean record of a scraped lab.
+
+"""
+
+import sys
+
+FIELDS = ("number", "certdate", "org_name", "org_address", "lab_name", "lab_address", "phone", "cellphone", "email",
+          "www", "research_fields", "research_objects")
+LIST_FIELDS = ("research_fields", "research_objects")
+
+
+class Lab:
+
+    """
+    Record of a lab with '__slots__' instead of a per-instance dict. String values are interned, so labs of one organisation and labs sharing research field or object categories hold references to the same string objects. 'research_fields' and 'research_objects' are always tuples, empty if the section is missing on the lab's page; names of missing sections (where the dict shape has "") are kept in 'missing', so they can be iterated like any other without a guard. Converts losslessly to and from the dict shape returned by the parser and stored in JSON ('to_dict', 'from_dict'); indexing by key (lab["email"]) returns values in the dict shape, so a Lab can be passed wherever a lab dict is read.
+    """
+
+    __slots__ = FIELDS + ("missing",)
+
+    def __init__(self, number, certdate, org_name, org_address, lab_name, lab_address, phone, cellphone, email, www,
+                 research_fields=(), research_objects=()):
+        values = [number, certdate, org_name, org_address, lab_name, lab_address, phone, cellphone, email, www]
+        for field, value in zip(FIELDS, values):
+            setattr(self, field, sys.intern(value) if isinstance(value, str) else value)
+        self.missing = tuple(field for field, items in zip(LIST_FIELDS, [research_fields, research_objects])
+                             if items is None or items == "")
+        self.research_fields = self.intern_all(research_fields)
+        self.research_objects = self.intern_all(research_objects)
+
+    @staticmethod
+    def intern_all(items):
+        """Return tuple of interned items (empty for a missing section)."""
+        return tuple(sys.intern(item) for item in items or ())
+
+    @classmethod
+    def from_dict(cls, lab):
+        """Create record from lab dict."""
+        return cls(*[lab[field] for field in FIELDS])
+
+    def to_dict(self):
+        """Return lab dict (lists for research sections, "" for missing ones)."""
+        return {field: self[field] for field in FIELDS}
+
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if key in LIST_FIELDS:
+            return "" if key in self.missing else list(value)
+        return value
+
+    def keys(self):
+        return FIELDS
+
+    def __eq__(self, other):
+        if not isinstance(other, Lab):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Lab(number={self.number!r}, lab_name={self.lab_name!r})"
+
+
+def as_dict(lab):
+    """Return lab dict of a lab dict or 'Lab'."""
+    return lab.to_dict() if isinstance(lab, Lab) else lab
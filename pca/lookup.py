@@ -0,0 +1,166 @@
+"""
+
+    pca.lookup
+    ~~~~~~~~~~~~
+
+    Look up single labs on demand, fetching and parsing only their pages, with an in-process LRU cache.
+
+"""
+
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+from .fetcher import Fetcher
+from .registries import REGISTRIES
+from .scraper import URLBuilder
+
+MAXSIZE = 1024  # labs kept in the cache
+TTL = 3600  # seconds a looked up lab is served from the cache
+
+
+class LabLookup:
+
+    """
+    Look up labs by number (1327 or 'AB 1327'): build the URL of the lab's page, fetch and parse only that page and keep the lab (or 'None' if there is no such valid lab) in a cache of the 'maxsize' least recently used labs, each for 'ttl' seconds ('None': until evicted). Lookups of a lab already being fetched (by another thread or within one batch) wait for that request instead of sending their own. Labs are those of the registry of 'builder' (AB by default), parsed by 'parser_class' (by default the parser of that registry, see 'pca.registries'); numbers with the code of another registry are rejected with 'ValueError'.
+    """
+
+    def __init__(self, fetcher=None, builder=None, maxsize=MAXSIZE, ttl=TTL, parser_class=None):
+        self.fetcher = Fetcher() if fetcher is None else fetcher
+        self.builder = URLBuilder() if builder is None else builder
+        self.parser_class = REGISTRIES[self.builder.code].parser_class if parser_class is None else parser_class
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache = collections.OrderedDict()  # (code, number): (lab, expiry time), least recently used first
+        self.pending = {}  # (code, number): Future of the lab being fetched
+        self.lock = threading.Lock()
+
+    def key(self, number):
+        """Return (registry code, integer lab number) key of 1327 or 'AB 1327'. Raise 'ValueError' for other registries."""
+        if isinstance(number, int):
+            return self.builder.code, number
+        code, _, n = number.strip().rpartition(" ")
+        if code.strip() not in ("", self.builder.code):
+            raise ValueError(f"Lab '{number}' isn't in registry {self.builder.code} of this lookup.")
+        return self.builder.code, int(n)
+
+    def cached(self, key):
+        """Return (True, lab) if lab under given key is cached and fresh, (False, None) otherwise (call with lock held)."""
+        entry = self.cache.get(key)
+        if entry is None:
+            return False, None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self.cache[key]
+            return False, None
+        self.cache.move_to_end(key)
+        return True, entry[0]
+
+    def store(self, key, lab):
+        """Cache lab under given key, evicting the least recently used labs over 'maxsize' (call with lock held)."""
+        self.cache[key] = (lab, time.monotonic() + self.ttl if self.ttl is not None else None)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+    def claim(self, keys):
+        """
+        Sort keys into cached labs, futures of labs being fetched by others and keys to be fetched by the caller (whose futures are registered as pending). Return (labs, futures, own) triple.
+        """
+        labs, futures, own = {}, {}, []
+        with self.lock:
+            for key in keys:
+                hit, lab = self.cached(key)
+                if hit:
+                    labs[key] = lab
+                    self.fetcher.metrics.incr("lookups_total", result="hit")
+                elif key in self.pending:
+                    futures[key] = self.pending[key]
+                    self.fetcher.metrics.incr("lookups_total", result="coalesced")
+                else:
+                    self.pending[key] = Future()
+                    own.append(key)
+                    self.fetcher.metrics.incr("lookups_total", result="miss")
+        return labs, futures, own
+
+    def resolve(self, key, lab=None, error=None):
+        """Cache lab fetched under given key (unless fetching failed) and pass it (or the error) to waiting lookups."""
+        with self.lock:
+            future = self.pending.pop(key)
+            if error is None:
+                self.store(key, lab)
+        if error is None:
+            future.set_result(lab)
+        else:
+            future.set_exception(error)
+
+    def get(self, number):
+        """Return lab with given number (or 'None' if there is no such valid lab)."""
+        return self.get_many([number])[number]
+
+    def get_many(self, numbers):
+        """
+        Return dict of labs (or 'None') keyed by given numbers. Labs that aren't cached or being fetched already are fetched concurrently, each once however many times it's asked for. Raises the first error of a failed fetch after all others are done, and 'ValueError' for numbers of other registries before fetching any.
+        """
+        numbers = list(numbers)
+        keys = {number: self.key(number) for number in numbers}
+        labs, futures, own = self.claim(collections.OrderedDict.fromkeys(keys.values()))
+        first_error, unresolved = None, set(own)
+        jobs = ((key, self.builder.url(key[1])) for key in own)
+        try:
+            for key, contents in self.fetcher.fetch_all(jobs, return_exceptions=True):
+                unresolved.discard(key)
+                try:
+                    if isinstance(contents, Exception):
+                        raise contents
+                    lab = self.parser_class(key[1], contents).parse_contents() if contents is not None else None
+                except Exception as e:
+                    first_error = first_error or e
+                    self.resolve(key, error=e)
+                    continue
+                self.resolve(key, lab)
+                labs[key] = lab
+        finally:
+            for key in unresolved:  # interrupted: don't leave other lookups waiting forever
+                self.resolve(key, error=RuntimeError(f"Lookup of lab {key[0]} {key[1]} was interrupted."))
+        for key, future in futures.items():
+            try:
+                labs[key] = future.result()
+            except Exception as e:
+                first_error = first_error or e
+        if first_error is not None:
+            raise first_error
+        return {number: labs[keys[number]] for number in numbers}
+
+    def invalidate(self, number):
+        """Drop lab with given number from the cache."""
+        with self.lock:
+            self.cache.pop(self.key(number), None)
+
+    def clear(self):
+        """Drop all labs from the cache."""
+        with self.lock:
+            self.cache.clear()
+
+
+_default_lookup = None
+_default_lock = threading.Lock()
+
+
+def default_lookup():
+    """Return lookup shared by 'get_lab' and 'get_labs' (created on first use)."""
+    global _default_lookup
+    with _default_lock:
+        if _default_lookup is None:
+            _default_lookup = LabLookup()
+        return _default_lookup
+
+
+def get_lab(number):
+    """Return lab with given number (e.g. 'AB 1327') fetched from the PCA website, or 'None' if there is no such valid lab."""
+    return default_lookup().get(number)
+
+
+def get_labs(numbers):
+    """Return dict of labs with given numbers fetched from the PCA website (see 'LabLookup.get_many')."""
+    return default_lookup().get_many(numbers)
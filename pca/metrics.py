@@ -0,0 +1,168 @@
+"""
+
+    pca.metrics
+    ~~~~~~~~~~~~~
+
+    Instrumentation of scrape runs: counters, timings and optional per-stage profiling, exported as JSON or Prometheus
+    text.
+
+"""
+
+import cProfile
+import contextlib
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+
+METRICS_PATH = "data/metrics.{}"
+PREFIX = "pca_"
+PROFILE_LINES = 25  # functions listed in profile reports
+
+
+class Metrics:
+
+    """
+    Thread-safe registry of counters (e.g. pages by HTTP status) and timings (count, sum, min and max of observed durations, e.g. parse time per page) with labels. Code of a stage (e.g. 'parse', 'export') run in 'with metrics.stage(name):' is timed too, and, if the stage is listed in 'profile' or 'trace_memory', profiled with cProfile or traced with tracemalloc (in the thread running the stage).
+    """
+
+    def __init__(self, profile=(), trace_memory=()):
+        self.counters = {}
+        self.timings = {}
+        self.profile = set(profile)
+        self.trace_memory = set(trace_memory)
+        self.profiles = {}  # cProfile.Profile of each profiled stage
+        self.memory_peaks = {}  # peak of memory allocated in each traced stage (bytes)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def incr(self, name, value=1, **labels):
+        """Add value to counter with given name and labels."""
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Record duration in timing with given name and labels."""
+        key = self.key(name, labels)
+        with self.lock:
+            timing = self.timings.get(key)
+            if timing is None:
+                self.timings[key] = [1, seconds, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = min(timing[2], seconds)
+                timing[3] = max(timing[3], seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Record duration of the code run in the 'with' block in timing with given name and labels."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time (and, if asked for, profile) the code of given stage run in the 'with' block."""
+        profiler = self.profiler(name) if name in self.profile else None
+        tracing = name in self.trace_memory
+        if tracing:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            elif hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+                tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        if profiler is not None:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1] - before
+                if started:
+                    tracemalloc.stop()
+                with self.lock:
+                    self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), peak)
+            self.observe("stage_seconds", elapsed, stage=name)
+
+    def profiler(self, name):
+        """Return profiler of given stage."""
+        with self.lock:
+            return self.profiles.setdefault(name, cProfile.Profile())
+
+    def profile_report(self, name, sort="cumulative", lines=PROFILE_LINES):
+        """Return text report of the profile of given stage (functions taking the most time first)."""
+        stream = io.StringIO()
+        pstats.Stats(self.profiles[name], stream=stream).sort_stats(sort).print_stats(lines)
+        return stream.getvalue()
+
+    def as_dict(self):
+        """Return all metrics as a JSON-serializable dict."""
+        with self.lock:
+            counters, timings = dict(self.counters), {key: list(timing) for key, timing in self.timings.items()}
+            memory_peaks = dict(self.memory_peaks)
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(counters.items())],
+            "timings": [{"name": name, "labels": dict(labels), "count": count, "sum": total, "min": low, "max": high}
+                        for (name, labels), (count, total, low, high) in sorted(timings.items())],
+            "memory_peaks": memory_peaks,
+            "profiles": {name: self.profile_report(name) for name in sorted(self.profiles)}
+        }
+
+    def to_json(self):
+        """Return all metrics as JSON text."""
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self):
+        """Return counters, timings (as summaries) and memory peaks in Prometheus text exposition format."""
+        metrics = self.as_dict()
+        lines, declared = [], set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for counter in metrics["counters"]:
+            name = PREFIX + counter["name"]
+            declare(name, "counter")
+            lines.append(f"{name}{labels_text(counter['labels'])} {counter['value']}")
+        for timing in metrics["timings"]:
+            name = PREFIX + timing["name"]
+            declare(name, "summary")
+            for suffix, value in [("_count", timing["count"]), ("_sum", timing["sum"])]:
+                lines.append(f"{name}{suffix}{labels_text(timing['labels'])} {value}")
+        for stage, peak in sorted(metrics["memory_peaks"].items()):
+            declare(PREFIX + "stage_memory_peak_bytes", "gauge")
+            lines.append(f"{PREFIX}stage_memory_peak_bytes{labels_text({'stage': stage})} {peak}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=None):
+        """Write metrics to file, in Prometheus text format if its name ends with '.prom', as JSON otherwise."""
+        path = METRICS_PATH.format("json") if path is None else path
+        with open(path, "w") as outfile:
+            outfile.write(self.to_prometheus() if path.endswith(".prom") else self.to_json())
+        print(f"Metrics written to: '{path}'")  # debug
+
+
+def labels_text(labels):
+    """Return labels in Prometheus text format."""
+    if not labels:
+        return ""
+    escaped = ('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+               for name, value in sorted(labels.items()))
+    return "{" + ",".join(escaped) + "}"
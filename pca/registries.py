@@ -0,0 +1,105 @@
+"""
+
+    pca.registries
+    ~~~~~~~~~~~~~~~~
+
+    Definitions of PCA accreditation registries and scraping of several registries in one run.
+
+"""
+
+import queue
+import threading
+
+from .checkpoint import Checkpoint
+from .fetcher import Fetcher
+from .scraper import RETRIES, PageParser, URLBuilder, discover_numbers, iter_scrape
+
+SITE_URL = "https://www.pca.gov.pl/akredytowane-podmioty/akredytacje-aktywne/"
+BUFFER_SIZE = 200  # labs of a registry buffered while labs of an earlier one are yielded
+POLL = 0.5  # seconds between checks whether a registry waiting for buffer space should stop
+
+
+class Registry:
+
+    """
+    Definition of a PCA registry: 'code' prefixing numbers of its entries (e.g. 'AB'), 'path' of its listing under the site URL, 'markers' of its pages that differ from those of research labs' pages (names of 'PageParser' rules mapped to markers, e.g. {'FIELDS_LABEL': 'Dziedziny wzorcowań:'}) and 'columns' its pages have (others are left empty). Entries of every registry are scraped into records of the same fields, so one run can write several registries into the same outputs.
+    """
+
+    def __init__(self, code, path, title, markers=None, columns=None):
+        self.code, self.path, self.title = code, path, title
+        self.markers = markers or {}
+        self.columns = columns
+        if code == "AB" and not markers and columns is None:
+            self.parser_class = PageParser
+        else:
+            self.parser_class = PageParser.variant(code, markers, columns)
+
+    def number(self, n):
+        """Return number of entry 'n' as shown on its page (e.g. 'AB 001')."""
+        return self.code + " " + str(n).zfill(3)
+
+    def builder(self, site=SITE_URL):
+        """Return URL builder of pages of the registry on the site at given URL."""
+        root = site + self.path + "/"
+        return URLBuilder(prefix=root + self.code + "%20", index_url=root + "?page={}", code=self.code)
+
+    def __repr__(self):
+        return f"Registry({self.code!r}, {self.path!r})"
+
+
+# only the layout of AB pages is covered by recorded pages; the others follow it with their own section markers
+REGISTRIES = {registry.code: registry for registry in [
+    Registry("AB", "laboratoria-badawcze", "research laboratories"),
+    Registry("AP", "laboratoria-wzorcujace", "calibration laboratories",
+             markers={"FIELDS_LABEL": "Dziedziny wzorcowań:"}),
+    Registry("AM", "laboratoria-medyczne", "medical laboratories"),
+    Registry("AC", "jednostki-certyfikujace", "certification bodies",
+             markers={"LAB": "Dane jednostki:", "FIELDS_LABEL": "Dziedziny certyfikacji:"}),
+    Registry("AK", "jednostki-inspekcyjne", "inspection bodies",
+             markers={"LAB": "Dane jednostki:", "FIELDS_LABEL": "Dziedziny inspekcji:"}),
+    Registry("AW", "weryfikatorzy", "verifiers",
+             markers={"LAB": "Dane jednostki:", "FIELDS_LABEL": "Zakres weryfikacji:"}),
+]}
+
+
+def iter_scrape_registries(registries, numbers=None, fetcher=None, site=SITE_URL, index=False, retries=RETRIES):
+    """
+    Scrape several registries (codes or 'Registry' definitions) at the same time through one 'fetcher', so that they share its connection pool, cache and rate limits, and yield their labs registry after registry (each in the order of 'numbers', by default discovered for each registry, from its listing pages if 'index'). Labs of registries further on the list are buffered until their turn comes, up to 'BUFFER_SIZE' labs each: a registry with a full buffer waits (its fetches paused) until the registries before it are done.
+    """
+    fetcher = Fetcher() if fetcher is None else fetcher
+    registries = [REGISTRIES[registry] if isinstance(registry, str) else registry for registry in registries]
+    stop, done = threading.Event(), object()
+
+    def put(output, item):
+        """Put item into output as soon as there is room for it. Return 'False' if told to stop meanwhile."""
+        while not stop.is_set():
+            try:
+                output.put(item, timeout=POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(registry, output):
+        try:
+            builder = registry.builder(site)
+            registry_numbers = discover_numbers(fetcher, builder, index=index) if numbers is None else numbers
+            for lab in iter_scrape(registry_numbers, fetcher, builder, Checkpoint(), retries, registry.parser_class):
+                if not put(output, lab):
+                    return
+        except Exception as e:
+            put(output, e)
+        finally:
+            put(output, done)
+
+    outputs = [queue.Queue(BUFFER_SIZE) for _ in registries]
+    for registry, output in zip(registries, outputs):
+        threading.Thread(target=produce, args=(registry, output), name=f"scrape-{registry.code}", daemon=True).start()
+    try:
+        for output in outputs:
+            for item in iter(output.get, done):
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    finally:
+        stop.set()
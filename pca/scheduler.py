@@ -0,0 +1,128 @@
+"""
+
+    pca.scheduler
+    ~~~~~~~~~~~~~~~
+
+    Adaptive politeness: concurrency of requests to a host raised and lowered by AIMD as its responses come in.
+
+"""
+
+import email.utils
+import threading
+import time
+
+INCREASE = 1.0  # requests added to the limit per limit's worth of fast responses
+DECREASE = 0.5  # factor the limit is cut by on a throttled, failed or slow response
+SLOW = 3.0  # a response is slow if it takes this many times the fastest one seen so far...
+SLOW_FLOOR = 0.1  # ...and at least this many seconds (jitter of fast responses isn't congestion)
+SMOOTHING = 0.2  # weight of the latest response in moving averages of latency and error rate
+PAUSE = 1.0  # seconds to hold off a host throttling us without telling for how long
+MAX_PAUSE = 300.0
+THROTTLE_STATUSES = (429, 503)
+
+
+def retry_after(value, now=None):
+    """Return seconds to wait as told by a 'Retry-After' header (delay in seconds or HTTP date), 'None' if it's missing or invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    return max(0.0, date.timestamp() - (time.time() if now is None else now))
+
+
+class AdaptiveScheduler:
+
+    """
+    Thread-safe limit of requests in flight to one host, adjusted by AIMD (additive increase, multiplicative decrease): each fast response raises the limit by 'increase' / limit (one request per round trip of the whole window), a response that is throttled (429, 503), failed or slow (taking 'slow' times the fastest latency seen, and at least 'SLOW_FLOOR', while their moving average does too) cuts it by 'decrease', at most once per round trip (only responses to requests sent after the last cut count). Throttled responses also hold off all requests to the host for as long as their 'Retry-After' header asks ('PAUSE' seconds if it doesn't), capped at 'MAX_PAUSE'. The limit stays between 'minimum' and 'maximum'; 'state' tells how things stand.
+    """
+
+    def __init__(self, maximum, minimum=1, initial=None, increase=INCREASE, decrease=DECREASE, slow=SLOW,
+                 metrics=None, host=""):
+        if not 1 <= minimum <= maximum:
+            raise ValueError("Scheduler limits must satisfy 1 <= minimum <= maximum.")
+        self.maximum, self.minimum = maximum, minimum
+        self.limit = float(minimum if initial is None else min(max(initial, minimum), maximum))
+        self.increase, self.decrease, self.slow = increase, decrease, slow
+        self.metrics, self.host = metrics, host
+        self.in_flight = 0
+        self.latency = None  # moving average of response times
+        self.fastest = None
+        self.error_rate = 0.0  # moving average of the share of throttled and failed responses
+        self.responses = self.throttled = self.errors = self.decreases = 0
+        self.paused_until = 0.0  # monotonic time before which no request is sent
+        self.decreased_at = 0.0  # monotonic time of the last cut of the limit
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Block until a request may be sent (within the limit and not paused) and count it in flight."""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.condition.wait(self.paused_until - now)
+                elif self.in_flight >= int(self.limit):
+                    self.condition.wait()
+                else:
+                    self.in_flight += 1
+                    return
+
+    def release(self, started, status=None, retry_after_header=None, error=False):
+        """Record response (or 'error') to the request sent at 'started' (monotonic time) and adjust the limit."""
+        with self.condition:
+            now = time.monotonic()
+            elapsed = now - started
+            self.in_flight -= 1
+            self.responses += 1
+            throttled = status in THROTTLE_STATUSES
+            failed = error or (status is not None and status >= 500 and not throttled)
+            self.error_rate += SMOOTHING * ((throttled or failed) - self.error_rate)
+            if throttled:
+                self.throttled += 1
+                delay = retry_after(retry_after_header)
+                self.paused_until = max(self.paused_until, now + min(PAUSE if delay is None else delay, MAX_PAUSE))
+                self.cut(started, now, "throttled")
+            elif failed:
+                self.errors += 1
+                self.cut(started, now, "error")
+            else:
+                self.latency = elapsed if self.latency is None else self.latency + SMOOTHING * (elapsed - self.latency)
+                self.fastest = elapsed if self.fastest is None else min(self.fastest, elapsed)
+                threshold = max(self.slow * self.fastest, SLOW_FLOOR)
+                if elapsed > threshold and self.latency > threshold:
+                    self.cut(started, now, "slow")
+                else:
+                    self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            self.condition.notify_all()
+
+    def cut(self, started, now, reason):
+        """Cut the limit by the decrease factor, unless it was cut after the request started at 'started' was sent."""
+        if started < self.decreased_at:
+            return
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self.decreased_at = now
+        self.decreases += 1
+        if self.metrics is not None:
+            self.metrics.incr("scheduler_decreases_total", host=self.host, reason=reason)
+
+    def state(self):
+        """Return dict describing current state: limit, requests in flight, latencies, error rate, counts of responses and seconds left of a pause."""
+        with self.condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "latency": self.latency,
+                "fastest": self.fastest,
+                "error_rate": self.error_rate,
+                "responses": self.responses,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "decreases": self.decreases,
+                "paused_for": max(0.0, self.paused_until - time.monotonic())
+            }
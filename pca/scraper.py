@@ -7,16 +7,24 @@
 
 """
 
-import requests
+import collections
 import datetime
-import time
+import hashlib
 import itertools
+import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 from . import data
+from .fetcher import Fetcher
+from .checkpoint import Checkpoint
+from .shards import POLL, LeaseLost, worker_id
 
 
-CEILING = 1700  # on 28th June 2018 there were 1688 accredited laboratories
+CEILING = 1700  # on 28th June 2018 there were 1688 accredited laboratories; first guess of the upper bound of numbers
+RETRIES = 2  # number of times failed labs are retried at the end of a scrape
+MISSES = 50  # number of consecutive missing labs after which discovery assumes the end of the registry
 
 
 class URLBuilder:
@@ -25,34 +33,53 @@ class URLBuilder:
 
     BASEURL_PREFIX = "https://www.pca.gov.pl/akredytowane-podmioty/akredytacje-aktywne/laboratoria-badawcze/AB%20"
     BASEURL_SUFFIX = ",podmiot.html"
+    INDEX_URL = "https://www.pca.gov.pl/akredytowane-podmioty/akredytacje-aktywne/laboratoria-badawcze/?page={}"
+    LINK_PATTERN = r"{}(?:%20|\s|&nbsp;)(\d+),podmiot\.html"
+    LINK_REGEX = re.compile(LINK_PATTERN.format("AB"))
+
+    def __init__(self, prefix=BASEURL_PREFIX, suffix=BASEURL_SUFFIX, index_url=INDEX_URL, code="AB"):
+        self.prefix, self.suffix, self.index_url, self.code = prefix, suffix, index_url, code
+        if code != "AB":  # links to labs of another registry
+            self.LINK_REGEX = re.compile(self.LINK_PATTERN.format(code))
+        self.urls = (self.url(i) for i in itertools.count(1))
 
-    def __init__(self):
-        self.urls = (self.BASEURL_PREFIX + (str(i).zfill(3) if i < 1000 else str(i)) + self.BASEURL_SUFFIX for i in itertools.count(1))
+    def url(self, number):
+        """Return URL of the page of lab with given number."""
+        return self.prefix + str(number).zfill(3) + self.suffix
+
+    def index_page_url(self, page):
+        """Return URL of given page of the listing of labs."""
+        return self.index_url.format(page)
+
+    def parse_index_page(self, contents):
+        """Return numbers of labs linked from contents of a listing page."""
+        return {int(number) for number in self.LINK_REGEX.findall(contents)}
 
 
 class PageParser:
 
-    """Parse page at given URL."""
+    """Parse contents (HTML text or bytes) of the page of lab with given number."""
 
-    PHONE_REGEX = r"(?:\(?\+?48)?(?:[-\.\(\)\s]*\d){9}\)?"  # matches both cellphone and landline formats with optional prefix '(+48)'
-    EMAIL_REGEX = r"\b[\w\.%+-]+@(?:[\w\.-])+\.[a-zA-Z]{2,}\b"  # a simplified version that matches email in most popular (99% cases) form
-    WWW_REGEX = r"\b(?:[\w\.-])+\.[a-zA-Z]{2,}\b"
+    CODE = "AB"  # registry code prefixing lab numbers
+    PHONE_REGEX = re.compile(r"(?:\(?\+?48)?(?:[-\.\(\)\s]*\d){9}\)?")  # matches both cellphone and landline formats with optional prefix '(+48)'
+    EMAIL_REGEX = re.compile(r"\b[\w\.%+-]+@(?:[\w\.-])+\.[a-zA-Z]{2,}\b")  # a simplified version that matches email in most popular (99% cases) form
+    WWW_REGEX = re.compile(r"\b(?:[\w\.-])+\.[a-zA-Z]{2,}\b")
 
-    def __init__(self, number, url):
-        self.number = "AB " + str(number).zfill(3)
-        time.sleep(0.05)
+    def __init__(self, number, contents):
+        self.number = self.CODE + " " + str(number).zfill(3)
         print("Creating #{} page parser...".format(str(number).zfill(4)))  # debug
-        self.contents = requests.get(url).text
+        self.contents = contents.decode("utf-8") if isinstance(contents, bytes) else contents
 
-    def is_empty(self, line, pattern):
+    @staticmethod
+    def is_empty(line, pattern):
         """Check if currently processed page isn't empty."""
-        if line.split(pattern)[1] == "</strong> </p>":
+        if line.split(pattern, 2)[1] == "</strong> </p>":
             return True
         return False
 
     def lose_cruft(self, line, pattern):
         """Strip line of unwanted characters."""
-        line = line.split(pattern)[1]
+        line = line.split(pattern, 2)[1]
         line = line.replace("</strong>", "").replace("</p>", "")
         return line.strip()
 
@@ -62,7 +89,8 @@ class PageParser:
             raise ValueError("No expire date found in the contents of the processed page.")
         return self.lose_cruft(line, pattern)
 
-    def validate_lab(self, expiredate_str):
+    @staticmethod
+    def validate_lab(expiredate_str):
         """Validate current lab based on expire date of its certificate."""
         day, month, year = [int(d) for d in expiredate_str.split("-")]
         expiredate = datetime.date(year, month, day)
@@ -83,7 +111,7 @@ class PageParser:
 
     def parse_contact_details(self, line, regex):
         """Parse contact details (landline phone, cellphone, email and www)."""
-        match = re.search(regex, line)
+        match = regex.search(line)
         if match is None:
             return ""
         return match.group()
@@ -95,134 +123,479 @@ class PageParser:
 
     def parse_contents(self):
         """Parse contents of processed page."""
-        # sentinels
-        certdate = None
-        org_name, org_address, lab_name, lab_address = None, None, None, None
-        phone, cellphone, email, www = None, None, None, None
-
-        research_fields, research_objects = "", ""  # default values in case these sections are missing on the parsed page
-
-        # flags to control parsing on the line after the one that triggers parsing
-        org_name_on, org_address_on = False, False
-        lab_name_on, lab_address_on = False, False
-        phone_on, email_on, www_on = False, False, False
-        research_fields_on, research_objects_on = False, False
-
-        for line in self.contents.split("\n"):
-            line = line.strip()
-
-            if "Akredytacja:" in line:
-                if self.is_empty(line, "Akredytacja:"):
-                    return None
-            elif "Data ważności certyfikatu:" in line:
-                expiredate_str = self.parse_expiredate(line, "Data ważności certyfikatu:")
-                try:
-                    if not self.validate_lab(expiredate_str):
+        lab = dict(self.SENTINELS)
+        lab["number"] = self.number
+
+        self.expiredate = None  # kept for callers that re-validate the lab later
+        # rules armed to fire on the line after the one that triggered them and sections (lists) currently parsed
+        self.armed, self.sections = armed, sections = set(), set()
+        handlers, no_rule = self.HANDLERS, len(self.HANDLERS)
+        contents = self.contents
+
+        # single lazy scan of the page for markers; visit only the lines containing them, the lines after armed rules
+        # and the lines of open sections
+        scan = ((match.start(), self.MARKER_RULES[match.lastindex - 1]) for match in self.MARKER_REGEX.finditer(contents))
+        size = len(contents)
+        marker_pos, marker_rule = next(scan, (size + 1, no_rule))
+        start = 0
+        while start <= size:
+            if not armed and not sections:
+                if marker_pos > size:
+                    break
+                start = contents.rfind("\n", 0, marker_pos) + 1
+            end = contents.find("\n", start)
+            if end == -1:
+                end = size
+            line = contents[start:end]
+
+            # the rule of highest precedence (lowest number) among the triggered ones wins
+            rule = min(armed) if armed else no_rule
+            while marker_pos < end:
+                if marker_rule < rule:
+                    rule = marker_rule
+                marker_pos, marker_rule = next(scan, (size + 1, no_rule))
+            if sections:
+                if "<li>" in line:
+                    candidate = self.FIELD if self.FIELD in sections else self.OBJECT
+                    if candidate < rule:
+                        rule = candidate
+                elif "</ul>" in line and self.OBJECT in sections and self.OBJECTS_END < rule:
+                    rule = self.OBJECTS_END
+
+            if rule != no_rule:
+                armed.discard(rule)
+                outcome = handlers[rule](self, lab, line.strip())
+                if outcome is not None:
+                    if outcome is self.INVALID:
                         return None
-                except ValueError as ve:
-                    print(f"Cannot validate expire date (ValueError: {ve}). Skipping...")
-                    return None
-            elif "Akredytacja od:" in line:
-                certdate = self.parse_certdate(line, "Akredytacja od:")
-
-            elif "Dane organizacji:" in line:
-                org_name_on = True
-                continue
-            elif org_name_on:
-                org_name = self.parse_name_address(line)
-                org_name_on = False
-                org_address_on = True
-                continue
-            elif org_address_on:
-                org_address = self.parse_name_address(line)
-                org_address_on = False
-
-            elif "Dane laboratorium:" in line:
-                lab_name_on = True
-                continue
-            elif lab_name_on:
-                lab_name = self.parse_name_address(line)
-                lab_name_on = False
-                lab_address_on = True
-                continue
-            elif lab_address_on:
-                lab_address = self.parse_name_address(line)
-                lab_address_on = False
+                    break  # done
+            start = end + 1
 
-            elif "Telefon:" in line:
-                phone_on = True
-                continue
-            elif phone_on:
-                phone = self.parse_contact_details(line, self.PHONE_REGEX)
-                phone_on = False
+        if any([True for key in self.REQUIRED if lab[key] is None]):
+            raise ValueError("The processed page is not parsable.")
 
-            elif "Komórka:" in line:
-                cellphone = self.parse_contact_details(line, self.PHONE_REGEX)
+        return lab
 
-            elif "Email:" in line:
-                email_on = True
-                continue
-            elif email_on:
-                email = self.parse_contact_details(line, self.EMAIL_REGEX)
-                email_on = False
+    # field handlers, called with the lab being parsed and the stripped line that triggered them
+    INVALID, DONE = object(), object()
+
+    def _on_accreditation(self, lab, line):
+        if self.is_empty(line, self.MARKER_TEXT[self.ACCREDITATION]):
+            return self.INVALID
+
+    def _on_expiredate(self, lab, line):
+        expiredate_str = self.expiredate = self.parse_expiredate(line, self.MARKER_TEXT[self.EXPIREDATE])
+        try:
+            if not self.validate_lab(expiredate_str):
+                return self.INVALID
+        except ValueError as ve:
+            print(f"Cannot validate expire date (ValueError: {ve}). Skipping...")
+            return self.INVALID
+
+    def _on_certdate(self, lab, line):
+        lab["certdate"] = self.parse_certdate(line, self.MARKER_TEXT[self.CERTDATE])
+
+    def _on_org(self, lab, line):
+        self.armed.add(self.ORG_NAME)
+
+    def _on_org_name(self, lab, line):
+        lab["org_name"] = self.parse_name_address(line)
+        self.armed.add(self.ORG_ADDRESS)
+
+    def _on_org_address(self, lab, line):
+        lab["org_address"] = self.parse_name_address(line)
+
+    def _on_lab(self, lab, line):
+        self.armed.add(self.LAB_NAME)
+
+    def _on_lab_name(self, lab, line):
+        lab["lab_name"] = self.parse_name_address(line)
+        self.armed.add(self.LAB_ADDRESS)
+
+    def _on_lab_address(self, lab, line):
+        lab["lab_address"] = self.parse_name_address(line)
+
+    def _on_phone_label(self, lab, line):
+        self.armed.add(self.PHONE)
+
+    def _on_phone(self, lab, line):
+        lab["phone"] = self.parse_contact_details(line, self.PHONE_REGEX)
+
+    def _on_cellphone(self, lab, line):
+        lab["cellphone"] = self.parse_contact_details(line, self.PHONE_REGEX)
+
+    def _on_email_label(self, lab, line):
+        self.armed.add(self.EMAIL)
+
+    def _on_email(self, lab, line):
+        lab["email"] = self.parse_contact_details(line, self.EMAIL_REGEX)
+
+    def _on_www_label(self, lab, line):
+        self.armed.add(self.WWW)
+
+    def _on_www(self, lab, line):
+        lab["www"] = self.parse_contact_details(line, self.WWW_REGEX)
+
+    def _on_fields_label(self, lab, line):
+        self.sections.add(self.FIELD)
+        lab["research_fields"] = []
+
+    def _on_field(self, lab, line):
+        lab["research_fields"].append(self.parse_research_field_object(line))
+
+    def _on_objects_label(self, lab, line):
+        self.sections.discard(self.FIELD)
+        self.sections.add(self.OBJECT)
+        lab["research_objects"] = []
+
+    def _on_object(self, lab, line):
+        lab["research_objects"].append(self.parse_research_field_object(line))
+
+    def _on_objects_end(self, lab, line):
+        self.sections.discard(self.OBJECT)
+        return self.DONE
+
+    # parsing rules in order of precedence
+    HANDLERS = (_on_accreditation, _on_expiredate, _on_certdate, _on_org, _on_org_name, _on_org_address,
+                _on_lab, _on_lab_name, _on_lab_address, _on_phone_label, _on_phone, _on_cellphone,
+                _on_email_label, _on_email, _on_www_label, _on_www, _on_fields_label, _on_field,
+                _on_objects_label, _on_object, _on_objects_end)
+    (ACCREDITATION, EXPIREDATE, CERTDATE, ORG, ORG_NAME, ORG_ADDRESS, LAB, LAB_NAME, LAB_ADDRESS,
+     PHONE_LABEL, PHONE, CELLPHONE, EMAIL_LABEL, EMAIL, WWW_LABEL, WWW, FIELDS_LABEL, FIELD,
+     OBJECTS_LABEL, OBJECT, OBJECTS_END) = range(len(HANDLERS))
+
+    # markers of sections and the rules they trigger; every marker ends with a colon, so the scan stops at colons
+    # only and looks behind them for a marker (the empty group that matched tells which one)
+    MARKERS = [
+        ("Akredytacja:", ACCREDITATION),
+        ("Data ważności certyfikatu:", EXPIREDATE),
+        ("Akredytacja od:", CERTDATE),
+        ("Dane organizacji:", ORG),
+        ("Dane laboratorium:", LAB),
+        ("Telefon:", PHONE_LABEL),
+        ("Komórka:", CELLPHONE),
+        ("Email:", EMAIL_LABEL),
+        ("www:", WWW_LABEL),
+        ("Dziedziny badań:", FIELDS_LABEL),
+        ("Obiekty:", OBJECTS_LABEL),
+    ]
+    MARKER_RULES = [rule for _, rule in MARKERS]
+    MARKER_TEXT = {rule: marker for marker, rule in MARKERS}
+    MARKER_REGEX = re.compile(":(?:" + "|".join("(?<={})()".format(re.escape(marker)) for marker, _ in MARKERS) + ")")
+
+    # sentinels; fields missing from the page fail parsing if required, research fields and objects keep default
+    # values in case these sections are missing on the parsed page
+    SENTINELS = {"number": None, "certdate": None, "org_name": None, "org_address": None, "lab_name": None,
+                 "lab_address": None, "phone": None, "cellphone": None, "email": None, "www": None,
+                 "research_fields": "", "research_objects": ""}
+    REQUIRED = ("certdate", "org_name", "org_address", "lab_name", "lab_address", "phone", "cellphone", "email", "www")
+
+    @classmethod
+    def variant(cls, code, markers=None, columns=None):
+        """
+        Return subclass parsing pages of another registry, whose lab numbers start with 'code'. 'markers' maps names of rules (e.g. 'FIELDS_LABEL') to the markers that trigger them on its pages, 'columns' are the fields its pages have (others are left empty instead of failing parsing).
+        """
+        rules = {marker: getattr(cls, name) for name, marker in (markers or {}).items()}
+        replaced = set(rules.values())
+        marker_list = [(marker, rule) for marker, rule in cls.MARKERS if rule not in replaced]
+        marker_list += sorted(rules.items(), key=lambda item: item[1])
+        for marker, _ in marker_list:
+            if not marker.endswith(":"):
+                raise ValueError(f"Marker '{marker}' doesn't end with a colon.")
+        columns = list(cls.SENTINELS) if columns is None else columns
+        sentinels = {key: value if key in columns else "" for key, value in cls.SENTINELS.items()}
+        return type(f"{code}PageParser", (cls,), {
+            "CODE": code,
+            "MARKERS": marker_list,
+            "MARKER_RULES": [rule for _, rule in marker_list],
+            "MARKER_TEXT": {rule: marker for marker, rule in marker_list},
+            "MARKER_REGEX": re.compile(
+                ":(?:" + "|".join("(?<={})()".format(re.escape(marker)) for marker, _ in marker_list) + ")"),
+            "SENTINELS": sentinels,
+            "REQUIRED": tuple(key for key in cls.REQUIRED if key in columns)
+        })
+
+
+def parse_page(number, contents):
+    """Parse contents of the page of lab with given number and return the lab (or 'None' if it's not valid)."""
+    return PageParser(number, contents).parse_contents()
+
+
+def _parse_chunk(pages):
+    labs = []
+    for number, contents in pages:
+        try:
+            labs.append(parse_page(number, contents))
+        except Exception as e:
+            print(f"Cannot parse lab #{number} ({type(e).__name__}: {e}). Skipping...")  # debug
+            labs.append(None)
+    return labs
+
+
+def parse_many(pages, processes=None, chunksize=16):
+    """
+    Parse (number, contents) pairs of saved pages in a pool of 'processes' worker processes (by default one per CPU) and yield parsed labs (or 'None' for not valid and unparsable ones) in the order of pages. Pages are sent to the workers in chunks of 'chunksize', no more than two chunks per process at a time, so that they're read from 'pages' as the parsed labs are consumed.
+    """
+    processes = (os.cpu_count() or 1) if processes is None else processes
+    pages = iter(pages)
+    chunks = iter(lambda: list(itertools.islice(pages, chunksize)), [])
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_parse_chunk, chunk))
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def is_listed(contents):
+    """Check if contents of a fetched page belong to a lab listed in the registry (accredited or expired)."""
+    if contents is None:
+        return False
+    for line in contents.split("\n"):
+        if "Akredytacja:" in line:
+            return not PageParser.is_empty(line.strip(), "Akredytacja:")
+    return False
+
+
+def discover_ceiling(fetcher, builder, guess=CEILING, misses=MISSES):
+    """
+    Discover the upper bound of lab numbers in the registry: probe exponentially growing numbers starting at 'guess', binary search between the last listed and the first missing one, then scan further until 'misses' consecutive numbers are missing. Return the number after the last listed lab, but no less than 'guess': a gap of withdrawn numbers below it may hide labs above the gap from the search, and numbers up to the guess were all scraped before the bound was discovered.
+    """
+    def probe(n):
+        return is_listed(fetcher.fetch(builder.url(n), n))
+
+    low, high = 0, max(1, guess)
+    while probe(high):
+        low, high = high, high * 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        if probe(middle):
+            low = middle
+        else:
+            high = middle
+
+    # gaps of withdrawn numbers may have misled the search, so scan on in batches
+    last, n = low, low + 1
+    while n - last <= misses:
+        batch = range(n, last + misses + 1)
+        for number, contents in fetcher.fetch_all((number, builder.url(number)) for number in batch):
+            if is_listed(contents):
+                last = number
+        n = batch.stop
+    ceiling = max(last + 1, guess)
+    print(f"Discovered upper bound of lab numbers: {ceiling}")  # debug
+    return ceiling
+
+
+def numbers_from_index(fetcher, builder, max_pages=1000):
+    """Return sorted numbers of labs linked from the listing pages, following pages until one adds no new numbers."""
+    numbers = set()
+    for page in range(1, max_pages + 1):
+        contents = fetcher.fetch(builder.index_page_url(page))
+        found = builder.parse_index_page(contents) if contents is not None else set()
+        if not found - numbers:
+            break
+        numbers |= found
+    return sorted(numbers)
+
+
+def discover_numbers(fetcher, builder, index=False, misses=MISSES):
+    """
+    Return numbers of labs to scrape: seeded from the listing pages if 'index' (falling back to the ID space if none found), otherwise all numbers up to the discovered upper bound.
+    """
+    if index:
+        numbers = numbers_from_index(fetcher, builder)
+        if numbers:
+            return numbers
+        print("No labs found on the listing pages. Probing the range of numbers...")  # debug
+    return range(1, discover_ceiling(fetcher, builder, misses=misses))
+
+
+def iter_scrape(numbers=None, fetcher=None, builder=None, checkpoint=None, retries=RETRIES, parser_class=PageParser,
+                fetched=None):
+    """
+    Scrape data of PCA accredited reasearch laboratories from PCA official website, yielding each lab as soon as it's parsed. Pages are fetched concurrently by 'fetcher', labs come in the order of 'numbers' (by default discovered with 'discover_numbers').
+
+    Numbers already done in 'checkpoint' (a 'pca.checkpoint.Checkpoint') are not fetched again, their stored labs are yielded instead. Numbers that fail to be fetched or parsed go to a retry queue, retried up to 'retries' times after the others (so their labs come last) and, if still failing, are left in the checkpoint.
+
+    Parse time of each page and the outcome of each lab (parsed, skipped, expired, missing, unparsable, failed) are recorded in the metrics of 'fetcher'. Pages are parsed by 'parser_class' (see 'PageParser.variant' for registries other than AB). 'fetched' (if given) is called with each number as soon as its page is fetched or fails to be, retries included, whatever comes of it (e.g. to renew a lease).
+    """
+    fetcher = Fetcher() if fetcher is None else fetcher
+    builder = URLBuilder() if builder is None else builder
+    numbers = discover_numbers(fetcher, builder) if numbers is None else numbers
+    checkpoint = Checkpoint() if checkpoint is None else checkpoint
+    metrics = fetcher.metrics
+    print("Parsing contents...")  # debug
 
-            elif "www:" in line:
-                www_on = True
+    def process(pending):
+        """Fetch and parse labs of pending numbers, yielding (number, lab) pairs ('None' for missing, invalid and failed ones)."""
+        jobs = ((n, builder.url(n)) for n in pending)
+        for n, contents in fetcher.fetch_all(jobs, return_exceptions=True):
+            if fetched is not None:
+                fetched(n)
+            try:
+                if isinstance(contents, Exception):
+                    outcome = "failed"
+                    raise contents
+                if contents is None:  # no such page
+                    lab, outcome = None, "missing"
+                else:
+                    outcome = "unparsable"
+                    with metrics.stage("parse"):
+                        parser = parser_class(n, contents)
+                        lab = parser.parse_contents()
+                    outcome = "parsed" if lab is not None else "expired" if parser.expiredate else "skipped"
+            except Exception as e:
+                print(f"Cannot process lab #{n} ({type(e).__name__}: {e}). Queued for retry...")  # debug
+                metrics.incr("labs_total", outcome=outcome)
+                checkpoint.fail(n, e)
+                yield n, None
                 continue
-            elif www_on:
-                www = self.parse_contact_details(line, self.WWW_REGEX)
-                www_on = False
-
-            elif "Dziedziny badań:" in line:
-                research_fields_on = True
-                research_fields = []
+            metrics.incr("labs_total", outcome=outcome)
+            checkpoint.record(n, lab)
+            yield n, lab
+
+    numbers, done = list(numbers), set(checkpoint.done)
+    results = process([n for n in numbers if n not in done])
+    for n in numbers:
+        lab = checkpoint.done[n] if n in done else next(results)[1]
+        if lab is not None:
+            yield lab
+
+    for _ in range(retries):
+        if not checkpoint.failed:
+            break
+        for _, lab in process(sorted(checkpoint.failed)):
+            if lab is not None:
+                yield lab
+    checkpoint.finish()
+
+
+def work(queue, fetcher=None, builder=None, worker=None, retries=RETRIES):
+    """
+    Scrape shards leased from 'queue' (a 'pca.shards.WorkQueue') until there are none left to lease, renewing the lease of the current shard as its pages are fetched (missing, failed and retried ones included), and giving the shard up once its lease is lost. Labs of a shard are stored in the order of its numbers. A shard with labs that failed even after retries is released to be leased again, unless it's its last attempt. Return number of shards completed by this worker.
+    """
+    fetcher = Fetcher() if fetcher is None else fetcher
+    builder = URLBuilder() if builder is None else builder
+    worker = worker_id() if worker is None else worker
+    completed = 0
+    while True:
+        shard = queue.lease(worker)
+        if shard is None:
+            return completed
+        print(f"Worker {worker} leased shard #{shard.id} (attempt {shard.attempt})...")  # debug
+        checkpoint, labs, renewed = Checkpoint(), [], time.time()
+        order = {n: i for i, n in enumerate(shard.numbers)}  # retried labs come last, put them back in place
+
+        def renew(n):
+            nonlocal renewed
+            if time.time() - renewed > queue.lease_time / 3:
+                if not queue.renew(shard):
+                    raise LeaseLost(f"Lease of shard #{shard.id} was lost at lab #{n}.")
+                renewed = time.time()
+
+        try:
+            labs.extend(iter_scrape(shard.numbers, fetcher, builder, checkpoint, retries, fetched=renew))
+            if checkpoint.failed and shard.attempt < queue.attempts:
+                queue.release(shard, RuntimeError(f"{len(checkpoint.failed)} labs failed"))
+            elif queue.complete(shard, sorted(labs, key=lambda lab: order[lab_number(lab["number"])])):
+                completed += 1
                 continue
-            elif research_fields_on and "<li>" in line:
-                research_fields.append(self.parse_research_field_object(line))
-
-            elif "Obiekty:" in line:
-                research_fields_on = False
-                research_objects_on = True
-                research_objects = []
+            print(f"Worker {worker} gave up shard #{shard.id}.")  # debug
+        except LeaseLost as e:
+            print(f"Worker {worker} gave up shard #{shard.id} ({e}).")  # debug
+        except BaseException as e:
+            queue.release(shard, e)
+            raise
+
+
+def iter_sharded(queue, numbers=None, fetcher=None, builder=None, retries=RETRIES, poll=POLL):
+    """
+    Scrape labs split into shards of 'queue' (a 'pca.shards.WorkQueue', filled with 'numbers' unless it holds shards of an interrupted run), working on them alongside any other workers sharing the queue, and yield labs of all shards merged in the order of numbers once they're done. Shards of workers that died are taken over when their leases expire. The queue is cleared afterwards.
+    """
+    fetcher = Fetcher() if fetcher is None else fetcher
+    builder = URLBuilder() if builder is None else builder
+    if numbers is not None or not len(queue):
+        queue.fill(discover_numbers(fetcher, builder) if numbers is None else numbers)
+    while True:
+        work(queue, fetcher, builder, retries=retries)
+        if not queue.remaining():
+            break
+        time.sleep(poll)  # other workers hold the rest
+    yield from queue.merge()
+    queue.clear()
+
+
+def scrape(numbers=None, fetcher=None, builder=None, checkpoint=None, queue=None):
+    """
+    Scrape data of PCA accredited reasearch laboratories from PCA official website (see 'iter_scrape') and return it. Given 'queue' (a 'pca.shards.WorkQueue'), numbers are split into shards shared with other workers instead (see 'iter_sharded').
+    """
+    if queue is not None:
+        return list(iter_sharded(queue, numbers, fetcher, builder))
+    return list(iter_scrape(numbers, fetcher, builder, checkpoint))
+
+
+def lab_number(number):
+    """Return integer lab number from its 'AB NNN' form."""
+    return int(number.split()[-1])
+
+
+def scrape_incremental(previous, manifest, numbers=None, fetcher=None, builder=None, parser_class=None):
+    """
+    Re-scrape labs and merge them into 'previous' scraped data. Only pages whose content hash differs from the one in 'manifest' (or that are new, or whose lab is missing from 'previous') get parsed, unchanged labs are carried over unless their certificate has expired since. Labs of pages that cannot be parsed, or that aren't cached in offline mode, are carried over as they are (and parsed again on the next run); only pages that don't exist remove their labs. Labs with numbers outside of 'numbers' are carried over as they are. Pages are those of the registry of 'builder', parsed by 'parser_class' (by default the parser of that registry, see 'pca.registries'). Return merged labs, updated manifest and a summary of changes (added, removed and changed lab numbers).
+    """
+    fetcher = Fetcher() if fetcher is None else fetcher
+    builder = URLBuilder() if builder is None else builder
+    if parser_class is None:
+        from .registries import REGISTRIES  # defined on top of this module
+        parser_class = REGISTRIES[builder.code].parser_class
+    numbers = discover_numbers(fetcher, builder) if numbers is None else numbers
+    previous_labs = {lab["number"]: lab for lab in previous}
+    print("Parsing changed contents...")  # debug
+
+    labs, new_manifest, visited = {}, {}, set()
+    jobs = ((n, builder.url(n)) for n in numbers)
+    for n, (contents, source) in fetcher.fetch_all(jobs, sources=True):
+        number = builder.code + " " + str(n).zfill(3)
+        if source == "offline":  # not cached, nothing known about it, so carried over below
+            continue
+        visited.add(number)
+        if contents is None:  # no such page
+            continue
+        digest = hashlib.sha1(contents.encode("utf-8")).hexdigest()
+        page, previous_lab = manifest.get(number), previous_labs.get(number)
+        if page is not None and page["hash"] == digest and previous_lab is not None:
+            lab, expiredate = previous_lab, page["expiredate"]
+            if expiredate is not None and not parser_class.validate_lab(expiredate):
+                lab = None
+        else:
+            parser = parser_class(n, contents)
+            try:
+                lab, expiredate = parser.parse_contents(), parser.expiredate
+            except Exception as e:
+                print(f"Cannot parse lab #{n} ({type(e).__name__}: {e}). Keeping previous data...")  # debug
+                if page is not None:  # old hash kept, so the page is parsed again next time
+                    new_manifest[number] = page
+                if previous_lab is not None:
+                    labs[number] = previous_lab
                 continue
-            elif research_objects_on and "<li>" in line:
-                research_objects.append(self.parse_research_field_object(line))
-            elif research_objects_on and "</ul>" in line:
-                research_objects_on = False
-                break
-
-        if any([True for var in [certdate, org_name, org_address, lab_name, lab_address, phone,
-                                 cellphone, email, www]
-                if var is None]):
-            raise ValueError("The processed page is not parsable.")
-
-        return {
-            "number": self.number,
-            "certdate": certdate,
-            "org_name": org_name,
-            "org_address": org_address,
-            "lab_name": lab_name,
-            "lab_address": lab_address,
-            "phone": phone,
-            "cellphone": cellphone,
-            "email": email,
-            "www": www,
-            "research_fields": research_fields,
-            "research_objects": research_objects
-        }
-
-
-def scrape():
-    """Scrape data of PCA accredited reasearch laboratories from PCA official website."""
-
-    builder = URLBuilder()
-    print("Parsing contents...")  # debug
-
-    scraped_data = []
-    for n, url in zip(range(1, CEILING), builder.urls):
-        parser = PageParser(n, url)
-        lab = parser.parse_contents()
+        new_manifest[number] = {"hash": digest, "expiredate": expiredate}
         if lab is not None:
-            scraped_data.append(lab)
-
-    return scraped_data
+            labs[number] = lab
+
+    for number, page in manifest.items():
+        if number not in visited:
+            new_manifest[number] = page
+    for number, lab in previous_labs.items():
+        if number not in visited:
+            labs[number] = lab
+
+    diff = {
+        "added": sorted(set(labs) - set(previous_labs), key=lab_number),
+        "removed": sorted(set(previous_labs) - set(labs), key=lab_number),
+        "changed": sorted([number for number in set(labs) & set(previous_labs)
+                           if labs[number] != previous_labs[number]], key=lab_number)
+    }
+    return [labs[number] for number in sorted(labs, key=lab_number)], new_manifest, diff
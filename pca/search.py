@@ -0,0 +1,153 @@
+"""
+
+    pca.search
+    ~~~~~~~~~~~~
+
+    In-process faceted and keyword search over research fields and research objects of scraped labs.
+
+"""
+
+import bisect
+import re
+
+from .data import from_json
+from .lab import as_dict
+
+CODE_REGEX = re.compile(r"^(.*?)\s*\(([A-Z]+)\)\s*$")  # the last parenthesized code, e.g. 'F' of '... (EMC) (F)'
+TOKEN_REGEX = re.compile(r"\w+")
+TERM_REGEX = re.compile(r"\w+\*?")  # token of a query, optionally followed by '*' to match it as a prefix
+FOLDING = str.maketrans("ąćęłńóśźż", "acelnoszz")
+TEXT_COLUMNS = ("research_objects", "research_fields", "lab_name", "org_name")  # columns indexed by tokens
+
+
+def fold(text):
+    """Return text case-folded and with Polish diacritics removed (e.g. 'żywność' for 'Żywność')."""
+    return text.casefold().translate(FOLDING)
+
+
+def tokenize(text):
+    """Return list of distinct folded tokens of text."""
+    return list(dict.fromkeys(TOKEN_REGEX.findall(fold(text))))
+
+
+def to_bitmap(positions, size):
+    """Return int with bits of given positions set."""
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+
+def popcount(bitmap):
+    """Return number of bits set in int."""
+    return bitmap.bit_count() if hasattr(bitmap, "bit_count") else bin(bitmap).count("1")  # 'int.bit_count' of 3.10+
+
+
+def from_bitmap(bitmap, limit=None):
+    """Return list of positions of the bits set in int (the lowest 'limit' ones, if given)."""
+    bits = bin(bitmap)[:1:-1]
+    positions, position = [], bits.find("1")
+    while position != -1 and (limit is None or len(positions) < limit):
+        positions.append(position)
+        position = bits.find("1", position + 1)
+    return positions
+
+
+def parse_field(field):
+    """Return (code, name) of research field (e.g. ('C', 'Badania chemiczne, analityka chemiczna')), code 'None' if it has none."""
+    match = CODE_REGEX.match(field)
+    return (match.group(2), match.group(1)) if match else (None, field)
+
+
+class SearchIndex:
+
+    """
+    Search index of labs. Research fields are faceted by their category codes and research objects by their names; tokens of 'TEXT_COLUMNS' are folded (see 'fold') and indexed in posting lists of each column. Labs are referred to by their position in 'numbers'. Posting lists are sets of positions, frozen into bitmaps (ints) when first queried, so that a query is a few bitwise ands and the found labs are counted by every facet value with one more each. Tokens of the many labs sharing the same field or object are computed once.
+    """
+
+    def __init__(self, labs=()):
+        self.numbers = []
+        self.field_names = {}  # code: name of research field
+        self.facets = {"fields": {}, "objects": {}}  # facet: {value: {lab position}}
+        self.postings = {column: {} for column in TEXT_COLUMNS}  # column: {token: {lab position}}
+        self.vocabularies = {}  # column: sorted tokens (for prefix queries), built on demand
+        self.bitmaps = {}  # facet or column: {value or token: bitmap of lab positions}, built on demand
+        self.tokens = {}  # text: its tokens
+        for lab in labs:
+            self.add(lab)
+
+    @classmethod
+    def from_json(cls, path=None):
+        """Return index of labs of the JSON output (the default one or file at 'path')."""
+        return cls(from_json(path=path))
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def add(self, lab):
+        """Index lab (a dict or 'pca.lab.Lab')."""
+        lab = as_dict(lab)
+        position = len(self.numbers)
+        self.numbers.append(lab["number"])
+        for field in lab["research_fields"]:
+            code, name = parse_field(field)
+            if code is not None:
+                self.field_names.setdefault(code, name)
+                self.facets["fields"].setdefault(code, set()).add(position)
+        for research_object in lab["research_objects"]:
+            self.facets["objects"].setdefault(research_object, set()).add(position)
+        for column in TEXT_COLUMNS:
+            texts = lab[column]
+            postings = self.postings[column]
+            for text in [texts] if isinstance(texts, str) else texts:
+                tokens = self.tokens.get(text)
+                if tokens is None:
+                    tokens = self.tokens[text] = tokenize(text)
+                for token in tokens:
+                    postings.setdefault(token, set()).add(position)
+        self.vocabularies.clear()
+        self.bitmaps.clear()
+
+    def bitmap(self, kind, key):
+        """Return bitmap of positions of labs with given facet value ('fields' or 'objects' kind) or column token, building and keeping it on first use."""
+        bitmaps = self.bitmaps.setdefault(kind, {})
+        bitmap = bitmaps.get(key)
+        if bitmap is None:
+            positions = (self.facets[kind] if kind in self.facets else self.postings[kind]).get(key, ())
+            bitmap = bitmaps[key] = to_bitmap(positions, len(self.numbers))
+        return bitmap
+
+    def matching(self, term, columns):
+        """Return bitmap of positions of labs with token 'term' (or, if it ends with '*', any token it prefixes) in any of 'columns'."""
+        prefix = term.endswith("*")
+        token = fold(term.rstrip("*"))
+        bitmap = 0
+        for column in columns:
+            if not prefix:
+                bitmap |= self.bitmap(column, token)
+                continue
+            if column not in self.vocabularies:
+                self.vocabularies[column] = sorted(self.postings[column])
+            vocabulary = self.vocabularies[column]
+            for i in range(bisect.bisect_left(vocabulary, token), len(vocabulary)):
+                if not vocabulary[i].startswith(token):
+                    break
+                bitmap |= self.bitmap(column, vocabulary[i])
+        return bitmap
+
+    def search(self, text="", fields=(), objects=(), columns=TEXT_COLUMNS, limit=None):
+        """
+        Return dict with the 'total' number and the 'numbers' (first 'limit' ones, in order of the index) of labs having every term of 'text' (terms ending with '*' match by prefix) in any of 'columns', all research field codes of 'fields' and all research objects of 'objects', along with 'facets': counts of the found labs by research field code and by research object (each what the total would be with it added to the query), largest first.
+        """
+        found = (1 << len(self.numbers)) - 1
+        for term in TERM_REGEX.findall(text):
+            found &= self.matching(term, columns)
+        for kind, selected in [("fields", fields), ("objects", objects)]:
+            for value in selected:
+                found &= self.bitmap(kind, value)
+        facets = {}
+        for kind, values in self.facets.items():
+            counts = ((value, popcount(found & self.bitmap(kind, value))) for value in values)
+            facets[kind] = dict(sorted((pair for pair in counts if pair[1]), key=lambda pair: (-pair[1], pair[0])))
+        return {"total": popcount(found), "numbers": [self.numbers[position] for position in from_bitmap(found, limit)],
+                "facets": facets}
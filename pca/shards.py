@@ -0,0 +1,216 @@
+"""
+
+    pca.shards
+    ~~~~~~~~~~~~
+
+    Work queues handing out shards of lab numbers to scraping workers (processes or nodes) under leases.
+
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import time
+
+from .data import FILEPATH_TEMPLATE
+from .lab import as_dict
+
+QUEUE_PATH = FILEPATH_TEMPLATE.format("queue.sqlite")
+SHARD_SIZE = 100  # lab numbers in one shard
+LEASE = 300  # seconds a worker holds a shard before it's handed out again, unless the lease is renewed
+ATTEMPTS = 3  # leases of a shard whose labs keep failing before its partial result is accepted
+POLL = 1.0  # seconds between checks of a queue waiting for shards leased by other workers
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    numbers TEXT,
+    state TEXT DEFAULT 'pending',
+    worker TEXT,
+    expires REAL,
+    attempts INTEGER DEFAULT 0,
+    error TEXT,
+    labs TEXT
+);
+CREATE INDEX IF NOT EXISTS shards_state ON shards (state, expires);
+"""
+
+
+class LeaseLost(RuntimeError):
+
+    """Raised when the lease of a shard expired and was handed out to another worker while its worker still had it."""
+
+
+def split(numbers, size=SHARD_SIZE):
+    """Split lab numbers into shards (lists) of at most 'size' consecutive numbers, keeping their order."""
+    numbers = list(numbers)
+    return [numbers[i:i + size] for i in range(0, len(numbers), size)]
+
+
+def worker_id():
+    """Return identifier of the current worker process, unique across nodes."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Shard:
+
+    """Shard of lab numbers leased to a worker until 'expires' (a UNIX time), on its 'attempt'-th lease."""
+
+    def __init__(self, id, numbers, worker, expires, attempt):
+        self.id, self.numbers, self.worker, self.expires, self.attempt = id, numbers, worker, expires, attempt
+
+    def __repr__(self):
+        return f"Shard({self.id}, {len(self.numbers)} numbers, worker={self.worker!r}, attempt={self.attempt})"
+
+
+class WorkQueue:
+
+    """
+    Interface of queues of shards shared by scraping workers. A worker leases a shard, scrapes it, renews the lease while it works and completes the shard with its labs; shards whose lease expired (their worker died or hung) are leased again to whichever worker asks next. Completing a shard whose lease was lost is refused, so each shard's labs are stored once. Merging yields labs of completed shards in the order of shards, i.e. of the numbers the queue was filled with.
+    """
+
+    lease_time = LEASE  # seconds
+    attempts = ATTEMPTS
+
+    def __len__(self):
+        """Return number of shards in the queue."""
+        raise NotImplementedError
+
+    def fill(self, numbers, size=SHARD_SIZE):
+        """
+        Split numbers into shards and queue them, unless the queue already holds shards of the same numbers (of a run being resumed). Raises 'ValueError' if it holds shards of other numbers. Return number of shards.
+        """
+        raise NotImplementedError
+
+    def lease(self, worker):
+        """Lease the first pending (or expired) shard to worker. Return 'Shard' or 'None' if there is none to lease now."""
+        raise NotImplementedError
+
+    def renew(self, shard):
+        """Extend lease of shard. Return 'False' if the lease was lost meanwhile."""
+        raise NotImplementedError
+
+    def complete(self, shard, labs):
+        """Store labs scraped from shard and mark it done. Return 'False' (discarding labs) if the lease was lost meanwhile."""
+        raise NotImplementedError
+
+    def release(self, shard, error):
+        """Give up leased shard because of error, so that it's leased again. Return 'False' if the lease was lost meanwhile."""
+        raise NotImplementedError
+
+    def remaining(self):
+        """Return number of shards not done yet."""
+        raise NotImplementedError
+
+    def merge(self):
+        """Yield labs of all shards in their order. Raises 'RuntimeError' if any shard is not done yet."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Drop all shards."""
+        raise NotImplementedError
+
+
+class SQLiteQueue(WorkQueue):
+
+    """
+    Work queue in a SQLite database at 'path', shared by worker processes on one machine (or nodes mounting it from a shared disk that supports locking). Leases last 'lease' seconds of wall-clock time; a shard leased 'attempts' times is completed with whatever labs its last attempt got.
+    """
+
+    def __init__(self, path=QUEUE_PATH, lease=LEASE, attempts=ATTEMPTS):
+        self.path = path
+        self.lease_time = lease
+        self.attempts = attempts
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)  # transactions begun explicitly
+        self.connection.executescript(SCHEMA)
+
+    def transaction(self):
+        """Begin a transaction holding the write lock of the database, so that no two workers lease the same shard."""
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def commit(self):
+        self.connection.execute("COMMIT")
+
+    def __len__(self):
+        return self.connection.execute("SELECT count(*) FROM shards").fetchone()[0]
+
+    def fill(self, numbers, size=SHARD_SIZE):
+        connection = self.transaction()
+        try:
+            numbers = list(numbers)
+            shards = [json.loads(body) for body, in connection.execute("SELECT numbers FROM shards ORDER BY id")]
+            queued = [n for shard in shards for n in shard]
+            if shards and queued != numbers:
+                raise ValueError(f"The queue at '{self.path}' holds shards of other numbers ({len(queued)} labs, "
+                                 f"{queued[0]} to {queued[-1]}): finish or clear that run first.")
+            if not shards:
+                shards = split(numbers, size)
+                connection.executemany("INSERT INTO shards (numbers) VALUES (?)",
+                                       [(json.dumps(shard),) for shard in shards])
+            self.commit()
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return len(shards)
+
+    def lease(self, worker):
+        now = time.time()
+        connection = self.transaction()
+        try:
+            row = connection.execute(
+                "SELECT id, numbers, attempts FROM shards "
+                "WHERE state = 'pending' OR (state = 'leased' AND expires < ?) ORDER BY id LIMIT 1", [now]).fetchone()
+            if row is not None:
+                shard = Shard(row[0], json.loads(row[1]), worker, now + self.lease_time, row[2] + 1)
+                connection.execute("UPDATE shards SET state = 'leased', worker = ?, expires = ?, attempts = ? "
+                                   "WHERE id = ?", [worker, shard.expires, shard.attempt, shard.id])
+            self.commit()
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return shard if row is not None else None
+
+    def update(self, shard, assignments, params):
+        """Update leased shard if the lease still belongs to its worker. Return 'False' otherwise."""
+        cursor = self.connection.execute(
+            f"UPDATE shards SET {assignments} WHERE id = ? AND state = 'leased' AND worker = ? AND attempts = ?",
+            params + [shard.id, shard.worker, shard.attempt])
+        return cursor.rowcount == 1
+
+    def renew(self, shard):
+        expires = time.time() + self.lease_time
+        if not self.update(shard, "expires = ?", [expires]):
+            return False
+        shard.expires = expires
+        return True
+
+    def complete(self, shard, labs):
+        body = json.dumps([as_dict(lab) for lab in labs], ensure_ascii=False)
+        return self.update(shard, "state = 'done', expires = NULL, labs = ?", [body])
+
+    def release(self, shard, error):
+        return self.update(shard, "state = 'pending', expires = NULL, error = ?", [f"{type(error).__name__}: {error}"])
+
+    def remaining(self):
+        return self.connection.execute("SELECT count(*) FROM shards WHERE state != 'done'").fetchone()[0]
+
+    def merge(self):
+        if self.remaining():
+            raise RuntimeError(f"{self.remaining()} shards of the queue at '{self.path}' are not done yet.")
+        for (body,) in self.connection.execute("SELECT labs FROM shards ORDER BY id"):
+            yield from json.loads(body)
+
+    def clear(self):
+        self.connection.execute("DELETE FROM shards")
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
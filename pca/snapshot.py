@@ -0,0 +1,186 @@
+"""
+
+    pca.snapshot
+    ~~~~~~~~~~~~~~
+
+    Compact columnar snapshot of scraped data with memory-mapped lazy loading.
+
+"""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from .data import COL_HEADERS, FILEPATH_TEMPLATE, Writer, export
+
+MAGIC = b"PCASNAP1"
+FOOTER = struct.Struct("<Q")  # offset of the directory (JSON at the end of the file), right after the magic
+LIST_COLUMNS = ["research_fields", "research_objects"]
+ALIGNMENT = 8
+
+
+class SnapshotWriter(Writer):
+
+    """
+    Write labs to columnar snapshot file. Every column is dictionary-encoded: each distinct string is stored once and labs refer to it by an integer code, so the research field and object categories repeated across thousands of labs cost four bytes per occurrence. List columns ('research_fields', 'research_objects') keep per-lab offsets into an array of codes plus a flag for labs missing the section (""). Codes are kept in compact arrays while labs are written; the file is written when the writer is closed.
+    """
+
+    EXTENSION = "snapshot"
+
+    def __init__(self, path=None):
+        super().__init__(path)
+        self.dictionaries = {column: {} for column in COL_HEADERS}
+        self.codes = {column: array("I") for column in COL_HEADERS}
+        self.offsets = {column: array("I", [0]) for column in LIST_COLUMNS}
+        self.missing = {column: bytearray() for column in LIST_COLUMNS}
+
+    def encode(self, column, value):
+        """Return code of value in the dictionary of column."""
+        dictionary = self.dictionaries[column]
+        return dictionary.setdefault(value, len(dictionary))
+
+    def write(self, lab):
+        for column in COL_HEADERS:
+            value = lab[column]
+            if column not in LIST_COLUMNS:
+                self.codes[column].append(self.encode(column, value))
+                continue
+            self.missing[column].append(value == "")
+            self.codes[column].extend(self.encode(column, item) for item in value)
+            self.offsets[column].append(len(self.codes[column]))
+        self.count += 1
+
+    def close(self, complete=True):
+        with open(self.partial_path, "wb") as partial_file:
+            self.dump(partial_file)
+        super().close(complete)
+
+    def dump(self, outfile):
+        """Write snapshot to binary file."""
+        outfile.write(MAGIC + FOOTER.pack(0))
+        columns = {}
+        for column in COL_HEADERS:
+            strings = [value.encode("utf-8") for value in self.dictionaries[column]]
+            string_offsets = array("I", [0])
+            for string in strings:
+                string_offsets.append(string_offsets[-1] + len(string))
+            blocks = [("strings", b"".join(strings)), ("string_offsets", string_offsets),
+                      ("codes", self.codes[column])]
+            if column in LIST_COLUMNS:
+                blocks += [("offsets", self.offsets[column]), ("missing", self.missing[column])]
+            columns[column] = {name: self.dump_block(outfile, block) for name, block in blocks}
+        directory = json.dumps({"count": self.count, "byteorder": sys.byteorder, "columns": columns}).encode("utf-8")
+        directory_offset = outfile.tell()
+        outfile.write(directory)
+        outfile.seek(len(MAGIC))
+        outfile.write(FOOTER.pack(directory_offset))
+
+    @staticmethod
+    def dump_block(outfile, block):
+        """Write block (bytes or array) aligned to 'ALIGNMENT' bytes and return its [offset, length] span."""
+        outfile.write(b"\0" * (-outfile.tell() % ALIGNMENT))
+        offset = outfile.tell()
+        data = block.tobytes() if isinstance(block, array) else bytes(block)
+        outfile.write(data)
+        return [offset, len(data)]
+
+
+class Snapshot:
+
+    """
+    Memory-mapped reader of a snapshot file. Nothing is decoded up front: a lab (by position or number) or a whole column is decoded on demand, and each distinct string is decoded only once and shared by all labs referring to it.
+    """
+
+    def __init__(self, path=None):
+        self.path = FILEPATH_TEMPLATE.format(SnapshotWriter.EXTENSION) if path is None else path
+        with open(self.path, "rb") as snapshot_file:
+            self.mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mmap[:len(MAGIC)] != MAGIC:
+            self.mmap.close()
+            raise ValueError(f"'{self.path}' is not a snapshot file.")
+        directory_offset, = FOOTER.unpack_from(self.mmap, len(MAGIC))
+        directory = json.loads(self.mmap[directory_offset:].decode("utf-8"))
+        if directory["byteorder"] != sys.byteorder:
+            self.mmap.close()
+            raise ValueError(f"Snapshot '{self.path}' was written on a {directory['byteorder']}-endian machine.")
+        self.count = directory["count"]
+        self.columns = directory["columns"]
+        self.views = {}
+        self.strings = {column: {} for column in COL_HEADERS}  # decoded strings by code
+        self.positions = None  # positions of labs by number, built on first lookup
+
+    def view(self, column, block, fmt="I"):
+        """Return memoryview of a block of column."""
+        key = (column, block)
+        if key not in self.views:
+            offset, length = self.columns[column][block]
+            self.views[key] = memoryview(self.mmap)[offset:offset + length].cast(fmt)
+        return self.views[key]
+
+    def string(self, column, code):
+        """Return string with given code in the dictionary of column."""
+        strings = self.strings[column]
+        if code not in strings:
+            offsets = self.view(column, "string_offsets")
+            strings[code] = str(self.view(column, "strings", "B")[offsets[code]:offsets[code + 1]], "utf-8")
+        return strings[code]
+
+    def value(self, column, i):
+        """Return value of column for lab at position i."""
+        codes = self.view(column, "codes")
+        if column not in LIST_COLUMNS:
+            return self.string(column, codes[i])
+        if self.view(column, "missing", "B")[i]:
+            return ""
+        offsets = self.view(column, "offsets")
+        return [self.string(column, code) for code in codes[offsets[i]:offsets[i + 1]]]
+
+    def column(self, name):
+        """Return values of given column for all labs."""
+        return [self.value(name, i) for i in range(self.count)]
+
+    def lab(self, number):
+        """Return lab with given number (e.g. 'AB 001') or 'None' if there is no such lab."""
+        if self.positions is None:
+            self.positions = {self.string("number", code): i for i, code in enumerate(self.view("number", "codes"))}
+        i = self.positions.get(number)
+        return self[i] if i is not None else None
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("Snapshot index out of range.")
+        return {column: self.value(column, i) for column in COL_HEADERS}
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def close(self):
+        """Release all views and unmap the file."""
+        for view in self.views.values():
+            view.release()
+        self.views = {}
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def to_snapshot(scraped_data, path=None):
+    """Write scraped data to snapshot file."""
+    export(scraped_data, [SnapshotWriter(path)])
+
+
+def from_snapshot(path=None):
+    """Open snapshot file of scraped data for lazy reading (see 'Snapshot')."""
+    return Snapshot(path)
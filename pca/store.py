@@ -0,0 +1,288 @@
+"""
+
+    pca.store
+    ~~~~~~~~~~~
+
+    Indexed local store of scraped labs (SQLite) with fast queries by field, city, organisation and certification date.
+
+"""
+
+import re
+import sqlite3
+
+from .data import FILEPATH_TEMPLATE, Writer, export
+
+STORE_PATH = FILEPATH_TEMPLATE.format("sqlite")
+BATCH_SIZE = 500  # labs upserted in one transaction by 'SQLiteWriter'
+CITY_REGEX = re.compile(r"\d{2}-\d{3}\s+([^;,]+?)\s*$")  # city follows the postal code at the end of an address
+CODE_REGEX = re.compile(r"\(([A-Z]+)\)\s*$")  # code of a research field, e.g. 'C' in '... analityka chemiczna (C)'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS labs (
+    number TEXT PRIMARY KEY,
+    certdate TEXT,
+    org_name TEXT,
+    org_key TEXT,
+    org_address TEXT,
+    lab_name TEXT,
+    lab_address TEXT,
+    city TEXT,
+    city_key TEXT,
+    phone TEXT,
+    cellphone TEXT,
+    email TEXT,
+    www TEXT,
+    has_fields INTEGER,
+    has_objects INTEGER
+);
+CREATE INDEX IF NOT EXISTS labs_certdate ON labs (certdate);
+CREATE INDEX IF NOT EXISTS labs_city_key ON labs (city_key);
+DROP INDEX IF EXISTS labs_org_name;
+CREATE TABLE IF NOT EXISTS fields (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE,
+    code TEXT
+);
+CREATE INDEX IF NOT EXISTS fields_code ON fields (code);
+CREATE TABLE IF NOT EXISTS objects (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE
+);
+CREATE TABLE IF NOT EXISTS lab_fields (
+    number TEXT,
+    position INTEGER,
+    field_id INTEGER REFERENCES fields (id),
+    PRIMARY KEY (number, position)
+);
+CREATE INDEX IF NOT EXISTS lab_fields_field_id ON lab_fields (field_id, number);
+CREATE TABLE IF NOT EXISTS lab_objects (
+    number TEXT,
+    position INTEGER,
+    object_id INTEGER REFERENCES objects (id),
+    PRIMARY KEY (number, position)
+);
+CREATE INDEX IF NOT EXISTS lab_objects_object_id ON lab_objects (object_id, number);
+"""
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS objects_fts USING fts5(number UNINDEXED, research_objects)"
+FTS_VERSION = 1  # 'PRAGMA user_version' of stores whose full-text rows have the rowids of their labs
+LAB_COLUMNS = ["number", "certdate", "org_name", "org_address", "lab_name", "lab_address", "phone", "cellphone",
+               "email", "www"]
+STORED_COLUMNS = LAB_COLUMNS + ["org_key", "city", "city_key", "has_fields", "has_objects"]
+
+
+def like_pattern(text):
+    """Return pattern of 'LIKE ... ESCAPE '\\'' matching given text anywhere, its wildcards matched literally."""
+    return "%" + re.sub(r"([\\%_])", r"\\\1", text) + "%"
+
+
+def city(address):
+    """Return city of given address (or "" if it has no postal code)."""
+    match = CITY_REGEX.search(address or "")
+    return match.group(1) if match else ""
+
+
+def field_code(field):
+    """Return code of given research field (or 'None' if it has none)."""
+    match = CODE_REGEX.search(field)
+    return match.group(1) if match else None
+
+
+class LabStore:
+
+    """
+    SQLite database of labs with research fields and research objects in normalized tables, indexed by field (name or code), city of the lab and certification date, with casefolded organisation names for case-insensitive substring queries, plus a full-text index over research objects (its rows keyed by rowids of their labs, so that replacing a lab doesn't scan it). Labs are upserted by 'number' and read back exactly as they were stored (missing research sections included). The full-text index needs SQLite built with FTS5; without it, text queries fall back to substring matching.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        if "org_key" not in [row[1] for row in self.connection.execute("PRAGMA table_info(labs)")]:
+            self.migrate()
+        try:
+            self.connection.execute(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:  # SQLite built without FTS5
+            self.fts = False
+        if self.fts and self.connection.execute("PRAGMA user_version").fetchone()[0] < FTS_VERSION:
+            self.reindex()
+
+    def migrate(self):
+        """Add casefolded organisation names to a store written before organisations were looked up by them."""
+        with self.connection:
+            self.connection.execute("ALTER TABLE labs ADD COLUMN org_key TEXT")
+            self.connection.executemany(
+                "UPDATE labs SET org_key = ? WHERE number = ?",
+                [((org_name or "").casefold(), number)
+                 for number, org_name in self.connection.execute("SELECT number, org_name FROM labs").fetchall()])
+
+    def reindex(self):
+        """Rebuild the full-text index from stored labs, its rows keyed by rowids of their labs."""
+        with self.connection:
+            self.connection.execute("DELETE FROM objects_fts")
+            self.connection.execute(
+                "INSERT INTO objects_fts (rowid, number, research_objects) "
+                "SELECT rowid, number, (SELECT coalesce(group_concat(name, char(10)), '') FROM "
+                "(SELECT name FROM lab_objects JOIN objects ON object_id = objects.id "
+                "WHERE lab_objects.number = labs.number ORDER BY position)) FROM labs")
+            self.connection.execute(f"PRAGMA user_version = {FTS_VERSION}")
+
+    def upsert(self, labs):
+        """Insert labs or replace stored ones with the same numbers in one transaction. Return number of labs."""
+        count = 0
+        with self.connection:
+            for lab in labs:
+                self.upsert_one(lab)
+                count += 1
+            self.prune()
+        return count
+
+    def upsert_one(self, lab):
+        """Insert lab or replace the stored one with the same number (within the current transaction)."""
+        number = lab["number"]
+        self.delete_one(number)
+        cursor = self.connection.execute(
+            f"INSERT INTO labs ({', '.join(STORED_COLUMNS)}) VALUES ({', '.join('?' * len(STORED_COLUMNS))})",
+            [lab[column] for column in LAB_COLUMNS] +
+            [(lab["org_name"] or "").casefold(), city(lab["lab_address"]), city(lab["lab_address"]).casefold(),
+             int(lab["research_fields"] != ""), int(lab["research_objects"] != "")])
+        for position, field in enumerate(lab["research_fields"]):
+            self.connection.execute("INSERT OR IGNORE INTO fields (name, code) VALUES (?, ?)",
+                                    [field, field_code(field)])
+            self.connection.execute(
+                "INSERT INTO lab_fields SELECT ?, ?, id FROM fields WHERE name = ?", [number, position, field])
+        for position, research_object in enumerate(lab["research_objects"]):
+            self.connection.execute("INSERT OR IGNORE INTO objects (name) VALUES (?)", [research_object])
+            self.connection.execute(
+                "INSERT INTO lab_objects SELECT ?, ?, id FROM objects WHERE name = ?", [number, position,
+                                                                                       research_object])
+        if self.fts:
+            self.connection.execute("INSERT INTO objects_fts (rowid, number, research_objects) VALUES (?, ?, ?)",
+                                    [cursor.lastrowid, number, "\n".join(lab["research_objects"])])
+
+    def delete_one(self, number):
+        """Delete lab with given number (within the current transaction)."""
+        if self.fts:  # by rowid, 'number' of the full-text index isn't indexed
+            row = self.connection.execute("SELECT rowid FROM labs WHERE number = ?", [number]).fetchone()
+            if row is not None:
+                self.connection.execute("DELETE FROM objects_fts WHERE rowid = ?", row)
+        for table in ["labs", "lab_fields", "lab_objects"]:
+            self.connection.execute(f"DELETE FROM {table} WHERE number = ?", [number])
+
+    def prune(self):
+        """Delete research fields and objects no stored lab refers to any more (within the current transaction)."""
+        self.connection.execute("DELETE FROM fields WHERE id NOT IN (SELECT field_id FROM lab_fields)")
+        self.connection.execute("DELETE FROM objects WHERE id NOT IN (SELECT object_id FROM lab_objects)")
+
+    def delete(self, numbers):
+        """Delete labs with given numbers."""
+        with self.connection:
+            for number in numbers:
+                self.delete_one(number)
+            self.prune()
+
+    def count(self):
+        """Return number of stored labs."""
+        return self.connection.execute("SELECT count(*) FROM labs").fetchone()[0]
+
+    def get(self, number):
+        """Return lab with given number (e.g. 'AB 001') or 'None' if there is no such lab."""
+        labs = self.labs(["SELECT number FROM labs WHERE number = ?"], [number])
+        return labs[0] if labs else None
+
+    def query(self, field=None, city=None, organisation=None, since=None, until=None, text=None):
+        """
+        Return labs (ordered by number) matching all given criteria: 'field' is a research field code (e.g. 'C') or its full name, 'city' is the city of the lab (case-insensitive), 'organisation' is a substring of the organisation name (case-insensitive, wildcards taken literally), 'since' and 'until' bound the certification date ('YYYY-MM-DD', inclusive), 'text' is a full-text query over research objects (FTS5 syntax, e.g. 'woda OR gleba').
+        """
+        conditions, params = [], []
+        for column, value in [("city_key = ?", city.casefold() if city is not None else None),
+                              ("org_key LIKE ? ESCAPE '\\'",
+                               like_pattern(organisation.casefold()) if organisation is not None else None),
+                              ("certdate >= ?", since), ("certdate <= ?", until)]:
+            if value is not None:
+                conditions.append(column)
+                params.append(value)
+        selects = ["SELECT number FROM labs WHERE " + " AND ".join(conditions or ["1"])]
+        if field is not None:
+            selects.append("SELECT number FROM lab_fields WHERE field_id IN "
+                           "(SELECT id FROM fields WHERE code = ? OR name = ?)")
+            params += [field, field]
+        if text is not None:
+            if self.fts:
+                selects.append("SELECT number FROM objects_fts WHERE objects_fts MATCH ?")
+            else:
+                selects.append("SELECT number FROM lab_objects JOIN objects ON object_id = objects.id "
+                               "WHERE name LIKE ? ESCAPE '\\'")
+                text = like_pattern(text)
+            params.append(text)
+        return self.labs(selects, params)
+
+    def search(self, text):
+        """Return labs whose research objects match given full-text query."""
+        return self.query(text=text)
+
+    def labs(self, selects, params):
+        """Return labs with numbers selected by all given queries (intersected), ordered by number."""
+        numbers = " INTERSECT ".join(selects)
+        rows = self.connection.execute(
+            f"SELECT {', '.join(LAB_COLUMNS)}, has_fields, has_objects FROM labs "
+            f"WHERE number IN ({numbers}) ORDER BY length(number), number", params).fetchall()
+        labs = {}
+        for row in rows:
+            lab = dict(zip(LAB_COLUMNS, row))
+            lab["research_fields"] = [] if row[-2] else ""
+            lab["research_objects"] = [] if row[-1] else ""
+            labs[lab["number"]] = lab
+        for key, sql in [
+                ("research_fields", "SELECT lab_fields.number, name FROM lab_fields JOIN fields ON field_id = id "
+                                    f"WHERE lab_fields.number IN ({numbers}) ORDER BY lab_fields.number, position"),
+                ("research_objects", "SELECT lab_objects.number, name FROM lab_objects JOIN objects "
+                                     f"ON object_id = id WHERE lab_objects.number IN ({numbers}) "
+                                     "ORDER BY lab_objects.number, position")]:
+            for number, name in self.connection.execute(sql, params):
+                labs[number][key].append(name)
+        return list(labs.values())
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SQLiteWriter(Writer):
+
+    """Upsert labs into 'LabStore' database, committing every 'BATCH_SIZE' labs."""
+
+    EXTENSION = "sqlite"
+    PARTIAL = False  # upserted in place
+
+    def __init__(self, path=None):
+        super().__init__(path)
+        self.store = LabStore(self.path)
+        self.pending = []
+
+    def write(self, lab):
+        self.pending.append(lab)
+        self.count += 1
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Upsert pending labs."""
+        self.store.upsert(self.pending)
+        self.pending = []
+
+    def close(self, complete=True):
+        self.flush()
+        self.store.close()
+        super().close(complete)
+
+
+def to_sqlite(scraped_data, path=None):
+    """Write scraped data to SQLite lab store."""
+    export(scraped_data, [SQLiteWriter(path)])
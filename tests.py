@@ -9,11 +9,47 @@
 import unittest
 
 import tests.test_pca as tp
+import tests.test_fetcher as tf
+import tests.test_cache as tc
+import tests.test_data as td
+import tests.test_checkpoint as tk
+import tests.test_client as tcl
+import tests.test_store as ts
+import tests.test_snapshot as tsn
+import tests.test_lab as tl
+import tests.test_archive as ta
+import tests.test_metrics as tm
+import tests.test_cli as tcli
+import tests.test_lookup as tlk
+import tests.test_shards as tsh
+import tests.test_registries as tr
+import tests.test_contacts as tct
+import tests.test_geo as tg
+import tests.test_search as tse
+import tests.test_scheduler as tsc
 
 loader, suite = unittest.TestLoader(), unittest.TestSuite()
 
 # bundle up all test modules
 suite.addTests(loader.loadTestsFromModule(tp))
+suite.addTests(loader.loadTestsFromModule(tf))
+suite.addTests(loader.loadTestsFromModule(tc))
+suite.addTests(loader.loadTestsFromModule(td))
+suite.addTests(loader.loadTestsFromModule(tk))
+suite.addTests(loader.loadTestsFromModule(tcl))
+suite.addTests(loader.loadTestsFromModule(ts))
+suite.addTests(loader.loadTestsFromModule(tsn))
+suite.addTests(loader.loadTestsFromModule(tl))
+suite.addTests(loader.loadTestsFromModule(ta))
+suite.addTests(loader.loadTestsFromModule(tm))
+suite.addTests(loader.loadTestsFromModule(tcli))
+suite.addTests(loader.loadTestsFromModule(tlk))
+suite.addTests(loader.loadTestsFromModule(tsh))
+suite.addTests(loader.loadTestsFromModule(tr))
+suite.addTests(loader.loadTestsFromModule(tct))
+suite.addTests(loader.loadTestsFromModule(tg))
+suite.addTests(loader.loadTestsFromModule(tse))
+suite.addTests(loader.loadTestsFromModule(tsc))
 # suite.addTests(loader.loadTestsFromModule(tpm))
 
 # run the suite
@@ -0,0 +1,103 @@
+"""
+
+    tests.server
+    ~~~~~~~~~~~~~~
+
+    Local HTTP stand-in for the PCA website serving recorded fixture pages.
+
+"""
+
+import hashlib
+import os
+import re
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+PATH_REGEX = re.compile(r"/AB%20(\d+),podmiot\.html$")
+
+
+def fixture(name):
+    """Return text of the fixture page with given file name."""
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as page:
+        return page.read()
+
+
+def lab_fixture(number):
+    """Return text of the fixture page of lab with given number or 'None' if there is no such fixture."""
+    try:
+        return fixture("ab{}.html".format(str(number).zfill(3)))
+    except OSError:
+        return None
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+
+    """HTTP server handling each request in a separate thread."""
+
+    daemon_threads = True
+
+
+class PCAHandler(BaseHTTPRequestHandler):
+
+    """Serve fixture page of the lab found in the requested path (or 404), revalidating pages by ETag."""
+
+    LAST_MODIFIED = "Mon, 02 Jul 2018 10:00:00 GMT"
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        self.server.headers.append(self.headers)
+        match = PATH_REGEX.search(self.path)
+        contents = lab_fixture(int(match.group(1))) if match else None
+        if contents is None:
+            self.send_error(404)
+            return
+        body = contents.encode("utf-8")
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.LAST_MODIFIED)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PCAServer:
+
+    """Context manager running PCA stand-in server in a background thread."""
+
+    def __init__(self, handler=PCAHandler):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.requests, self.httpd.headers = [], []
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def prefix(self):
+        """URL prefix to be passed to 'pca.scraper.URLBuilder'."""
+        return "http://127.0.0.1:{}/AB%20".format(self.httpd.server_address[1])
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def headers(self):
+        return self.httpd.headers
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
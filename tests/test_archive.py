@@ -0,0 +1,79 @@
+"""
+
+    tests.test_archive
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.archive'.
+
+"""
+
+import unittest
+import datetime
+import os
+import shutil
+import tempfile
+
+from pca.archive import Archive
+from pca.lab import Lab
+from tests.test_data import LABS
+from tests.test_store import POZNAN_LAB
+
+
+class TestArchive(unittest.TestCase):
+    """Test case for class 'Archive'."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = Archive(os.path.join(self.directory, "archive.sqlite"))
+        self.changed = dict(LABS[0], research_fields=LABS[0]["research_fields"] + ["Badania inne (M)"])
+        self.assertEqual(self.archive.record(LABS, "2018-01-01"), (["AB 1327", "AB 333"], [], []))
+        self.assertEqual(self.archive.record(LABS, "2018-02-01"), ([], [], []))
+        self.assertEqual(self.archive.record([self.changed, POZNAN_LAB], "2018-03-01"),
+                         (["AB 001"], ["AB 333"], ["AB 1327"]))
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.directory)
+
+    def count(self, table):
+        return self.archive.connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+    def test_state(self):
+        """Is the registry returned as it was at given date?"""
+        self.assertEqual(self.archive.state("2017-12-31"), [])
+        self.assertEqual(self.archive.state("2018-02-15"), [LABS[1], LABS[0]])
+        self.assertEqual(self.archive.state("2018-03-01"), [POZNAN_LAB, self.changed])
+        self.assertEqual(self.archive.state(), [POZNAN_LAB, self.changed])
+
+    def test_history(self):
+        """Are versions of a lab returned with their validity intervals?"""
+        self.assertEqual(self.archive.history("AB 1327"), [
+            {"valid_from": "2018-01-01", "valid_to": "2018-03-01", "lab": LABS[0]},
+            {"valid_from": "2018-03-01", "valid_to": None, "lab": self.changed}])
+        self.assertEqual(self.archive.history("AB 333"), [
+            {"valid_from": "2018-01-01", "valid_to": "2018-03-01", "lab": LABS[1]}])
+        self.assertEqual(self.archive.history("AB 999"), [])
+
+    def test_deduplication(self):
+        """Do unchanged labs add no records or versions, and a lab returning to a former state reuse its record?"""
+        self.assertEqual((self.count("records"), self.count("versions")), (4, 4))
+        self.archive.record([LABS[0], POZNAN_LAB], "2018-04-01")
+        self.assertEqual((self.count("records"), self.count("versions")), (4, 5))
+        self.assertEqual(self.archive.history("AB 1327")[-1]["lab"], LABS[0])
+
+    def test_runs(self):
+        """Are runs listed with their change counts?"""
+        self.assertEqual(self.archive.runs(), [
+            {"date": "2018-01-01", "labs": 2, "added": 2, "removed": 0, "changed": 0},
+            {"date": "2018-02-01", "labs": 2, "added": 0, "removed": 0, "changed": 0},
+            {"date": "2018-03-01", "labs": 2, "added": 1, "removed": 1, "changed": 1}])
+
+    def test_chronological_order(self):
+        """Is recording a run not later than the last one refused?"""
+        with self.assertRaises(ValueError):
+            self.archive.record(LABS, datetime.date(2018, 3, 1))
+
+    def test_labs(self):
+        """Are Lab records archived the same as lab dicts?"""
+        self.assertEqual(self.archive.record([Lab.from_dict(self.changed), Lab.from_dict(POZNAN_LAB)],
+                                             datetime.date(2018, 4, 1)), ([], [], []))
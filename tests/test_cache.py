@@ -0,0 +1,86 @@
+"""
+
+    tests.test_cache
+    ~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.cache'.
+
+"""
+
+import unittest
+import tempfile
+import shutil
+
+from pca.cache import ResponseCache
+from pca.fetcher import Fetcher
+from pca.scraper import URLBuilder
+from tests.server import PCAServer
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test case for class 'pca.cache.ResponseCache'."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.url = "http://127.0.0.1/AB%201327,podmiot.html"
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_put_get(self):
+        """Is a stored entry returned with its body and validators?"""
+        cache = ResponseCache(self.directory)
+        cache.put(self.url, "<p>zażółć</p>", 1327, '"abc"', "Mon, 02 Jul 2018 10:00:00 GMT")
+        entry = ResponseCache(self.directory).get(self.url, 1327)
+        self.assertEqual((entry["body"], entry["etag"]), ("<p>zażółć</p>", '"abc"'))
+        self.assertEqual(cache.conditional_headers(entry), {"If-None-Match": '"abc"',
+                                                            "If-Modified-Since": "Mon, 02 Jul 2018 10:00:00 GMT"})
+
+    def test_get_missing(self):
+        """Does looking up an entry that was never stored return 'None'?"""
+        self.assertIsNone(ResponseCache(self.directory).get(self.url, 1327))
+
+    def test_is_fresh(self):
+        """Is an entry fresh only within TTL?"""
+        entry = ResponseCache(self.directory).put(self.url, "", 1327)
+        self.assertTrue(ResponseCache(self.directory, ttl=60).is_fresh(entry))
+        self.assertFalse(ResponseCache(self.directory, ttl=0).is_fresh(entry))
+        self.assertFalse(ResponseCache(self.directory).is_fresh(entry))
+
+
+class TestCachedFetcher(unittest.TestCase):
+    """Test case for class 'pca.fetcher.Fetcher' with a response cache."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_revalidation(self):
+        """Is a cached page revalidated with a conditional request and served from disk on 304?"""
+        with PCAServer() as server:
+            url = URLBuilder(prefix=server.prefix).url(1327)
+            first = Fetcher(rate=None, cache=ResponseCache(self.directory)).fetch(url, 1327)
+            second = Fetcher(rate=None, cache=ResponseCache(self.directory)).fetch(url, 1327)
+            self.assertEqual(len(server.requests), 2)
+            self.assertIsNone(server.headers[0].get("If-None-Match"))
+            self.assertIsNotNone(server.headers[1].get("If-None-Match"))
+        self.assertIn("AB 1327", first)
+        self.assertEqual(first, second)
+
+    def test_ttl_and_offline(self):
+        """Are fresh and offline pages served without any request, missing ones as 'None'?"""
+        with PCAServer() as server:
+            builder = URLBuilder(prefix=server.prefix)
+            Fetcher(rate=None, cache=ResponseCache(self.directory)).fetch(builder.url(1327), 1327)
+            Fetcher(rate=None, cache=ResponseCache(self.directory)).fetch(builder.url(999), 999)
+            fresh = Fetcher(rate=None, cache=ResponseCache(self.directory, ttl=3600))
+            self.assertIn("AB 1327", fresh.fetch(builder.url(1327), 1327))
+            self.assertIsNone(fresh.fetch(builder.url(999), 999))
+            self.assertEqual(len(server.requests), 2)
+
+            offline = Fetcher(rate=None, cache=ResponseCache(self.directory, offline=True))
+            self.assertIn("AB 1327", offline.fetch(builder.url(1327), 1327))
+            self.assertIsNone(offline.fetch(builder.url(456), 456))
+            self.assertEqual(len(server.requests), 2)
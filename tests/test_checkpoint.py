@@ -0,0 +1,88 @@
+"""
+
+    tests.test_checkpoint
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.checkpoint'.
+
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from pca.checkpoint import Checkpoint
+from pca.client import HTTPClient
+from pca.fetcher import Fetcher
+from pca.scraper import URLBuilder, iter_scrape
+from tests.server import PCAServer, PCAHandler, PATH_REGEX, fixture
+
+
+class FlakyHandler(PCAHandler):
+
+    """Fail the first request for AB 333 and serve a page that is not parsable as AB 007."""
+
+    def do_GET(self):
+        number = int(PATH_REGEX.search(self.path).group(1))
+        if number == 333 and self.path not in self.server.requests:
+            self.server.requests.append(self.path)
+            self.send_error(500)
+        elif number == 7:
+            self.server.requests.append(self.path)
+            body = fixture("not_a_lab.html").encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            super().do_GET()
+
+
+class TestCheckpoint(unittest.TestCase):
+    """Test case for class 'pca.checkpoint.Checkpoint' and its use by 'pca.scraper.iter_scrape'."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "checkpoint.json")
+        self.fetcher = Fetcher(concurrency=2, rate=None, client=HTTPClient(retries=0))  # no retries on HTTP level
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_load(self):
+        """Is a saved checkpoint loaded with the same labs and failures?"""
+        checkpoint = Checkpoint(self.path, save_every=2)
+        checkpoint.record(1, {"number": "AB 001"})
+        self.assertFalse(os.path.exists(self.path))
+        checkpoint.fail(2, ValueError("The processed page is not parsable."))
+        self.assertTrue(os.path.exists(self.path))
+
+        loaded = Checkpoint.load(self.path)
+        self.assertEqual(loaded.done, {1: {"number": "AB 001"}})
+        self.assertEqual(loaded.failed, {2: "ValueError: The processed page is not parsable."})
+        self.assertEqual(Checkpoint.load(os.path.join(self.directory, "missing.json")).done, {})
+
+    def test_failures_are_retried_not_fatal(self):
+        """Are failed labs retried at the end and unparsable ones left in the checkpoint?"""
+        checkpoint = Checkpoint(self.path)
+        with PCAServer(FlakyHandler) as server:
+            builder = URLBuilder(prefix=server.prefix)
+            labs = list(iter_scrape([1, 7, 333, 456], self.fetcher, builder, checkpoint, retries=2))
+        self.assertEqual([lab["number"] for lab in labs], ["AB 001", "AB 456", "AB 333"])
+        self.assertEqual(list(checkpoint.failed), [7])
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_resume(self):
+        """Are numbers done in a checkpoint yielded from it without fetching, in order?"""
+        checkpoint = Checkpoint(self.path)
+        checkpoint.record(333, {"number": "AB 333"})
+        checkpoint.record(2, None)
+        checkpoint.save()
+
+        with PCAServer() as server:
+            builder = URLBuilder(prefix=server.prefix)
+            labs = list(iter_scrape([1, 2, 333, 456], self.fetcher, builder, Checkpoint.load(self.path)))
+            self.assertEqual(sorted(server.requests), ["/AB%20001,podmiot.html", "/AB%20456,podmiot.html"])
+        self.assertEqual([lab["number"] for lab in labs], ["AB 001", "AB 333", "AB 456"])
+        self.assertFalse(os.path.exists(self.path))  # removed after a run without failures
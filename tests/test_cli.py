@@ -0,0 +1,168 @@
+"""
+
+    tests.test_cli
+    ~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.cli'.
+
+"""
+
+import unittest
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+from unittest import mock
+
+from pca.cli import main, numbers_arg, output_arg
+from tests.server import PCAServer
+
+
+class TestArguments(unittest.TestCase):
+    """Test case for parsing command line arguments."""
+
+    def test_numbers(self):
+        """Are lab numbers and ranges parsed into a sorted list?"""
+        self.assertEqual(numbers_arg("5,1-3"), [1, 2, 3, 5])
+        self.assertEqual(numbers_arg("AB 1327, AB 1300-1301"), [1300, 1301, 1327])
+        for text in ["3-1", "0", "a-b", ""]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                numbers_arg(text)
+
+    def test_output(self):
+        """Are outputs parsed into (format, path) pairs?"""
+        self.assertEqual(output_arg("csv"), ("csv", None))
+        self.assertEqual(output_arg("xlsx=out/labs.xlsx"), ("xlsx", "out/labs.xlsx"))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            output_arg("pdf")
+
+    def test_invalid_combinations(self):
+        """Are contradictory arguments refused?"""
+        for argv in [["--offline", "--no-cache"], ["--incremental", "--resume"], ["-n", "1-3", "--archive"],
+                     ["-c", "0"], ["--incremental", "-o", "csv"], ["--incremental", "--benchmark"]]:
+            with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                main(argv + ["--dry-run"])
+
+    def test_dry_run(self):
+        """Does a dry run show the plan without fetching anything?"""
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self.assertEqual(main(["-n", "1200-1300", "-o", "csv", "-o", "xlsx=labs.xlsx", "--dry-run"]), 0)
+        self.assertIn("Numbers: 101 labs, AB 1200 to AB 1300", stdout.getvalue())
+        self.assertIn("Output: csv -> data/scraped_data.csv", stdout.getvalue())
+        self.assertIn("Output: xlsx -> labs.xlsx", stdout.getvalue())
+
+    def test_dry_run_registries(self):
+        """Does a dry run of several registries show numbers and URLs of each of them?"""
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self.assertEqual(main(["-n", "1-3", "-r", "AB", "-r", "AP", "--dry-run"]), 0)
+        self.assertIn("Numbers: 3 labs per registry, AB 1 to AB 3, AP 1 to AP 3", stdout.getvalue())
+        self.assertEqual(len(re.findall(r"First URL: .*AB%20001", stdout.getvalue())), 1)
+        self.assertEqual(len(re.findall(r"First URL: .*AP%20001", stdout.getvalue())), 1)
+
+
+class TestRun(unittest.TestCase):
+    """Test case for runs of the command-line interface against a local server."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def run_cli(self, server, *argv):
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            status = main(["--base-url", server.prefix, "--rate", "0", "--cache-dir", self.path("cache"),
+                           "--metrics", self.path("metrics.prom")] + list(argv))
+        self.assertEqual(status, 0)
+        return stdout.getvalue()
+
+    def test_several_outputs(self):
+        """Are chosen numbers written to all outputs in one pass?"""
+        with PCAServer() as server:
+            self.run_cli(server, "-n", "1-2,333", "-o", "jsonl=" + self.path("labs.jsonl"),
+                         "-o", "csv=" + self.path("labs.csv"), "--no-cache")
+        with open(self.path("labs.jsonl"), encoding="utf-8") as jsonl_file:
+            self.assertEqual([json.loads(line)["number"] for line in jsonl_file], ["AB 001", "AB 333"])
+        with open(self.path("labs.csv"), encoding="utf-8", newline="") as csv_file:
+            self.assertEqual(len(list(csv.reader(csv_file, delimiter="|"))), 3)
+        with open(self.path("metrics.prom")) as metrics_file:
+            self.assertIn('pca_labs_total{outcome="parsed"} 2', metrics_file.read())
+
+    def test_offline(self):
+        """Does an offline run serve pages cached by a previous one?"""
+        with PCAServer() as server:
+            self.run_cli(server, "-n", "1,333", "-o", "jsonl=" + self.path("first.jsonl"))
+            self.run_cli(server, "-n", "1,333,456", "-o", "jsonl=" + self.path("second.jsonl"), "--offline")
+            self.assertEqual(len(server.requests), 2)
+        with open(self.path("second.jsonl"), encoding="utf-8") as jsonl_file:
+            self.assertEqual([json.loads(line)["number"] for line in jsonl_file], ["AB 001", "AB 333"])
+
+    def test_incremental(self):
+        """Are labs merged into the JSON output they were read from, with its manifest and summary next to it?"""
+        with PCAServer() as server:
+            self.run_cli(server, "-n", "1,333", "-o", "json=" + self.path("labs.json"), "--incremental")
+            self.run_cli(server, "-n", "2,456", "-o", "json=" + self.path("labs.json"), "-o",
+                         "csv=" + self.path("labs.csv"), "--incremental", "--offline")  # neither page is cached
+            self.run_cli(server, "-n", "1,456", "-o", "json=" + self.path("labs.json"), "--incremental")
+        with open(self.path("labs.json"), encoding="utf-8") as json_file:
+            self.assertEqual([lab["number"] for lab in json.load(json_file)["labs"]], ["AB 001", "AB 333", "AB 456"])
+        with open(self.path("labs.manifest.json"), encoding="utf-8") as manifest_file:
+            self.assertEqual(sorted(json.load(manifest_file)), ["AB 001", "AB 333", "AB 456"])
+        with open(self.path("labs.diff.json"), encoding="utf-8") as diff_file:
+            self.assertEqual(json.load(diff_file), {"added": ["AB 456"], "removed": [], "changed": []})
+        with open(self.path("labs.csv"), encoding="utf-8", newline="") as csv_file:
+            self.assertEqual(len(list(csv.reader(csv_file, delimiter="|"))), 3)  # headers, AB 001 and AB 333
+
+    def test_incremental_failure(self):
+        """Does a failed merge leave the JSON output it was read from intact?"""
+        with PCAServer() as server:
+            self.run_cli(server, "-n", "1,333", "-o", "json=" + self.path("labs.json"), "--incremental")
+            with mock.patch("pca.cli.scrape_incremental", side_effect=ConnectionError("network is down")):
+                with self.assertRaises(ConnectionError):
+                    self.run_cli(server, "-n", "1,456", "-o", "json=" + self.path("labs.json"), "--incremental")
+            self.run_cli(server, "-n", "1,456", "-o", "json=" + self.path("labs.json"), "--incremental")
+        with open(self.path("labs.json"), encoding="utf-8") as json_file:
+            self.assertEqual([lab["number"] for lab in json.load(json_file)["labs"]], ["AB 001", "AB 333", "AB 456"])
+
+    def test_benchmark(self):
+        """Does a benchmark run report throughput without writing outputs?"""
+        with PCAServer() as server:
+            stdout = self.run_cli(server, "-n", "1,333", "--benchmark", "--no-cache")
+        self.assertRegex(stdout, r"Scraped 2 labs in [\d.]+ s")
+        self.assertEqual(sorted(os.listdir(self.directory)), ["metrics.prom"])
+
+    def test_adaptive(self):
+        """Does an adaptive run report the concurrency found for the host?"""
+        with PCAServer() as server:
+            stdout = self.run_cli(server, "-n", "1,333", "--benchmark", "--no-cache", "--adaptive")
+        self.assertRegex(stdout, r"Host 127\.0\.0\.1:\d+: concurrency 2, 0 throttled and 0 failed of 2 responses")
+
+    def test_workers(self):
+        """Do worker processes share shards of the queue and are their labs merged in order?"""
+        with PCAServer() as server:
+            self.run_cli(server, "-n", "1-2,333,456,1327", "-o", "jsonl=" + self.path("labs.jsonl"), "--no-cache",
+                         "--queue", self.path("queue.sqlite"), "--shard-size", "1", "--workers", "2")
+            self.assertEqual(len(server.requests), 5)
+        with open(self.path("labs.jsonl"), encoding="utf-8") as jsonl_file:
+            self.assertEqual([json.loads(line)["number"] for line in jsonl_file],
+                             ["AB 001", "AB 333", "AB 456", "AB 1327"])
+
+    def test_contacts(self):
+        """Are contacts normalized in outputs and reported?"""
+        with PCAServer() as server:
+            self.run_cli(server, "-n", "1,333", "-o", "jsonl=" + self.path("labs.jsonl"), "--no-cache",
+                         "--contacts", self.path("contacts.json"))
+        with open(self.path("labs.jsonl"), encoding="utf-8") as jsonl_file:
+            self.assertEqual([json.loads(line)["phone"] for line in jsonl_file], ["+48616280300", "+48413610151"])
+        with open(self.path("contacts.json"), encoding="utf-8") as contacts_file:
+            self.assertEqual(json.load(contacts_file)["summary"]["labs"], 2)
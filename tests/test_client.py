@@ -0,0 +1,103 @@
+"""
+
+    tests.test_client
+    ~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.client'.
+
+"""
+
+import unittest
+import gzip
+
+import requests
+from requests.adapters import BaseAdapter
+
+from pca.client import HTTPClient
+from pca.fetcher import Fetcher
+from pca.scraper import URLBuilder, scrape
+from tests.server import PCAServer, PCAHandler, PATH_REGEX, lab_fixture
+
+
+class FakeTransport(BaseAdapter):
+
+    """Transport serving fixture pages without any network."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        match = PATH_REGEX.search(request.url)
+        contents = lab_fixture(int(match.group(1))) if match else None
+        response = requests.Response()
+        response.url, response.request = request.url, request
+        response.status_code = 404 if contents is None else 200
+        response._content = b"" if contents is None else contents.encode("utf-8")
+        response.encoding = "utf-8"
+        return response
+
+    def close(self):
+        pass
+
+
+class KeepAliveHandler(PCAHandler):
+
+    """Keep connections alive, gzip pages if asked to and fail the first request for every page with 503."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        self.server.connections.add(self.client_address)
+        self.server.encodings.append(self.headers.get("Accept-Encoding", ""))
+        if self.path not in self.server.failed:
+            self.server.failed.add(self.path)
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = lab_fixture(int(PATH_REGEX.search(self.path).group(1))).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestHTTPClient(unittest.TestCase):
+    """Test case for class 'pca.client.HTTPClient'."""
+
+    def test_fake_transport(self):
+        """Does a scrape through an injected transport work without network?"""
+        transport = FakeTransport()
+        fetcher = Fetcher(rate=None, client=HTTPClient(transport=transport))
+        labs = scrape([1, 999, 1327], fetcher, URLBuilder(prefix="https://pca.invalid/AB%20"))
+        self.assertEqual([lab["number"] for lab in labs], ["AB 001", "AB 1327"])
+        self.assertEqual(len(transport.requests), 3)
+        self.assertIn("gzip", transport.requests[0].headers["Accept-Encoding"])
+
+    def test_retry_policy(self):
+        """Does retry policy retry 5xx statuses with backoff?"""
+        retry = HTTPClient.retry_policy(retries=3, backoff=0.5, jitter=0)
+        self.assertEqual(retry.total, 3)
+        self.assertTrue(retry.is_retry("GET", 503))
+        self.assertFalse(retry.is_retry("GET", 404))
+        self.assertFalse(retry.is_retry("POST", 503))
+
+    def test_keep_alive_compression_retries(self):
+        """Are connections reused, gzip negotiated and 503 responses retried?"""
+        with PCAServer(KeepAliveHandler) as server:
+            server.httpd.connections, server.httpd.failed, server.httpd.encodings = set(), set(), []
+            builder = URLBuilder(prefix=server.prefix)
+            with HTTPClient(pool_size=1, backoff=0, jitter=0) as client:
+                fetcher = Fetcher(concurrency=1, rate=None, client=client)
+                labs = scrape([1, 333, 456, 1327], fetcher, builder)
+            self.assertEqual(len(labs), 4)
+            self.assertEqual(len(server.requests), 8)  # every page failed once
+            self.assertEqual(len(server.httpd.connections), 1)
+            self.assertTrue(all("gzip" in encoding for encoding in server.httpd.encodings))
@@ -0,0 +1,93 @@
+"""
+
+    tests.test_contacts
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.contacts'.
+
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+from pca.contacts import (ContactIndex, normalize_contacts, normalize_email, normalize_emails, normalize_phone,
+                          normalize_phones, normalize_www)
+from pca.lab import Lab
+from tests.test_store import POZNAN_LAB
+
+
+def lab(number, phone="", cellphone="", email="", www=""):
+    return dict(POZNAN_LAB, number=number, phone=phone, cellphone=cellphone, email=email, www=www)
+
+
+class TestNormalizers(unittest.TestCase):
+    """Test case for normalizers of contact details."""
+
+    def test_phone(self):
+        """Are phone numbers of any format normalized to E.164?"""
+        for phone in ["61 628-03-00", "(+48) 61 628 03 00", "+48616280300", "0048 61 628 03 00", "061 628-03-00"]:
+            self.assertEqual(normalize_phone(phone), "+48616280300")
+        self.assertEqual(normalize_phone("48 123-45-67"), "+48481234567")  # Radom, not the country code
+        for phone in ["", None, "628-03-00", "061 628-03-00 12", "000 000 000"]:
+            self.assertEqual(normalize_phone(phone), "")
+
+    def test_email(self):
+        """Are emails stripped, lowercased and validated?"""
+        self.assertEqual(normalize_email(" CLDT@UDT.gov.pl "), "cldt@udt.gov.pl")
+        for email in ["cldt@", "cldt@udt", "cldt udt@udt.gov.pl", "cldt@udt.gov.pl\nx", None]:
+            self.assertEqual(normalize_email(email), "")
+
+    def test_www(self):
+        """Are websites reduced to lowercased domains?"""
+        self.assertEqual(normalize_www("www.UDT.gov.pl"), "www.udt.gov.pl")
+        self.assertEqual(normalize_www("https://ibdim.edu.pl/laboratoria?id=1"), "ibdim.edu.pl")
+        self.assertEqual(normalize_www("http://udt.gov.pl./"), "udt.gov.pl")
+        for www in ["udt", "www.udt_gov.pl", ""]:
+            self.assertEqual(normalize_www(www), "")
+
+    def test_batches(self):
+        """Does a batch come out as long as it went in, even with empty values at its ends?"""
+        self.assertEqual(normalize_phones([]), [])
+        self.assertEqual(normalize_phones(["", "61 628-03-00", ""]), ["", "+48616280300", ""])
+        self.assertEqual(normalize_emails(["", "x@y.pl\nz", "A@B.PL"]), ["", "", "a@b.pl"])
+
+
+class TestContactIndex(unittest.TestCase):
+    """Test case for class 'ContactIndex'."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_normalize_contacts(self):
+        """Are contacts of labs normalized, shared ones found across batches and invalid ones kept?"""
+        labs = [lab("AB 001", "61 628-03-00", "61 628-03-00", "Lab@UDT.gov.pl", "www.udt.gov.pl"),
+                lab("AB 002", "(+48) 61 628 03 00", "", "biuro@udt.gov.pl", "WWW.UDT.GOV.PL"),
+                Lab.from_dict(lab("AB 003", "22 123-45-67", "61 628 03 00", "lab@udt.gov.pl", "n/a")),
+                lab("AB 004", "12", "", "", "")]
+        index = ContactIndex()
+        normalized = list(normalize_contacts(labs, index, batch_size=2))
+        self.assertEqual([lab["phone"] for lab in normalized], ["+48616280300", "+48616280300", "+48221234567", ""])
+        self.assertEqual(normalized[0]["email"], "lab@udt.gov.pl")
+        self.assertEqual(normalized[0]["org_name"], POZNAN_LAB["org_name"])
+        self.assertEqual(labs[0]["email"], "Lab@UDT.gov.pl")  # given labs are left as they are
+        self.assertEqual(index.duplicates(), {
+            ("email", "lab@udt.gov.pl"): ["AB 001", "AB 003"],
+            ("phone", "+48616280300"): ["AB 001", "AB 002", "AB 003"],
+            ("www", "www.udt.gov.pl"): ["AB 001", "AB 002"]
+        })
+        self.assertEqual(index.invalid, {"AB 003": {"www": "n/a"}, "AB 004": {"phone": "12"}})
+        self.assertEqual(index.summary(), {"labs": 4, "invalid": 2, "shared_emails": 1, "shared_phones": 1,
+                                           "shared_wwws": 1})
+
+        path = os.path.join(self.directory, "contacts.json")
+        index.write(path)
+        with open(path, encoding="utf-8") as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report["shared"][1], {"kind": "phone", "contact": "+48616280300",
+                                               "labs": ["AB 001", "AB 002", "AB 003"]})
@@ -0,0 +1,177 @@
+"""
+
+    tests.test_data
+    ~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.data'.
+
+"""
+
+import unittest
+import contextlib
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from xml.etree import ElementTree
+
+from pca.data import (COL_HEADERS, JSONArrayWriter, JSONLinesWriter, CSVWriter, XLSWriter, XLSXWriter, export,
+                      from_json, to_list, to_lists)
+
+LABS = [
+    {
+        "number": "AB 1327",
+        "certdate": "2012-04-03",
+        "org_name": "P.P.U.H. Badania Nieniszczące SONOBAD Andrzej Zadura",
+        "org_address": "Maszewo Duże, ul. Miła 8; 09-400 Płock",
+        "lab_name": "P.P.U.H. Badania Nieniszczące SONOBAD Andrzej Zadura",
+        "lab_address": "Maszewo Duże, ul. Miła 8; 09-400 Płock",
+        "phone": "24 266-78-75",
+        "cellphone": "",
+        "email": "sonobad@sonobad.pl",
+        "www": "www.sonobad.pl",
+        "research_fields": ["Badania nieniszczące (L)"],
+        "research_objects": ["Wyroby i materiały konstrukcyjne - w tym metale i kompozyty"]
+    },
+    {
+        "number": "AB 333",
+        "certdate": "2001-07-06",
+        "org_name": "Okręgowa Stacja Chemiczno-Rolnicza w Kielcach",
+        "org_address": "ul. Wapiennikowa 21; 25-112 Kielce",
+        "lab_name": "Dział Laboratoryjny",
+        "lab_address": "ul. Wapiennikowa 21; 25-112 Kielce",
+        "phone": "41 361-01-51",
+        "cellphone": "",
+        "email": "kielce@schr.gov.pl",
+        "www": "www.schr.gov.pl",
+        "research_fields": ["Badania chemiczne, analityka chemiczna (C)", "Badania właściwości fizycznych (N)"],
+        "research_objects": ""
+    }
+]
+
+NS = {"main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def read_xlsx(path):
+    """Return sheets of .xlsx workbook as {name: rows} with cells of each row as (column, value) pairs."""
+    with zipfile.ZipFile(path) as book:
+        shared = [si.find("main:t", NS).text for si in
+                  ElementTree.fromstring(book.read("xl/sharedStrings.xml")).findall("main:si", NS)]
+        names = [sheet.get("name") for sheet in
+                 ElementTree.fromstring(book.read("xl/workbook.xml")).iter("{%s}sheet" % NS["main"])]
+        sheets = {}
+        for i, name in enumerate(names, 1):
+            rows = []
+            for row in ElementTree.fromstring(book.read(f"xl/worksheets/sheet{i}.xml")).iter("{%s}row" % NS["main"]):
+                cells = []
+                for cell in row.findall("main:c", NS):
+                    column = re.match(r"[A-Z]+", cell.get("r")).group()
+                    if cell.get("t") == "s":
+                        cells.append((column, shared[int(cell.find("main:v", NS).text)]))
+                    else:
+                        cells.append((column, cell.find("main:is/main:t", NS).text))
+                rows.append(cells)
+            sheets[name] = rows
+    return sheets, shared
+
+
+def cells(data_row):
+    """Return non-empty cells of data row as (column, value) pairs."""
+    return [("ABCDEFGHIJKL"[j], item) for j, item in enumerate(data_row) if item != ""]
+
+
+class TestWriters(unittest.TestCase):
+    """Test case for streaming writers of module 'pca.data'."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_to_list(self):
+        """Are research fields and objects joined with ' :: '?"""
+        self.assertEqual(to_list(LABS[1])[-2:], ["Badania chemiczne, analityka chemiczna (C) :: "
+                                                 "Badania właściwości fizycznych (N)", ""])
+        self.assertEqual(to_lists(LABS), [to_list(lab) for lab in LABS])
+
+    def test_export_all_formats(self):
+        """Is every lab written to every sink in one pass?"""
+        sinks = [JSONArrayWriter(self.path("labs.json")), JSONLinesWriter(self.path("labs.jsonl")),
+                 CSVWriter(self.path("labs.csv")), XLSWriter(self.path("labs.xls"))]
+        self.assertEqual(export(iter(LABS), sinks), 2)
+
+        with open(self.path("labs.json"), encoding="utf-8") as json_file:
+            contents = json_file.read()
+        self.assertEqual(contents, json.dumps({"labs": LABS}, ensure_ascii=False))
+        with open(self.path("labs.jsonl"), encoding="utf-8") as jsonl_file:
+            self.assertEqual([json.loads(line) for line in jsonl_file], LABS)
+        with open(self.path("labs.csv"), encoding="utf-8", newline="") as csv_file:
+            self.assertEqual(list(csv.reader(csv_file, delimiter="|")), [COL_HEADERS] + to_lists(LABS))
+        with open(self.path("labs.xls"), "rb") as xls_file:
+            self.assertEqual(xls_file.read(8), b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1")  # OLE2 compound document
+
+    def test_xlsx(self):
+        """Are labs written to .xlsx workbook with research values in the shared string table?"""
+        self.assertEqual(export(iter(LABS + LABS), [XLSXWriter(self.path("labs.xlsx"))]), 4)
+        sheets, shared = read_xlsx(self.path("labs.xlsx"))
+        self.assertEqual(list(sheets), ["labs"])
+        self.assertEqual(sheets["labs"], [cells(COL_HEADERS)] + [cells(row) for row in to_lists(LABS + LABS)])
+        self.assertEqual(len(shared), 3)  # fields and objects of AB 1327, fields of AB 333
+
+    def test_xlsx_sections(self):
+        """Are research fields and objects written one per row to separate sheets?"""
+        export(iter(LABS), [XLSXWriter(self.path("labs.xlsx"), sections=True)])
+        sheets, _ = read_xlsx(self.path("labs.xlsx"))
+        self.assertEqual(list(sheets), ["labs", "research_fields", "research_objects"])
+        self.assertEqual(sheets["research_fields"], [
+            [("A", "number"), ("B", "research_field")],
+            [("A", "AB 1327"), ("B", "Badania nieniszczące (L)")],
+            [("A", "AB 333"), ("B", "Badania chemiczne, analityka chemiczna (C)")],
+            [("A", "AB 333"), ("B", "Badania właściwości fizycznych (N)")]])
+        self.assertEqual(len(sheets["research_objects"]), 2)
+
+    def test_xlsx_row_limit(self):
+        """Is a full sheet continued on a new one?"""
+        writer = XLSXWriter(self.path("labs.xlsx"))
+        writer.MAX_ROWS = 2
+        export(iter(LABS + LABS[:1]), [writer])
+        sheets, _ = read_xlsx(self.path("labs.xlsx"))
+        self.assertEqual(list(sheets), ["labs", "labs (2)", "labs (3)"])
+        self.assertEqual([len(rows) for rows in sheets.values()], [2, 2, 2])
+        self.assertEqual(sheets["labs (3)"][1], cells(to_list(LABS[0])))
+
+    def test_partial_results_on_failure(self):
+        """Are previous outputs left intact by a failed run, and labs written before the failure kept beside them?"""
+        def labs():
+            yield LABS[0]
+            raise RuntimeError("network is down")
+
+        export(LABS, [JSONArrayWriter(self.path("labs.json")), CSVWriter(self.path("labs.csv"))])
+        with self.assertRaises(RuntimeError):
+            export(labs(), [JSONArrayWriter(self.path("labs.json")), JSONLinesWriter(self.path("labs.jsonl")),
+                            CSVWriter(self.path("labs.csv"))])
+        self.assertEqual(from_json(path=self.path("labs.json")), LABS)
+        with open(self.path("labs.json.partial"), encoding="utf-8") as json_file:
+            self.assertEqual(json.load(json_file), {"labs": LABS[:1]})
+        with open(self.path("labs.jsonl.partial"), encoding="utf-8") as jsonl_file:
+            self.assertEqual(len(jsonl_file.readlines()), 1)
+        self.assertFalse(os.path.exists(self.path("labs.jsonl")))
+
+        export(LABS, [JSONArrayWriter(self.path("labs.json"))])
+        self.assertFalse(os.path.exists(self.path("labs.json.partial")))
+
+    def test_from_json_invalid(self):
+        """Is a half-written JSON file reported like a missing one?"""
+        with open(self.path("labs.json"), "w", encoding="utf-8") as json_file:
+            json_file.write('{"labs": [')
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            self.assertEqual(from_json(path=self.path("labs.json")), [])
+        self.assertIn("JSONDecodeError", stdout.getvalue())
@@ -0,0 +1,254 @@
+"""
+
+    tests.test_fetcher
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.fetcher'.
+
+"""
+
+import unittest
+import contextlib
+import io
+import re
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from pca.cache import ResponseCache
+from pca.fetcher import RateLimiter, Fetcher
+from pca.scraper import (URLBuilder, PageParser, scrape, scrape_incremental, is_listed, discover_ceiling,
+                         discover_numbers)
+from tests.server import PCAServer, PCAHandler, lab_fixture
+
+
+class CountingHandler(PCAHandler):
+
+    """Serve fixture pages slowly, keeping the peak number of requests handled at the same time."""
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.active += 1
+            self.server.peak = max(self.server.peak, self.server.active)
+        time.sleep(0.05)
+        with self.server.lock:
+            self.server.active -= 1
+        super().do_GET()
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test case for class 'pca.fetcher.RateLimiter'."""
+
+    def test_burst_is_not_delayed(self):
+        """Are requests within the burst size let through immediately?"""
+        limiter = RateLimiter(rate=10, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_rate_is_enforced(self):
+        """Are requests exceeding the burst size delayed according to the rate?"""
+        limiter = RateLimiter(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class TestFetcher(unittest.TestCase):
+    """Test case for class 'pca.fetcher.Fetcher'."""
+
+    def test_invalid_concurrency(self):
+        """Does non-positive concurrency raise a 'ValueError'?"""
+        with self.assertRaises(ValueError):
+            Fetcher(concurrency=0)
+
+    def test_limiter_per_host(self):
+        """Does each host get its own rate limiter?"""
+        fetcher = Fetcher()
+        self.assertIs(fetcher.limiter("http://a.pl/1"), fetcher.limiter("http://a.pl/2"))
+        self.assertIsNot(fetcher.limiter("http://a.pl/1"), fetcher.limiter("http://b.pl/1"))
+
+    def test_fetch_all_keeps_order(self):
+        """Are fetched pages yielded in the order of jobs, with 'None' for missing pages?"""
+        with PCAServer() as server:
+            builder = URLBuilder(prefix=server.prefix)
+            numbers = [1327, 333, 2, 999, 456, 1]
+            fetched = list(Fetcher(concurrency=4, rate=None).fetch_all((n, builder.url(n)) for n in numbers))
+        self.assertEqual([n for n, _ in fetched], numbers)
+        self.assertIsNone(fetched[3][1])
+        self.assertIn("AB 1327", fetched[0][1])
+        self.assertIn("AB 456", fetched[4][1])
+
+    def test_concurrency_shared_by_fetch_all_calls(self):
+        """Do concurrent 'fetch_all' calls keep no more than 'concurrency' requests in flight together?"""
+        with PCAServer(CountingHandler) as server:
+            server.httpd.active, server.httpd.peak, server.httpd.lock = 0, 0, threading.Lock()
+            builder, fetcher = URLBuilder(prefix=server.prefix), Fetcher(concurrency=2, rate=None)
+            threads = [threading.Thread(target=lambda: list(fetcher.fetch_all((n, builder.url(n)) for n in range(4))))
+                       for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(server.requests), 12)
+        self.assertEqual(server.httpd.peak, 2)
+
+
+class TestScrape(unittest.TestCase):
+    """Test case for function 'pca.scraper.scrape'."""
+
+    def test_scrape_local_server(self):
+        """Does scraping the stand-in server return valid labs in the order of numbers?"""
+        with PCAServer() as server:
+            numbers = list(range(1, 20)) + [333, 456, 555, 1327]
+            labs = scrape(numbers, Fetcher(concurrency=8, rate=None), URLBuilder(prefix=server.prefix))
+            self.assertEqual(len(server.requests), len(numbers))
+        # AB 002 has no accreditation, AB 555 has expired
+        self.assertEqual([lab["number"] for lab in labs], ["AB 001", "AB 333", "AB 456", "AB 1327"])
+
+
+class TestScrapeIncremental(unittest.TestCase):
+    """Test case for function 'pca.scraper.scrape_incremental'."""
+
+    def setUp(self):
+        self.fetcher = Fetcher(rate=None)
+
+    def test_first_run(self):
+        """Does a run without previous data parse all pages and report all valid labs as added?"""
+        with PCAServer() as server:
+            builder = URLBuilder(prefix=server.prefix)
+            labs, manifest, diff = scrape_incremental([], {}, [1, 2, 333, 555, 999], self.fetcher, builder)
+        self.assertEqual([lab["number"] for lab in labs], ["AB 001", "AB 333"])
+        self.assertEqual(sorted(manifest), ["AB 001", "AB 002", "AB 333", "AB 555"])
+        self.assertEqual(manifest["AB 555"]["expiredate"], "14-03-2018")
+        self.assertEqual(diff, {"added": ["AB 001", "AB 333"], "removed": [], "changed": []})
+
+    def test_unchanged_pages_are_not_reparsed(self):
+        """Are labs of unchanged pages carried over without parsing, and changed/expired/out-of-range ones handled?"""
+        with PCAServer() as server:
+            builder = URLBuilder(prefix=server.prefix)
+            previous, manifest, _ = scrape_incremental([], {}, [1, 333, 456], self.fetcher, builder)
+
+            previous[0] = dict(previous[0], phone="00 000-00-00")  # same hash, so stale data is kept
+            manifest["AB 333"]["hash"] = "outdated"  # reparsed and changed
+            previous[1] = dict(previous[1], www="www.old.pl")
+            manifest["AB 456"]["expiredate"] = "01-01-2000"  # expired since
+            previous.append(dict(previous[0], number="AB 1500"))  # out of range, carried over
+
+            with mock.patch.object(PageParser, "parse_contents", autospec=True,
+                                   side_effect=PageParser.parse_contents) as parse_contents:
+                labs, manifest, diff = scrape_incremental(previous, manifest, [1, 333, 456], self.fetcher, builder)
+        self.assertEqual(parse_contents.call_count, 1)
+        self.assertEqual([lab["number"] for lab in labs], ["AB 001", "AB 333", "AB 1500"])
+        self.assertEqual(labs[0]["phone"], "00 000-00-00")
+        self.assertEqual(labs[1]["www"], "www.schr.gov.pl")
+        self.assertEqual(diff, {"added": [], "removed": ["AB 456"], "changed": ["AB 333"]})
+        self.assertNotEqual(manifest["AB 333"]["hash"], "outdated")
+
+    def test_missing_and_unparsable_labs(self):
+        """Are unchanged pages missing from previous data reparsed, and labs of unparsable pages kept?"""
+        original = PageParser.parse_contents
+
+        def parse_contents(parser):
+            if parser.number == "AB 333":
+                raise ValueError("Invalid lab page")
+            return original(parser)
+
+        with PCAServer() as server:
+            builder = URLBuilder(prefix=server.prefix)
+            previous, manifest, _ = scrape_incremental([], {}, [1, 333, 456], self.fetcher, builder)
+            del previous[0]  # dropped from the previous data, though its page hasn't changed
+            manifest["AB 333"]["hash"] = "outdated"
+
+            with mock.patch.object(PageParser, "parse_contents", autospec=True, side_effect=parse_contents):
+                labs, new_manifest, diff = scrape_incremental(previous, manifest, [1, 333, 456], self.fetcher,
+                                                              builder)
+        self.assertEqual([lab["number"] for lab in labs], ["AB 001", "AB 333", "AB 456"])
+        self.assertEqual(labs[1], previous[0])
+        self.assertEqual(new_manifest["AB 333"]["hash"], "outdated")  # parsed again next time
+        self.assertEqual(diff, {"added": ["AB 001"], "removed": [], "changed": []})
+
+    def test_offline_partial_cache(self):
+        """Are labs of pages not cached in offline mode carried over rather than removed?"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with PCAServer() as server, contextlib.redirect_stdout(io.StringIO()):
+            builder = URLBuilder(prefix=server.prefix)
+            previous, manifest, _ = scrape_incremental([], {}, [1, 333, 456], self.fetcher, builder)
+            list(Fetcher(rate=None, cache=ResponseCache(directory)).fetch_all([(1, builder.url(1))]))
+            offline = Fetcher(rate=None, cache=ResponseCache(directory, offline=True))
+            labs, new_manifest, diff = scrape_incremental(previous, manifest, [1, 2, 333, 456], offline, builder)
+        self.assertEqual(labs, previous)
+        self.assertEqual(new_manifest, manifest)
+        self.assertEqual(diff, {"added": [], "removed": [], "changed": []})
+
+    def test_registry(self):
+        """Are pages numbered by the code of the builder's registry and parsed by its parser?"""
+        with PCAServer() as server:
+            builder = URLBuilder(prefix=server.prefix, code="AP")  # AB pages standing in for AP ones
+            labs, manifest, diff = scrape_incremental([], {}, [1, 333], self.fetcher, builder)
+        self.assertEqual([lab["number"] for lab in labs], ["AP 001", "AP 333"])
+        self.assertEqual(labs[0]["research_fields"], "")  # under 'Dziedziny wzorcowań:' on AP pages
+        self.assertEqual(diff["added"], ["AP 001", "AP 333"])
+
+
+class RegistryHandler(PCAHandler):
+
+    """Serve the same lab page for every listed number and a listing of them split into pages of ten."""
+
+    LISTED = set(range(1, 1900)) - set(range(700, 720)) - {1898}
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        match = re.search(r"AB%20(\d+),podmiot\.html$", self.path)
+        index = re.search(r"\?page=(\d+)$", self.path)
+        if match and int(match.group(1)) in self.LISTED:
+            body = lab_fixture(1327)
+        elif index:
+            page = sorted(self.LISTED)[(int(index.group(1)) - 1) * 10:int(index.group(1)) * 10]
+            body = "\n".join('<a href="/AB%20{},podmiot.html">AB {}</a>'.format(n, n) for n in page)
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+
+class TestDiscovery(unittest.TestCase):
+    """Test case for discovery of lab numbers in module 'pca.scraper'."""
+
+    def setUp(self):
+        self.fetcher = Fetcher(rate=None)
+
+    def test_is_listed(self):
+        """Are only pages with non-empty accreditation line listed?"""
+        self.assertTrue(is_listed(lab_fixture(555)))
+        self.assertFalse(is_listed(lab_fixture(2)))
+        self.assertFalse(is_listed(None))
+
+    def test_discover_ceiling_beyond_guess(self):
+        """Is the upper bound found above the guess and across gaps, with far fewer requests than numbers?"""
+        with PCAServer(RegistryHandler) as server:
+            builder = URLBuilder(prefix=server.prefix)
+            self.assertEqual(discover_ceiling(self.fetcher, builder, guess=300, misses=10), 1900)
+            self.assertLess(len(server.requests), 100)
+
+    def test_discover_ceiling_below_guess(self):
+        """Is the upper bound never below the guess, even if the search lands in a gap of missing numbers?"""
+        with PCAServer(RegistryHandler) as server:
+            builder = URLBuilder(prefix=server.prefix)
+            self.assertEqual(discover_ceiling(self.fetcher, builder, guess=5000, misses=10), 5000)
+            # AB 710 is missing, so the search ends at AB 699, before the gap of 700-719: no less than the guess then
+            self.assertEqual(discover_ceiling(self.fetcher, builder, guess=710, misses=10), 710)
+
+    def test_numbers_from_index(self):
+        """Are lab numbers collected from all listing pages?"""
+        with PCAServer(RegistryHandler) as server:
+            builder = URLBuilder(prefix=server.prefix, index_url=server.prefix[:-len("AB%20")] + "?page={}")
+            self.assertEqual(discover_numbers(self.fetcher, builder, index=True), sorted(RegistryHandler.LISTED))
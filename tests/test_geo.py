@@ -0,0 +1,130 @@
+"""
+
+    tests.test_geo
+    ~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.geo'.
+
+"""
+
+import unittest
+import os
+import random
+import shutil
+import tempfile
+
+from pca.geo import Gazetteer, GridIndex, LabMap, distance, parse_address
+from pca.lab import Lab
+from tests.test_store import POZNAN_LAB
+
+
+def lab(number, lab_address):
+    return dict(POZNAN_LAB, number=number, lab_address=lab_address)
+
+
+class TestAddresses(unittest.TestCase):
+    """Test case for parsing and geocoding of addresses."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parse_address(self):
+        """Are postal code and city taken from the last part of an address that has them?"""
+        self.assertEqual(parse_address("ul. Małeckiego 29; 60-706 Poznań"), ("60-706", "Poznań"))
+        self.assertEqual(parse_address("ul. Lipowa 1; 00-001 Warszawa; 66-400 Gorzów Wlkp."),
+                         ("66-400", "Gorzów Wlkp."))
+        self.assertEqual(parse_address("Gierszowice ; 49-332 Olszanka"), ("49-332", "Olszanka"))
+        for address in ["ul. Małeckiego 29, Poznań", "", None]:
+            self.assertEqual(parse_address(address), (None, None))
+
+    def test_gazetteer(self):
+        """Are places resolved by city first, by the longest postal code prefix otherwise, and cached?"""
+        gazetteer = Gazetteer()
+        self.assertEqual(gazetteer.resolve("60-706", "Poznań"), (52.41, 16.93, "city"))
+        self.assertEqual(gazetteer.resolve("66-400", "GORZÓW  wlkp."), gazetteer.resolve(None, "Gorzów Wielkopolski"))
+        self.assertEqual(gazetteer.resolve("81-750", "Nieznanowo")[2], "postal")
+        self.assertEqual(gazetteer.resolve("81-750", "Nieznanowo")[:2], gazetteer.resolve(None, "Sopot")[:2])
+        self.assertIsNone(gazetteer.resolve(None, "Nieznanowo"))
+        self.assertIn(("81-750", "Nieznanowo"), gazetteer.cache)
+        self.assertEqual(gazetteer.locate("Poznań"), gazetteer.locate("ul. Małeckiego 29; 60-706 Poznań"))
+        self.assertEqual(gazetteer.locate("60-100")[2], "postal")
+
+        path = os.path.join(self.directory, "gazetteer.csv")
+        with open(path, "w", encoding="utf-8") as csv_file:
+            csv_file.write("postal_code,city,lat,lon\n60,Poznań,52.4,16.9\n60-706,Poznań,52.41,16.88\n")
+        self.assertEqual(Gazetteer(path).resolve("60-706", "Luboń"), (52.41, 16.88, "postal"))
+        self.assertEqual(Gazetteer(path).resolve("60-706", "Poznań"), (52.41, 16.88, "city"))
+        self.assertEqual(Gazetteer(path).resolve(None, "Poznań"), (52.4, 16.9, "city"))  # one district, one city
+
+    def test_gazetteer_same_names(self):
+        """Are towns of the same name told apart by postal code, and ambiguous without one?"""
+        path = os.path.join(self.directory, "gazetteer.csv")
+        with open(path, "w", encoding="utf-8") as csv_file:
+            csv_file.write("postal_code,city,lat,lon\n05-180,Nowy Dwór,52.43,20.72\n16-100,Nowy Dwór,53.64,23.55\n"
+                           "16,Białystok,53.13,23.16\n")
+        gazetteer = Gazetteer(path)
+        self.assertEqual(gazetteer.resolve("16-100", "Nowy Dwór"), (53.64, 23.55, "city"))
+        self.assertEqual(gazetteer.resolve("05-180", "Nowy Dwór"), (52.43, 20.72, "city"))
+        self.assertEqual(gazetteer.resolve("16-200", "Nowy Dwór"), (53.13, 23.16, "postal"))
+        self.assertIsNone(gazetteer.resolve(None, "Nowy Dwór"))
+        self.assertTrue(gazetteer.ambiguous("Nowy Dwór"))
+        self.assertFalse(gazetteer.ambiguous("ul. Polna 1; 16-100 Nowy Dwór"))
+
+        labs = [lab("AB 001", "ul. Polna 1; 16-100 Nowy Dwór"), lab("AB 002", "ul. Polna 2; 99-999 Nowy Dwór"),
+                lab("AB 003", "ul. Polna 3; 99-999 Nieznanowo")]
+        lab_map = LabMap(labs, Gazetteer(path))
+        self.assertEqual(lab_map.locations["AB 001"], (53.64, 23.55, "city"))
+        self.assertEqual((lab_map.ambiguous, lab_map.unresolved), (["AB 002"], ["AB 003"]))
+        with self.assertRaisesRegex(ValueError, "Ambiguous"):
+            lab_map.near("Nowy Dwór", 10)
+
+    def test_distance(self):
+        """Is distance between cities computed along the great circle?"""
+        self.assertAlmostEqual(distance(52.23, 21.01, 50.06, 19.94), 252, delta=2)  # Warszawa - Kraków
+        self.assertEqual(distance(52.23, 21.01, 52.23, 21.01), 0)
+
+
+class TestGridIndex(unittest.TestCase):
+    """Test case for class 'GridIndex'."""
+
+    def test_queries(self):
+        """Do radius and nearest-k queries return the same points as a scan of all points?"""
+        rng = random.Random(0)
+        points = [(i, rng.uniform(49, 55), rng.uniform(14, 24)) for i in range(2000)]
+        points += [(i, 52.23, 21.01) for i in range(2000, 2010)]  # points at the same place
+        index = GridIndex()
+        for key, lat, lon in points:
+            index.add(key, lat, lon)
+        self.assertEqual(len(index), 2010)
+        for lat, lon in [(52.23, 21.01), (50.0, 19.5), (54.9, 14.1), (60.0, 30.0)]:
+            scan = sorted((distance(lat, lon, point_lat, point_lon), key) for key, point_lat, point_lon in points)
+            self.assertEqual(sorted(index.within(lat, lon, 50)), [pair for pair in scan if pair[0] <= 50])
+            nearest = index.nearest(lat, lon, 15)
+            self.assertEqual([d for d, _ in nearest], [d for d, _ in scan[:15]])
+        self.assertEqual(len(index.nearest(52.23, 21.01, 5000)), 2010)
+        self.assertEqual(GridIndex().nearest(52.23, 21.01, 3), [])
+        self.assertEqual(index.nearest(52.23, 21.01, 0), [])
+
+
+class TestLabMap(unittest.TestCase):
+    """Test case for class 'LabMap'."""
+
+    def test_lab_map(self):
+        """Are labs geocoded by their addresses and found near places given by name, address or coordinates?"""
+        labs = [lab("AB 001", "ul. Małeckiego 29; 60-706 Poznań"),
+                Lab.from_dict(lab("AB 002", "ul. Rubież 46; 61-612 Poznań")),
+                lab("AB 003", "ul. Polna 1; 60-101 Junikowo"),
+                lab("AB 004", "ul. Szczęśliwicka 34; 02-353 Warszawa"),
+                lab("AB 005", "ul. Nieznana 1")]
+        lab_map = LabMap(labs)
+        self.assertEqual(lab_map.unresolved, ["AB 005"])
+        self.assertEqual(lab_map.locations["AB 003"][2], "postal")
+        self.assertEqual([number for _, number in lab_map.near("Poznań", 30)], ["AB 001", "AB 002", "AB 003"])
+        self.assertEqual(lab_map.nearest("ul. Wiejska 4; 00-902 Warszawa")[0][1], "AB 004")
+        self.assertEqual(lab_map.nearest((52.0, 20.0), 2)[1][1], "AB 001")
+        self.assertEqual(LabMap(labs, field="org_address").locations["AB 001"][:2], lab_map.locations["AB 004"][:2])
+        with self.assertRaises(ValueError):
+            lab_map.near("Nieznanowo", 10)
@@ -0,0 +1,93 @@
+"""
+
+    tests.test_lab
+    ~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.lab'.
+
+"""
+
+import unittest
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+from pca.data import JSONArrayWriter, export, to_list
+from pca.lab import Lab, as_dict
+from tests.test_data import LABS
+
+
+class TestLab(unittest.TestCase):
+    """Test case for class 'Lab'."""
+
+    def test_roundtrip(self):
+        """Does conversion to Lab and back give the same dict, missing sections included?"""
+        for lab in LABS:
+            self.assertEqual(Lab.from_dict(lab).to_dict(), lab)
+
+    def test_list_fields(self):
+        """Are research sections tuples, empty for a missing section, which is told apart from an empty one?"""
+        lab = Lab.from_dict(LABS[1])
+        self.assertEqual(lab.research_fields, ("Badania chemiczne, analityka chemiczna (C)",
+                                               "Badania właściwości fizycznych (N)"))
+        self.assertEqual(lab.research_objects, ())
+        self.assertEqual(lab.missing, ("research_objects",))
+        empty = Lab.from_dict(dict(LABS[1], research_objects=[]))
+        self.assertEqual(empty.research_objects, ())
+        self.assertEqual(empty["research_objects"], [])
+        self.assertNotEqual(empty, lab)
+
+    def test_getitem(self):
+        """Does indexing by key return values in the dict shape?"""
+        lab = Lab.from_dict(LABS[1])
+        self.assertEqual(lab["email"], "kielce@schr.gov.pl")
+        self.assertEqual(lab["research_objects"], "")
+        self.assertEqual(dict(lab), LABS[1])
+        with self.assertRaises(KeyError):
+            lab["city"]
+
+    def test_no_dict(self):
+        """Does a Lab go without a per-instance dict?"""
+        self.assertFalse(hasattr(Lab.from_dict(LABS[0]), "__dict__"))
+
+    def test_interned(self):
+        """Do labs share the same objects for equal strings?"""
+        copies = [json.loads(json.dumps(LABS[0])) for _ in range(2)]
+        first, second = [Lab.from_dict(lab) for lab in copies]
+        self.assertIs(first.org_name, second.org_name)
+        self.assertIs(first.research_objects[0], second.research_objects[0])
+
+    def test_equality_and_pickle(self):
+        """Are labs compared by value and picklable?"""
+        lab = Lab.from_dict(LABS[0])
+        self.assertEqual(pickle.loads(pickle.dumps(lab)), lab)
+        self.assertNotEqual(lab, Lab.from_dict(LABS[1]))
+
+    def test_as_dict(self):
+        """Does 'as_dict' convert Labs and pass dicts through?"""
+        self.assertEqual(as_dict(Lab.from_dict(LABS[0])), LABS[0])
+        self.assertIs(as_dict(LABS[0]), LABS[0])
+
+
+class TestLabExport(unittest.TestCase):
+    """Test case for exporting Labs with writers of module 'pca.data'."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_export(self):
+        """Are Labs written the same as lab dicts?"""
+        path = os.path.join(self.directory, "labs.json")
+        export([Lab.from_dict(lab) for lab in LABS], [JSONArrayWriter(path)])
+        with open(path, encoding="utf-8") as json_file:
+            self.assertEqual(json.load(json_file), {"labs": LABS})
+
+    def test_to_list(self):
+        """Does 'to_list' translate a Lab the same as its dict?"""
+        for lab in LABS:
+            self.assertEqual(to_list(Lab.from_dict(lab)), to_list(lab))
@@ -0,0 +1,117 @@
+"""
+
+    tests.test_lookup
+    ~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.lookup'.
+
+"""
+
+import unittest
+import contextlib
+import io
+import threading
+import time
+
+from pca.fetcher import Fetcher
+from pca.lookup import LabLookup
+from pca.scraper import URLBuilder
+from tests.server import PCAHandler, PCAServer
+
+
+class SlowHandler(PCAHandler):
+
+    """Serve fixture pages with a delay, so that lookups overlap."""
+
+    def do_GET(self):
+        time.sleep(0.2)
+        super().do_GET()
+
+
+class TestLabLookup(unittest.TestCase):
+    """Test case for class 'LabLookup'."""
+
+    def lookup(self, server, **kwargs):
+        return LabLookup(Fetcher(rate=None), URLBuilder(prefix=server.prefix), **kwargs)
+
+    def test_get(self):
+        """Is a lab fetched once and then served from the cache, whatever form its number is given in?"""
+        with PCAServer() as server, contextlib.redirect_stdout(io.StringIO()):
+            lookup = self.lookup(server)
+            lab = lookup.get("AB 1327")
+            self.assertEqual(lab["lab_name"], "P.P.U.H. Badania Nieniszczące SONOBAD Andrzej Zadura")
+            self.assertIs(lookup.get(1327), lab)
+            self.assertIsNone(lookup.get(999))
+            self.assertIsNone(lookup.get(999))
+            self.assertEqual(len(server.requests), 2)
+
+    def test_other_registry(self):
+        """Are numbers of other registries rejected rather than looked up as AB labs?"""
+        with PCAServer() as server, contextlib.redirect_stdout(io.StringIO()):
+            lookup = self.lookup(server)
+            with self.assertRaises(ValueError):
+                lookup.get("AP 1327")
+            with self.assertRaises(ValueError):
+                lookup.get_many([1, "AP 333"])
+            self.assertEqual(server.requests, [])
+            self.assertEqual(lookup.get("1327")["number"], "AB 1327")
+            self.assertEqual(list(lookup.cache), [("AB", 1327)])
+
+    def test_lru_eviction(self):
+        """Is the least recently used lab evicted when the cache is full?"""
+        with PCAServer() as server, contextlib.redirect_stdout(io.StringIO()):
+            lookup = self.lookup(server, maxsize=2)
+            lookup.get(1)
+            lookup.get(333)
+            lookup.get(1)
+            lookup.get(456)  # evicts 333
+            lookup.get(1)
+            self.assertEqual(len(server.requests), 3)
+            lookup.get(333)
+            self.assertEqual(len(server.requests), 4)
+
+    def test_ttl(self):
+        """Are expired labs fetched again?"""
+        with PCAServer() as server, contextlib.redirect_stdout(io.StringIO()):
+            lookup = self.lookup(server, ttl=0.1)
+            lookup.get(1)
+            lookup.get(1)
+            time.sleep(0.15)
+            lookup.get(1)
+            self.assertEqual(len(server.requests), 2)
+
+    def test_invalidate(self):
+        """Is an invalidated lab fetched again?"""
+        with PCAServer() as server, contextlib.redirect_stdout(io.StringIO()):
+            lookup = self.lookup(server)
+            lookup.get(1)
+            lookup.invalidate("AB 001")
+            lookup.get(1)
+            self.assertEqual(len(server.requests), 2)
+
+    def test_concurrent_lookups_coalesced(self):
+        """Do concurrent lookups of one lab share a single request?"""
+        with PCAServer(SlowHandler) as server, contextlib.redirect_stdout(io.StringIO()):
+            lookup = self.lookup(server)
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(lookup.get(333))) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(server.requests), 1)
+            self.assertEqual(len(results), 8)
+            self.assertTrue(all(lab is results[0] for lab in results))
+
+    def test_get_many(self):
+        """Are labs of a batch fetched concurrently, once each?"""
+        with PCAServer(SlowHandler) as server, contextlib.redirect_stdout(io.StringIO()):
+            lookup = self.lookup(server)
+            start = time.monotonic()
+            labs = lookup.get_many(["AB 001", 333, "AB 333", 456, 2])
+            self.assertLess(time.monotonic() - start, 0.6)
+            self.assertEqual(len(server.requests), 4)
+            self.assertEqual(list(labs), ["AB 001", 333, "AB 333", 456, 2])
+            self.assertIs(labs[333], labs["AB 333"])
+            self.assertIsNone(labs[2])
+            self.assertEqual(labs[456]["email"], "")
@@ -0,0 +1,116 @@
+"""
+
+    tests.test_metrics
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.metrics'.
+
+"""
+
+import unittest
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from pca.data import JSONLinesWriter, export
+from pca.fetcher import Fetcher
+from pca.metrics import Metrics
+from pca.scraper import URLBuilder, iter_scrape
+from tests.server import PCAServer
+
+
+def counter(metrics, name, **labels):
+    """Return value of counter with given name and labels (0 if not recorded)."""
+    return metrics.counters.get(metrics.key(name, labels), 0)
+
+
+class TestMetrics(unittest.TestCase):
+    """Test case for class 'Metrics'."""
+
+    def test_counters_and_timings(self):
+        """Are counters summed and timings aggregated per labels?"""
+        metrics = Metrics()
+        metrics.incr("pages_total", status=200)
+        metrics.incr("pages_total", 2, status=200)
+        metrics.incr("pages_total", status=404)
+        for seconds in [0.5, 0.25, 1.0]:
+            metrics.observe("parse_seconds", seconds)
+        timings = metrics.as_dict()["timings"]
+        self.assertEqual(counter(metrics, "pages_total", status=200), 3)
+        self.assertEqual(counter(metrics, "pages_total", status=404), 1)
+        self.assertEqual(timings, [{"name": "parse_seconds", "labels": {}, "count": 3, "sum": 1.75, "min": 0.25,
+                                    "max": 1.0}])
+
+    def test_stage(self):
+        """Is a stage timed, profiled and traced when asked for?"""
+        metrics = Metrics(profile=["parse"], trace_memory=["parse"])
+        for _ in range(2):
+            with metrics.stage("parse"):
+                sorted(range(100000), key=lambda i: -i)
+        with metrics.stage("export"):
+            pass
+        exported = metrics.as_dict()
+        self.assertEqual([(t["labels"]["stage"], t["count"]) for t in exported["timings"]], [("export", 1),
+                                                                                              ("parse", 2)])
+        self.assertIn("<lambda>", exported["profiles"]["parse"])
+        self.assertNotIn("export", exported["profiles"])
+        self.assertGreater(exported["memory_peaks"]["parse"], 100000 * 8)
+
+    def test_prometheus(self):
+        """Are metrics exported in Prometheus text format?"""
+        metrics = Metrics()
+        metrics.incr("http_responses_total", status=200)
+        metrics.observe("stage_seconds", 0.5, stage="parse")
+        self.assertEqual(metrics.to_prometheus(), "\n".join([
+            "# TYPE pca_http_responses_total counter",
+            'pca_http_responses_total{status="200"} 1',
+            "# TYPE pca_stage_seconds summary",
+            'pca_stage_seconds_count{stage="parse"} 1',
+            'pca_stage_seconds_sum{stage="parse"} 0.5']) + "\n")
+
+    def test_write(self):
+        """Is the format of the metrics file chosen by its extension?"""
+        directory = tempfile.mkdtemp()
+        try:
+            metrics = Metrics()
+            metrics.incr("labs_total", outcome="parsed")
+            with contextlib.redirect_stdout(io.StringIO()):
+                metrics.write(os.path.join(directory, "metrics.json"))
+                metrics.write(os.path.join(directory, "metrics.prom"))
+            with open(os.path.join(directory, "metrics.json")) as json_file:
+                self.assertEqual(json.load(json_file)["counters"][0]["value"], 1)
+            with open(os.path.join(directory, "metrics.prom")) as prom_file:
+                self.assertIn('pca_labs_total{outcome="parsed"} 1', prom_file.read())
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestRunMetrics(unittest.TestCase):
+    """Test case for metrics recorded during a scrape run."""
+
+    def test_scrape(self):
+        """Are HTTP, parse, outcome and export metrics recorded?"""
+        directory = tempfile.mkdtemp()
+        try:
+            with PCAServer() as server:
+                fetcher = Fetcher(concurrency=2, rate=None)
+                labs = iter_scrape([1, 2, 333, 555, 999], fetcher, URLBuilder(prefix=server.prefix))
+                export(labs, [JSONLinesWriter(os.path.join(directory, "labs.jsonl"))], metrics=fetcher.metrics)
+        finally:
+            shutil.rmtree(directory)
+        metrics = fetcher.metrics
+        self.assertEqual(counter(metrics, "http_responses_total", status=200), 4)
+        self.assertEqual(counter(metrics, "http_responses_total", status=404), 1)
+        self.assertEqual(counter(metrics, "pages_fetched_total", source="network"), 5)
+        for outcome, count in [("parsed", 2), ("skipped", 1), ("expired", 1), ("missing", 1)]:
+            self.assertEqual(counter(metrics, "labs_total", outcome=outcome), count, outcome)
+        self.assertEqual(counter(metrics, "labs_exported_total"), 2)
+        self.assertGreater(counter(metrics, "bytes_received_total"), 0)
+        timings = {(t["name"], tuple(t["labels"].values())): t["count"] for t in metrics.as_dict()["timings"]}
+        self.assertEqual(timings[("stage_seconds", ("parse",))], 4)
+        self.assertEqual(timings[("ttfb_seconds", ())], 5)
+        self.assertEqual(timings[("export_seconds", ("JSONLinesWriter",))], 2)
+        self.assertGreaterEqual(timings[("connect_seconds", ())], 1)
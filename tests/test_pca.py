@@ -8,10 +8,13 @@
 """
 
 import unittest
+import contextlib
+import io
 import itertools
 import datetime
 
-from pca.scraper import URLBuilder, PageParser
+from pca.scraper import URLBuilder, PageParser, parse_page, parse_many
+from tests.server import fixture, lab_fixture
 
 
 class TestURLBuilder(unittest.TestCase):
@@ -49,8 +52,7 @@ class TestPageParser(unittest.TestCase):
     """Test case for class 'pca.scraper.PageParser"""
 
     def setUp(self):
-        url = "https://www.pca.gov.pl/akredytowane-podmioty/akredytacje-aktywne/laboratoria-badawcze/AB%201327,podmiot.html"
-        self.parser = PageParser(1327, url)
+        self.parser = PageParser(1327, lab_fixture(1327))
         self.pattern = "Data ważności certyfikatu:"
 
         self.today = datetime.date.today()
@@ -220,8 +222,7 @@ class TestPageParser(unittest.TestCase):
 
     def test_parse_contents_expired(self):
         """Does parsing a valid page with expired certification returns 'None'"""
-        url = "https://www.pca.gov.pl/akredytowane-podmioty/akredytacje-aktywne/laboratoria-badawcze/AB%20555,podmiot.html"
-        parser = PageParser(555, url)
+        parser = PageParser(555, lab_fixture(555))
         self.assertIs(parser.parse_contents(), None)
 
     def test_parse_contents_no_cellphone_multiline_research_fields_and_objects(self):
@@ -234,8 +235,7 @@ class TestPageParser(unittest.TestCase):
         - multiline research objects
         return a proper dict?
         """
-        url = "https://www.pca.gov.pl/akredytowane-podmioty/akredytacje-aktywne/laboratoria-badawcze/AB%20333,podmiot.html"
-        parser = PageParser(333, url)
+        parser = PageParser(333, lab_fixture(333))
         expected = {
             "number": "AB 333",
             "certdate": "2001-07-06",
@@ -263,8 +263,7 @@ class TestPageParser(unittest.TestCase):
         - one line of research objects
         return a proper dict?
         """
-        url = "https://www.pca.gov.pl/akredytowane-podmioty/akredytacje-aktywne/laboratoria-badawcze/AB%20456,podmiot.html"
-        parser = PageParser(456, url)
+        parser = PageParser(456, lab_fixture(456))
         expected = {
             "number": "AB 456",
             "certdate": "2004-02-12",
@@ -284,8 +283,66 @@ class TestPageParser(unittest.TestCase):
     def test_parse_contents_arbitrary_URL(self):
         """Does parsing contents of an arbitrary page raise a ValueError?"""
 
-        url = "https://www.google.pl"
-        parser = PageParser(456, url)
+        parser = PageParser(456, fixture("not_a_lab.html"))
 
         with self.assertRaises(ValueError):
             parser.parse_contents()
+
+    def test_parse_contents_cellphone_multiline_research_fields_and_objects(self):
+        """Does parsing a valid page with a cellphone and multiline research fields and objects return a proper dict?"""
+        parser = PageParser(1, lab_fixture(1))
+        expected = {
+            "number": "AB 001",
+            "certdate": "1992-09-08",
+            "org_name": "Urząd Dozoru Technicznego",
+            "org_address": "ul. Szczęśliwicka 34; 02-353 Warszawa",
+            "lab_name": "Centralne Laboratorium Dozoru Technicznego",
+            "lab_address": "ul. Małeckiego 29; 60-706 Poznań",
+            "phone": "61 628-03-00",
+            "cellphone": " 602-606-272",
+            "email": "cldt@udt.gov.pl",
+            "www": "www.udt.gov.pl",
+            "research_fields": ["Badania akustyczne i hałasu - w tym hałasu spowodowanego przez drgania (A)",
+                                "Badania chemiczne, analityka chemiczna (C)",
+                                "Badania kompatybilności elektromagnetycznej (EMC) (F)",
+                                "Badania nieniszczące (L)"],
+            "research_objects": ["Wyroby budowlane, materiały budowlane, obiekty budowlane",
+                                 "Paliwa i materiały smarne", "Szkło i ceramika"]
+        }
+        self.assertEqual(parser.parse_contents(), expected)
+
+    def test_parse_contents_without_sections(self):
+        """Does parsing a valid page without research fields and objects sections return empty strings for them?"""
+        contents = lab_fixture(1327).split("<h3>Dziedziny badań:</h3>")[0]
+        lab = PageParser(1327, contents).parse_contents()
+        self.assertEqual((lab["research_fields"], lab["research_objects"]), ("", ""))
+
+    def test_parse_contents_no_accreditation(self):
+        """Does parsing a page with empty accreditation line return 'None'?"""
+        parser = PageParser(2, lab_fixture(2))
+        self.assertIs(parser.parse_contents(), None)
+
+    def test_parse_contents_bytes(self):
+        """Does parsing raw bytes of a page return the same dict as parsing its text?"""
+        contents = lab_fixture(1327)
+        self.assertEqual(PageParser(1327, contents.encode("utf-8")).parse_contents(),
+                         self.parser.parse_contents())
+
+
+class TestParseMany(unittest.TestCase):
+    """Test case for functions 'pca.scraper.parse_page' and 'pca.scraper.parse_many'."""
+
+    def test_parse_many_keeps_order(self):
+        """Does parsing pages in worker processes yield the same labs as parsing them one by one, in order?"""
+        pages = [(n, lab_fixture(n)) for n in [1327, 1, 555, 333, 2, 456]]
+        expected = [parse_page(n, contents) for n, contents in pages]
+        self.assertEqual(list(parse_many(pages, processes=2, chunksize=2)), expected)
+        self.assertEqual([lab and lab["number"] for lab in expected],
+                         ["AB 1327", "AB 001", None, "AB 333", None, "AB 456"])
+
+    def test_parse_many_unparsable(self):
+        """Does an unparsable page yield 'None' without losing the other labs?"""
+        pages = iter([(1, lab_fixture(1)), (456, fixture("not_a_lab.html")), (333, lab_fixture(333))] * 5)
+        with contextlib.redirect_stdout(io.StringIO()):
+            labs = list(parse_many(pages, processes=2, chunksize=1))
+        self.assertEqual([lab and lab["number"] for lab in labs], ["AB 001", None, "AB 333"] * 5)
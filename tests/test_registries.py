@@ -0,0 +1,117 @@
+"""
+
+    tests.test_registries
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.registries'.
+
+"""
+
+import unittest
+import contextlib
+import io
+import re
+import time
+from unittest import mock
+
+from pca.fetcher import Fetcher
+from pca.registries import REGISTRIES, Registry, iter_scrape_registries
+from pca.scraper import PageParser, URLBuilder
+from tests.server import PCAHandler, PCAServer, lab_fixture
+
+REGISTRY_PATH_REGEX = re.compile(r"^/([\w-]+)/([A-Z]{2})%20(\d+),podmiot\.html$")
+
+
+def calibration_page(number):
+    """Return fixture page of lab with given number turned into the page of a calibration lab ('None' if there is none)."""
+    contents = lab_fixture(number)
+    if contents is None:
+        return None
+    return contents.replace("Dziedziny badań:", "Dziedziny wzorcowań:").replace("AB ", "AP ")
+
+
+class RegistriesHandler(PCAHandler):
+
+    """Serve fixture pages of AB labs and, with replaced markers, of AP labs under paths of their registries."""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        match = REGISTRY_PATH_REGEX.search(self.path)
+        contents = None
+        if match is not None and REGISTRIES[match.group(2)].path == match.group(1):
+            time.sleep(0.2)
+            number = int(match.group(3))
+            contents = lab_fixture(number) if match.group(2) == "AB" else calibration_page(number)
+        if contents is None:
+            self.send_error(404)
+            return
+        body = contents.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestRegistry(unittest.TestCase):
+    """Test case for class 'Registry'."""
+
+    def test_default_registry(self):
+        """Does the AB registry build URLs of 'URLBuilder' and parse pages with 'PageParser'?"""
+        registry, builder = REGISTRIES["AB"], URLBuilder()
+        self.assertIs(registry.parser_class, PageParser)
+        self.assertEqual(registry.builder().url(1327), builder.url(1327))
+        self.assertEqual(registry.builder().index_page_url(2), builder.index_page_url(2))
+        self.assertEqual(registry.number(1), "AB 001")
+
+    def test_variant(self):
+        """Are pages of other registries parsed by their own markers and columns?"""
+        registry = Registry("AP", "laboratoria-wzorcujace", "calibration laboratories",
+                            markers={"FIELDS_LABEL": "Dziedziny wzorcowań:"})
+        with contextlib.redirect_stdout(io.StringIO()):
+            lab = registry.parser_class(333, calibration_page(333)).parse_contents()
+            self.assertEqual(lab["number"], "AP 333")
+            self.assertEqual(lab["research_fields"], ["Badania chemiczne, analityka chemiczna (C)",
+                                                      "Badania właściwości fizycznych (N)"])
+            self.assertEqual(PageParser(333, calibration_page(333)).parse_contents()["research_fields"], "")
+
+            without_email = Registry("AX", "x", "x", columns=["certdate", "org_name", "org_address", "lab_name",
+                                                               "lab_address", "phone", "cellphone", "www"])
+            page = lab_fixture(333).replace("Email:", "Poczta:")
+            self.assertEqual(without_email.parser_class(333, page).parse_contents()["email"], "")
+            with self.assertRaises(ValueError):
+                PageParser(333, page).parse_contents()
+        with self.assertRaises(ValueError):
+            Registry("AX", "x", "x", markers={"FIELDS_LABEL": "Dziedziny"})
+
+    def test_index_links(self):
+        """Are links to entries of the registry found on its listing pages?"""
+        builder = REGISTRIES["AP"].builder()
+        contents = '<a href="AP%20012,podmiot.html">AP 012</a> <a href="AB%20013,podmiot.html">AB 013</a>'
+        self.assertEqual(builder.parse_index_page(contents), {12})
+
+
+class TestScrapeRegistries(unittest.TestCase):
+    """Test case for scraping several registries in one run."""
+
+    def test_concurrent_registries(self):
+        """Are registries scraped at the same time and their labs yielded registry after registry?"""
+        with PCAServer(RegistriesHandler) as server, contextlib.redirect_stdout(io.StringIO()):
+            site = "http://127.0.0.1:{}/".format(server.httpd.server_address[1])
+            fetcher = Fetcher(concurrency=8, rate=None)
+            start = time.monotonic()
+            labs = list(iter_scrape_registries(["AB", "AP"], [1, 333, 456, 1327], fetcher, site))
+            elapsed = time.monotonic() - start
+        self.assertEqual([lab["number"] for lab in labs],
+                         ["AB 001", "AB 333", "AB 456", "AB 1327", "AP 001", "AP 333", "AP 456", "AP 1327"])
+        self.assertEqual(labs[5]["research_fields"], labs[1]["research_fields"])
+        self.assertLess(elapsed, 0.35)  # 0.2 s per page, one registry after another would take 0.4 s
+
+    def test_bounded_buffers(self):
+        """Are labs of later registries yielded in full and in order when their buffers fill up?"""
+        with PCAServer(RegistriesHandler) as server, contextlib.redirect_stdout(io.StringIO()):
+            site = "http://127.0.0.1:{}/".format(server.httpd.server_address[1])
+            with mock.patch("pca.registries.BUFFER_SIZE", 1):
+                labs = list(iter_scrape_registries(["AB", "AP"], [1, 333, 456, 1327], Fetcher(concurrency=8, rate=None),
+                                                   site))
+        self.assertEqual([lab["number"] for lab in labs],
+                         ["AB 001", "AB 333", "AB 456", "AB 1327", "AP 001", "AP 333", "AP 456", "AP 1327"])
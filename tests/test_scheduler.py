@@ -0,0 +1,190 @@
+"""
+
+    tests.test_scheduler
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.scheduler'.
+
+"""
+
+import unittest
+import contextlib
+import email.utils
+import io
+import threading
+import time
+
+from pca.fetcher import Fetcher
+from pca.metrics import Metrics
+from pca.scheduler import PAUSE, AdaptiveScheduler, retry_after
+from pca.scraper import URLBuilder, iter_scrape
+from tests.server import PCAHandler, PCAServer
+
+NUMBERS = [1, 333, 456, 1327] * 10  # numbers of fixture pages
+
+
+class ThrottlingHandler(PCAHandler):
+
+    """Serve fixture pages after 'server.latency' seconds, answering 429 with 'Retry-After' to requests over 'server.capacity' in flight."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.peak = max(server.peak, server.in_flight)
+            server.arrived.append(time.monotonic())
+            throttled = server.in_flight > server.capacity or time.monotonic() < server.paused_until
+            if throttled:
+                server.throttled.append(time.monotonic())
+                server.paused_until = max(server.paused_until, time.monotonic() + server.retry_after)
+        try:
+            if throttled:
+                self.send_response(429)
+                self.send_header("Retry-After", str(int(server.retry_after)))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            time.sleep(server.latency)
+            with server.lock:
+                server.served.append(time.monotonic())
+            super().do_GET()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+def throttling_server(capacity, latency=0.02, retry_after=1):
+    server = PCAServer(ThrottlingHandler)
+    server.httpd.lock = threading.Lock()
+    server.httpd.in_flight = server.httpd.peak = 0
+    server.httpd.capacity, server.httpd.latency, server.httpd.retry_after = capacity, latency, retry_after
+    server.httpd.paused_until = 0.0
+    server.httpd.arrived, server.httpd.throttled, server.httpd.served = [], [], []
+    return server
+
+
+class TestRetryAfter(unittest.TestCase):
+    """Test case for function 'retry_after'."""
+
+    def test_retry_after(self):
+        """Are delays in seconds and HTTP dates understood and invalid headers ignored?"""
+        self.assertEqual(retry_after("120"), 120)
+        now = time.time()
+        self.assertAlmostEqual(retry_after(email.utils.formatdate(now + 30, usegmt=True), now), 30, delta=1)
+        self.assertEqual(retry_after(email.utils.formatdate(now - 30, usegmt=True), now), 0)
+        for value in [None, "", "soon", "-5"]:
+            self.assertIsNone(retry_after(value))
+
+
+class TestAdaptiveScheduler(unittest.TestCase):
+    """Test case for class 'AdaptiveScheduler'."""
+
+    def respond(self, scheduler, status=200, retry_after_header=None, latency=0.0, error=False):
+        scheduler.acquire()
+        scheduler.release(time.monotonic() - latency, status, retry_after_header, error)
+
+    def test_additive_increase(self):
+        """Is the limit raised by one per limit's worth of fast responses, up to the maximum?"""
+        scheduler = AdaptiveScheduler(maximum=4)
+        self.respond(scheduler)
+        self.assertEqual(scheduler.state()["limit"], 2)
+        for _ in range(3):  # 2 + 1/2 + 1/2.5 + 1/2.9
+            self.respond(scheduler)
+        self.assertEqual(scheduler.state()["limit"], 3)
+        for _ in range(20):
+            self.respond(scheduler)
+        self.assertEqual(scheduler.state()["limit"], 4)
+
+    def test_multiplicative_decrease(self):
+        """Is the limit halved by throttled, failed and slow responses, once per round trip?"""
+        scheduler = AdaptiveScheduler(maximum=16, initial=16)
+        for _ in range(3):
+            scheduler.acquire()
+        started = time.monotonic()
+        scheduler.release(started, 503, "0")
+        scheduler.release(started, 503, "0")  # sent before the cut, no second one
+        self.assertEqual(scheduler.state()["limit"], 8)
+        scheduler.release(time.monotonic(), error=True)
+        self.assertEqual(scheduler.state()["limit"], 4)
+
+        state = scheduler.state()
+        self.assertEqual((state["throttled"], state["errors"], state["responses"]), (2, 1, 3))
+        self.assertEqual(state["in_flight"], 0)
+
+        scheduler = AdaptiveScheduler(maximum=16, initial=8)
+        self.respond(scheduler, latency=0.01)
+        self.respond(scheduler, latency=0.3)  # one slow response isn't enough...
+        self.assertEqual(scheduler.state()["limit"], 8)
+        for _ in range(5):
+            self.respond(scheduler, latency=0.3)  # ...but a slow average is, once for those sent before the cut
+        self.assertEqual(scheduler.state()["limit"], 4)
+        self.assertEqual(scheduler.state()["decreases"], 1)
+
+        scheduler = AdaptiveScheduler(maximum=4, minimum=2, initial=2)
+        self.respond(scheduler, 429, "0")
+        self.assertEqual(scheduler.state()["limit"], 2)
+        with self.assertRaises(ValueError):
+            AdaptiveScheduler(maximum=1, minimum=2)
+
+    def test_limit_is_enforced(self):
+        """Does 'acquire' block while the limit of requests is in flight?"""
+        scheduler = AdaptiveScheduler(maximum=4, initial=2)
+        scheduler.acquire()
+        scheduler.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (scheduler.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        scheduler.release(time.monotonic(), 200)
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_retry_after_pauses(self):
+        """Are requests held off for as long as 'Retry-After' asks (or 'PAUSE' seconds)?"""
+        scheduler = AdaptiveScheduler(maximum=4, initial=4)
+        self.respond(scheduler, 429, "1")
+        self.assertGreater(scheduler.state()["paused_for"], 0.9)
+        start = time.monotonic()
+        scheduler.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+        scheduler.release(time.monotonic(), 503)
+        self.assertAlmostEqual(scheduler.state()["paused_for"], PAUSE, delta=0.1)
+
+    def test_metrics(self):
+        """Are cuts of the limit counted by host and reason?"""
+        metrics = Metrics()
+        scheduler = AdaptiveScheduler(maximum=4, initial=4, metrics=metrics, host="example.com")
+        self.respond(scheduler, 500)
+        self.assertEqual(metrics.counters[("scheduler_decreases_total", (("host", "example.com"),
+                                                                         ("reason", "error")))], 1)
+
+
+class TestAdaptiveFetcher(unittest.TestCase):
+    """Test case for adaptive scheduling of requests by 'pca.fetcher.Fetcher'."""
+
+    def test_throttling_server(self):
+        """Are requests to a throttling server cut to what it copes with, paused as it asks and still all served?"""
+        with throttling_server(capacity=3) as server, contextlib.redirect_stdout(io.StringIO()):
+            fetcher = Fetcher(concurrency=8, rate=None, adaptive=True)
+            labs = list(iter_scrape(NUMBERS, fetcher, URLBuilder(prefix=server.prefix), retries=0))
+            state = fetcher.state()["127.0.0.1:{}".format(server.httpd.server_address[1])]
+        self.assertEqual(len(labs), len(NUMBERS))
+        self.assertEqual(len(server.httpd.served), len(NUMBERS))
+        self.assertGreater(state["throttled"], 0)
+        self.assertEqual(state["throttled"], len(server.httpd.throttled))
+        self.assertLessEqual(state["limit"], 4)
+        self.assertEqual(state["in_flight"], 0)
+        for throttled in server.httpd.throttled:  # nothing sent in the second asked for, but what was on its way
+            self.assertFalse([arrived for arrived in server.httpd.arrived if throttled + 0.1 < arrived < throttled + 0.95])
+        self.assertEqual(sum(value for (name, _), value in fetcher.metrics.counters.items()
+                             if name == "throttled_total"), state["throttled"])
+
+    def test_fast_server(self):
+        """Is concurrency raised up to the maximum while the server keeps up?"""
+        with throttling_server(capacity=100, latency=0.01) as server, contextlib.redirect_stdout(io.StringIO()):
+            fetcher = Fetcher(concurrency=4, rate=None, adaptive=True)
+            labs = list(iter_scrape(NUMBERS, fetcher, URLBuilder(prefix=server.prefix), retries=0))
+            state = fetcher.state()["127.0.0.1:{}".format(server.httpd.server_address[1])]
+        self.assertEqual(len(labs), len(NUMBERS))
+        self.assertEqual((state["limit"], state["throttled"], state["decreases"]), (4, 0, 0))
+        self.assertEqual(server.httpd.peak, 4)
@@ -0,0 +1,114 @@
+"""
+
+    tests.test_search
+    ~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.search'.
+
+"""
+
+import unittest
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+
+from pca.data import JSONArrayWriter, export
+from pca.lab import Lab
+from pca.search import SearchIndex, fold, from_bitmap, parse_field, to_bitmap
+from tests.test_store import POZNAN_LAB
+
+CHEMISTRY = "Badania chemiczne, analityka chemiczna (C)"
+EMC = "Badania kompatybilności elektromagnetycznej (EMC) (F)"
+MICROBIOLOGY = "Badania mikrobiologiczne (K)"
+FOOD = "Wyroby konsumpcyjne przeznaczone dla ludzi - w tym żywność"
+ENVIRONMENT = "Próbki środowiskowe, powietrze, woda, gleba, odpady, osady i ścieki"
+BUILDING = "Wyroby budowlane, materiały budowlane, obiekty budowlane"
+
+
+def lab(number, fields, objects, lab_name="Laboratorium"):
+    return dict(POZNAN_LAB, number=number, research_fields=fields, research_objects=objects, lab_name=lab_name)
+
+
+LABS = [lab("AB 001", [CHEMISTRY, MICROBIOLOGY], [FOOD, ENVIRONMENT]),
+        lab("AB 002", [CHEMISTRY], [ENVIRONMENT], "Laboratorium Wody"),
+        Lab.from_dict(lab("AB 003", [EMC], [BUILDING])),
+        lab("AB 004", [MICROBIOLOGY], [FOOD]),
+        lab("AB 005", "", "")]
+
+
+class TestHelpers(unittest.TestCase):
+    """Test case for helpers of module 'pca.search'."""
+
+    def test_parse_field(self):
+        """Is the last parenthesized code of a research field taken as its category?"""
+        self.assertEqual(parse_field(CHEMISTRY), ("C", "Badania chemiczne, analityka chemiczna"))
+        self.assertEqual(parse_field(EMC), ("F", "Badania kompatybilności elektromagnetycznej (EMC)"))
+        self.assertEqual(parse_field("Badania inne"), (None, "Badania inne"))
+
+    def test_fold(self):
+        """Are Polish diacritics and case folded?"""
+        self.assertEqual(fold("ŻYWNOŚĆ, Łódź, źródło, gęś, pączek, koń"), "zywnosc, lodz, zrodlo, ges, paczek, kon")
+
+    def test_bitmaps(self):
+        """Do positions make it into bitmaps and back in order?"""
+        bitmap = to_bitmap({9, 0, 3, 64}, 65)
+        self.assertEqual(bitmap, 1 | 1 << 3 | 1 << 9 | 1 << 64)
+        self.assertEqual(from_bitmap(bitmap), [0, 3, 9, 64])
+        self.assertEqual(from_bitmap(bitmap, limit=2), [0, 3])
+        self.assertEqual(from_bitmap(0), [])
+
+
+class TestSearchIndex(unittest.TestCase):
+    """Test case for class 'SearchIndex'."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = SearchIndex(LABS)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_facets(self):
+        """Are labs found by research field codes and objects and counted by the rest of them?"""
+        self.assertEqual(self.index.field_names["F"], "Badania kompatybilności elektromagnetycznej (EMC)")
+        result = self.index.search(fields=["C"])
+        self.assertEqual(result["total"], 2)
+        self.assertEqual(result["numbers"], ["AB 001", "AB 002"])
+        self.assertEqual(result["facets"]["fields"], {"C": 2, "K": 1})
+        self.assertEqual(result["facets"]["objects"], {ENVIRONMENT: 2, FOOD: 1})
+        self.assertEqual(self.index.search(fields=["C", "K"], objects=[FOOD])["numbers"], ["AB 001"])
+        self.assertEqual(self.index.search(fields=["X"])["total"], 0)
+        everything = self.index.search()
+        self.assertEqual(everything["total"], 5)
+        self.assertEqual(everything["facets"]["fields"], {"C": 2, "K": 2, "F": 1})
+
+    def test_keywords(self):
+        """Are labs found by every term of a query, with diacritics and case folded and prefixes matched?"""
+        self.assertEqual(self.index.search("żywność")["numbers"], ["AB 001", "AB 004"])
+        self.assertEqual(self.index.search("ZYWNOSC")["numbers"], ["AB 001", "AB 004"])
+        self.assertEqual(self.index.search("woda")["numbers"], ["AB 001", "AB 002"])
+        self.assertEqual(self.index.search("wod*")["numbers"], ["AB 001", "AB 002"])  # 'woda' and 'wody'
+        self.assertEqual(self.index.search("woda", columns=["lab_name"])["total"], 0)
+        self.assertEqual(self.index.search("wyrob* budowl*")["numbers"], ["AB 003"])
+        self.assertEqual(self.index.search("wyrob* mikrobiolog*")["numbers"], ["AB 001", "AB 004"])
+        self.assertEqual(self.index.search("żywność", fields=["C"], limit=5)["numbers"], ["AB 001"])
+        self.assertEqual(self.index.search("nieznane")["total"], 0)
+        result = self.index.search("ludzi", limit=1)
+        self.assertEqual((result["total"], result["numbers"]), (2, ["AB 001"]))
+
+    def test_add(self):
+        """Are labs added after a query found by later ones?"""
+        self.index.search("żywność", fields=["K"])
+        self.index.add(lab("AB 006", [MICROBIOLOGY], [FOOD]))
+        self.assertEqual(self.index.search("żyw*", fields=["K"])["numbers"], ["AB 001", "AB 004", "AB 006"])
+        self.assertEqual(len(self.index), 6)
+
+    def test_from_json(self):
+        """Is the index loaded from the JSON output?"""
+        path = os.path.join(self.directory, "labs.json")
+        with contextlib.redirect_stdout(io.StringIO()):
+            export(LABS, [JSONArrayWriter(path)])
+            index = SearchIndex.from_json(path)
+        self.assertEqual(index.search("woda")["numbers"], ["AB 001", "AB 002"])
@@ -0,0 +1,167 @@
+"""
+
+    tests.test_shards
+    ~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.shards'.
+
+"""
+
+import unittest
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from pca.fetcher import Fetcher
+from pca.scraper import URLBuilder, iter_sharded, scrape, work
+from pca.shards import SQLiteQueue, split
+from tests.server import PCAHandler, PCAServer
+
+
+class SlowHandler(PCAHandler):
+
+    """Serve fixture pages with a delay, so that fetching a shard outlasts a short lease."""
+
+    def do_GET(self):
+        time.sleep(0.05)
+        super().do_GET()
+
+
+class TestSQLiteQueue(unittest.TestCase):
+    """Test case for class 'SQLiteQueue'."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "queue.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_split(self):
+        """Are numbers split into shards in their order?"""
+        self.assertEqual(split(range(1, 8), 3), [[1, 2, 3], [4, 5, 6], [7]])
+        self.assertEqual(split([], 3), [])
+
+    def test_fill(self):
+        """Is a queue filled only once, so that an interrupted run is resumed?"""
+        with SQLiteQueue(self.path) as queue:
+            self.assertEqual(queue.fill(range(1, 251), 100), 3)
+            self.assertEqual(queue.fill(range(1, 251), 100), 3)
+            self.assertEqual(queue.remaining(), 3)
+
+    def test_fill_other_numbers(self):
+        """Is a queue holding shards of other numbers refused, and one holding the same numbers resumed?"""
+        with SQLiteQueue(self.path) as queue:
+            queue.fill(range(1, 7), 2)
+            queue.complete(queue.lease("a"), [])
+            self.assertEqual(queue.fill(range(1, 7), 4), 3)
+            self.assertEqual(queue.remaining(), 2)
+            with self.assertRaises(ValueError):
+                queue.fill(range(1, 8), 2)
+
+    def test_lease(self):
+        """Is each shard leased to one worker at a time, in order?"""
+        with SQLiteQueue(self.path) as queue, SQLiteQueue(self.path) as other:
+            queue.fill(range(1, 5), 2)
+            first, second = queue.lease("a"), other.lease("b")
+            self.assertEqual((first.id, first.numbers), (1, [1, 2]))
+            self.assertEqual((second.id, second.numbers), (2, [3, 4]))
+            self.assertIsNone(queue.lease("c"))
+            self.assertTrue(other.complete(second, []))
+            self.assertEqual(queue.remaining(), 1)
+
+    def test_expired_lease(self):
+        """Is a shard whose lease expired leased again, and is its first worker refused?"""
+        with SQLiteQueue(self.path, lease=0.05) as queue:
+            queue.fill([1, 2], 2)
+            dead = queue.lease("dead")
+            time.sleep(0.1)
+            alive = queue.lease("alive")
+            self.assertEqual((alive.id, alive.attempt), (dead.id, 2))
+            self.assertFalse(queue.complete(dead, [{"number": "AB 001"}]))
+            self.assertFalse(queue.renew(dead))
+            self.assertTrue(queue.renew(alive))
+            self.assertTrue(queue.complete(alive, [{"number": "AB 002"}]))
+            self.assertEqual(list(queue.merge()), [{"number": "AB 002"}])
+
+    def test_release(self):
+        """Is a released shard leased again?"""
+        with SQLiteQueue(self.path) as queue:
+            queue.fill([1], 1)
+            shard = queue.lease("a")
+            self.assertTrue(queue.release(shard, RuntimeError("1 labs failed")))
+            self.assertEqual(queue.lease("b").attempt, 2)
+
+    def test_merge(self):
+        """Are labs merged in the order of shards only when all are done?"""
+        with SQLiteQueue(self.path) as queue:
+            queue.fill(range(1, 7), 2)
+            shards = [queue.lease("a") for _ in range(3)]
+            for shard in reversed(shards[1:]):
+                queue.complete(shard, [{"number": n} for n in shard.numbers])
+            with self.assertRaises(RuntimeError):
+                list(queue.merge())
+            queue.complete(shards[0], [{"number": n} for n in shards[0].numbers])
+            self.assertEqual([lab["number"] for lab in queue.merge()], [1, 2, 3, 4, 5, 6])
+
+
+class TestShardedScrape(unittest.TestCase):
+    """Test case for scraping shards of a work queue."""
+
+    NUMBERS = [1, 2, 7, 333, 456, 1327]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "queue.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_same_labs_as_unsharded(self):
+        """Does a sharded scrape yield the labs of an ordinary one, taking over shards of dead workers?"""
+        with PCAServer() as server, contextlib.redirect_stdout(io.StringIO()):
+            builder = URLBuilder(prefix=server.prefix)
+            expected = scrape(self.NUMBERS, Fetcher(rate=None), builder)
+            with SQLiteQueue(self.path, lease=0.2) as queue:
+                queue.fill(self.NUMBERS, 2)
+                queue.lease("dead")
+                labs = list(iter_sharded(queue, self.NUMBERS, Fetcher(rate=None), builder, poll=0.05))
+                self.assertEqual(len(queue), 0)
+        self.assertEqual(labs, expected)
+        self.assertEqual([lab["number"] for lab in labs], ["AB 001", "AB 333", "AB 456", "AB 1327"])
+
+    def test_lease_renewed_without_labs(self):
+        """Is the lease renewed as pages are fetched, even if none of them has a lab?"""
+        with PCAServer(SlowHandler) as server, contextlib.redirect_stdout(io.StringIO()):
+            with SQLiteQueue(self.path, lease=0.06) as queue:
+                queue.fill([995, 996, 997, 998, 999], 5)
+                with mock.patch.object(queue, "renew", wraps=queue.renew) as renew:
+                    self.assertEqual(work(queue, Fetcher(concurrency=1, rate=None), URLBuilder(prefix=server.prefix)),
+                                     1)
+                self.assertGreaterEqual(renew.call_count, 2)
+
+    def test_lease_lost(self):
+        """Does a worker give up a shard whose lease was lost, without storing its labs?"""
+        def take_over(shard):  # meanwhile the lease expired and another worker took the shard for long
+            queue.lease_time = 60
+            queue.lease("b")
+            return False
+
+        with PCAServer() as server, contextlib.redirect_stdout(io.StringIO()) as stdout:
+            with SQLiteQueue(self.path, lease=0) as queue:
+                queue.fill(self.NUMBERS, 6)
+                with mock.patch.object(queue, "renew", side_effect=take_over):
+                    self.assertEqual(work(queue, Fetcher(rate=None), URLBuilder(prefix=server.prefix), worker="a"), 0)
+                self.assertEqual(queue.remaining(), 1)
+        self.assertIn("Lease of shard #1 was lost", stdout.getvalue())
+
+    def test_scrape_with_queue(self):
+        """Does 'scrape' split numbers into shards of a given queue?"""
+        with PCAServer() as server, contextlib.redirect_stdout(io.StringIO()):
+            with SQLiteQueue(self.path) as queue:
+                labs = scrape(self.NUMBERS, Fetcher(rate=None), URLBuilder(prefix=server.prefix), queue=queue)
+        self.assertEqual(len(labs), 4)
@@ -0,0 +1,75 @@
+"""
+
+    tests.test_snapshot
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.snapshot'.
+
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from pca.snapshot import Snapshot, to_snapshot
+from tests.test_data import LABS
+from tests.test_store import POZNAN_LAB
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test case for snapshot writer and reader."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "labs.snapshot")
+        self.labs = LABS + [POZNAN_LAB]
+        to_snapshot(iter(self.labs), self.path)
+        self.snapshot = Snapshot(self.path)
+
+    def tearDown(self):
+        self.snapshot.close()
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        """Are labs read back exactly as they were written, missing sections included?"""
+        self.assertEqual(len(self.snapshot), 3)
+        self.assertEqual(list(self.snapshot), self.labs)
+        self.assertEqual(self.snapshot[1]["research_objects"], "")
+
+    def test_index(self):
+        """Does indexing by position support negative indices and raise IndexError when out of range?"""
+        self.assertEqual(self.snapshot[-1], POZNAN_LAB)
+        with self.assertRaises(IndexError):
+            self.snapshot[3]
+
+    def test_lab(self):
+        """Is a single lab found by number?"""
+        self.assertEqual(self.snapshot.lab("AB 333"), LABS[1])
+        self.assertIsNone(self.snapshot.lab("AB 999"))
+
+    def test_column(self):
+        """Is a single column decoded for all labs?"""
+        self.assertEqual(self.snapshot.column("number"), ["AB 1327", "AB 333", "AB 001"])
+        self.assertEqual(self.snapshot.column("research_objects"), [lab["research_objects"] for lab in self.labs])
+
+    def test_shared_strings(self):
+        """Do labs share a single decoded copy of a repeated string?"""
+        first, last = self.snapshot[0]["research_fields"][0], self.snapshot[2]["research_fields"][1]
+        self.assertEqual(first, "Badania nieniszczące (L)")
+        self.assertIs(first, last)
+
+    def test_not_a_snapshot(self):
+        """Is ValueError raised for a file that isn't a snapshot?"""
+        path = os.path.join(self.directory, "labs.json")
+        with open(path, "w") as json_file:
+            json_file.write('{"labs": []}')
+        with self.assertRaises(ValueError):
+            Snapshot(path)
+
+    def test_empty(self):
+        """Can an empty snapshot be written and read?"""
+        path = os.path.join(self.directory, "empty.snapshot")
+        to_snapshot([], path)
+        with Snapshot(path) as snapshot:
+            self.assertEqual(list(snapshot), [])
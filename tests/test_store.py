@@ -0,0 +1,171 @@
+"""
+
+    tests.test_store
+    ~~~~~~~~~~~~~~~~~~
+
+    Unit tests for module 'pca.store'.
+
+"""
+
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from pca.data import export
+from pca.store import LabStore, SQLiteWriter, city, field_code
+from tests.test_data import LABS
+
+POZNAN_LAB = {
+    "number": "AB 001",
+    "certdate": "2016-09-08",
+    "org_name": "Urząd Dozoru Technicznego",
+    "org_address": "ul. Szczęśliwicka 34; 02-353 Warszawa",
+    "lab_name": "Centralne Laboratorium Dozoru Technicznego",
+    "lab_address": "ul. Małeckiego 29; 60-706 Poznań",
+    "phone": "61 628-03-00",
+    "cellphone": "",
+    "email": "cldt@udt.gov.pl",
+    "www": "www.udt.gov.pl",
+    "research_fields": ["Badania chemiczne, analityka chemiczna (C)", "Badania nieniszczące (L)"],
+    "research_objects": ["Próbki środowiskowe, powietrze, woda, gleba, odpady, osady i ścieki", "Szkło i ceramika"]
+}
+
+
+class TestHelpers(unittest.TestCase):
+    """Test case for helper functions of module 'pca.store'."""
+
+    def test_city(self):
+        """Does 'city' return the city following the postal code?"""
+        self.assertEqual(city("Maszewo Duże, ul. Miła 8; 09-400 Płock"), "Płock")
+        self.assertEqual(city("ul. Małeckiego 29; 60-706 Poznań"), "Poznań")
+        self.assertEqual(city("Warszawa"), "")
+
+    def test_field_code(self):
+        """Does 'field_code' return the code in parentheses?"""
+        self.assertEqual(field_code("Badania chemiczne, analityka chemiczna (C)"), "C")
+        self.assertIsNone(field_code("Badania inne"))
+
+
+class TestLabStore(unittest.TestCase):
+    """Test case for class 'LabStore'."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = LabStore(os.path.join(self.directory, "labs.sqlite"))
+        self.store.upsert(LABS + [POZNAN_LAB])
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        """Are labs read back exactly as they were stored, missing sections included?"""
+        self.assertEqual(self.store.get("AB 333"), LABS[1])
+        self.assertEqual(self.store.query(), [POZNAN_LAB, LABS[1], LABS[0]])
+
+    def test_get_missing(self):
+        """Does 'get' return None for an unknown number?"""
+        self.assertIsNone(self.store.get("AB 999"))
+
+    def test_upsert_replaces(self):
+        """Does upserting a lab with a stored number replace it, fields and objects included?"""
+        changed = dict(LABS[0], certdate="2019-01-01", research_fields=["Badania inne (M)"], research_objects="")
+        self.store.upsert([changed])
+        self.assertEqual(self.store.count(), 3)
+        self.assertEqual(self.store.get("AB 1327"), changed)
+        self.assertEqual(self.store.query(field="L"), [POZNAN_LAB])
+        self.assertEqual(self.store.query(field="Badania inne (M)"), [changed])
+
+    def test_upsert_prunes(self):
+        """Are research fields and objects no lab refers to any more deleted?"""
+        self.store.upsert([dict(POZNAN_LAB, research_fields=["Badania inne (M)"], research_objects=[])])
+        self.store.delete(["AB 333"])
+        fields = self.store.connection.execute("SELECT name FROM fields ORDER BY name").fetchall()
+        objects = self.store.connection.execute("SELECT count(*) FROM objects").fetchone()[0]
+        self.assertEqual(fields, [("Badania inne (M)",), ("Badania nieniszczące (L)",)])
+        self.assertEqual(objects, len(LABS[0]["research_objects"]))
+
+    def test_query_by_field(self):
+        """Are labs found by research field code and full name?"""
+        self.assertEqual([lab["number"] for lab in self.store.query(field="C")], ["AB 001", "AB 333"])
+        self.assertEqual(self.store.query(field="Badania nieniszczące (L)"), [POZNAN_LAB, LABS[0]])
+
+    def test_query_combined(self):
+        """Are criteria combined, cities compared case-insensitively and date bounds inclusive?"""
+        self.assertEqual(self.store.query(field="C", city="poznań", since="2015-01-01"), [POZNAN_LAB])
+        self.assertEqual(self.store.query(field="C", city="Poznań", since="2016-09-09"), [])
+        self.assertEqual(self.store.query(until="2012-04-03"), [LABS[1], LABS[0]])
+
+    def test_query_by_organisation(self):
+        """Are labs found by a substring of the organisation name?"""
+        self.assertEqual(self.store.query(organisation="dozoru"), [POZNAN_LAB])
+        self.assertEqual(self.store.query(organisation="URZĄD dozoru"), [POZNAN_LAB])  # beyond ASCII too
+
+    def test_query_by_organisation_wildcards(self):
+        """Are LIKE wildcards in the organisation name matched literally?"""
+        self.assertEqual(self.store.query(organisation="%"), [])
+        self.assertEqual(self.store.query(organisation="Urz_d"), [])
+        self.store.upsert([dict(LABS[1], org_name="Stacja 100% Rolnicza_1")])
+        self.assertEqual([lab["number"] for lab in self.store.query(organisation="100% rolnicza_")], ["AB 333"])
+
+    def test_migrate(self):
+        """Are organisations of a store written before they were casefolded looked up after opening it?"""
+        self.store.close()
+        connection = sqlite3.connect(os.path.join(self.directory, "labs.sqlite"))
+        with connection:  # as written before: no casefolded organisation names
+            connection.execute("CREATE TABLE old_labs AS SELECT * FROM labs")
+            connection.execute("DROP TABLE labs")
+            connection.execute("CREATE TABLE labs AS SELECT number, certdate, org_name, org_address, lab_name, "
+                               "lab_address, city, city_key, phone, cellphone, email, www, has_fields, has_objects "
+                               "FROM old_labs")
+            connection.execute("DROP TABLE old_labs")
+        connection.close()
+        self.store = LabStore(os.path.join(self.directory, "labs.sqlite"))
+        self.assertEqual(self.store.query(organisation="URZĄD"), [POZNAN_LAB])
+        self.assertEqual(self.store.get("AB 333"), LABS[1])
+
+    def test_search(self):
+        """Does full-text search match words of research objects?"""
+        self.assertEqual(self.store.search("gleba"), [POZNAN_LAB])
+        self.assertEqual([lab["number"] for lab in self.store.search("ceramika OR metale")], ["AB 001", "AB 1327"])
+
+    def test_delete(self):
+        """Are deleted labs gone from all indexes?"""
+        self.store.delete(["AB 001"])
+        self.assertEqual(self.store.count(), 2)
+        self.assertEqual(self.store.search("gleba"), [])
+        self.assertEqual(self.store.query(field="C"), [LABS[1]])
+
+    def test_reindex(self):
+        """Is the full-text index of a store written before it was keyed by lab rowids rebuilt on opening it?"""
+        with self.store.connection as connection:  # as written before: rows of the full-text index numbered apart
+            connection.execute("DELETE FROM objects_fts")
+            connection.execute("INSERT INTO objects_fts (rowid, number, research_objects) "
+                               "SELECT rowid + 100, number, 'gleba' FROM labs")
+            connection.execute("PRAGMA user_version = 0")
+        self.store.close()
+        self.store = LabStore(os.path.join(self.directory, "labs.sqlite"))
+        self.assertEqual(self.store.search("gleba"), [POZNAN_LAB])
+        self.store.upsert([dict(POZNAN_LAB, research_objects=["Szkło i ceramika"])])
+        self.assertEqual(self.store.search("gleba"), [])
+        self.assertEqual([lab["number"] for lab in self.store.search("ceramika OR metale")], ["AB 001", "AB 1327"])
+
+
+class TestSQLiteWriter(unittest.TestCase):
+    """Test case for class 'SQLiteWriter'."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_export(self):
+        """Are exported labs stored?"""
+        path = os.path.join(self.directory, "labs.sqlite")
+        self.assertEqual(export(iter(LABS), [SQLiteWriter(path)]), 2)
+        with LabStore(path) as store:
+            self.assertEqual(store.query(), [LABS[1], LABS[0]])
+